@@ -4,42 +4,70 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail
 from config import Config
 
-# 1. Khởi tạo Flask App và Database ngay lập tức
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Tự động tạo thư mục instance nếu chưa có (Để tránh lỗi khi chạy lần đầu)
-try:
-    os.makedirs(app.instance_path)
-except OSError:
-    pass
-
-db = SQLAlchemy(app)
-mail = Mail(app)
-
-# 2. Tạo bảng database (nếu chưa có)
-with app.app_context(): 
-    db.create_all()
-
-# 3. Đăng ký Blueprint cho báo cáo  
-from app.routes.auth import auth_bp
-from app.routes.report import report_bp
-from app.routes.ai import ai_bp
-from app.routes.admin import admin_bp
-
-app.register_blueprint(auth_bp)
-app.register_blueprint(report_bp)
-app.register_blueprint(ai_bp)
-app.register_blueprint(admin_bp)
-
-from app.routes.views import views_bp
-from app.routes.transaction import transaction_bp
-from app.routes.foundation import foundation_bp
-from app.routes.budget import budget_bp
-from app.routes.settings import settings_bp
-
-app.register_blueprint(settings_bp)
-app.register_blueprint(views_bp)
-app.register_blueprint(transaction_bp)
-app.register_blueprint(foundation_bp)
-app.register_blueprint(budget_bp)
\ No newline at end of file
+# 1. Extension dùng chung, gắn vào app trong create_app() (models/routes import db, mail từ đây)
+db = SQLAlchemy()
+mail = Mail()
+
+def create_app(config_class=Config):
+    """
+    Dựng Flask app. Bản thân `import app` chỉ tốn Flask + SQLAlchemy; blueprint được
+    nạp ở đây, còn thư viện nặng (google-genai, openpyxl) chỉ nạp khi request đầu tiên
+    cần tới (ai_service.make_client, report.export_excel).
+    """
+    flask_app = Flask(__name__)
+    flask_app.config.from_object(config_class)
+
+    # Tự động tạo thư mục instance nếu chưa có (Để tránh lỗi khi chạy lần đầu)
+    try:
+        os.makedirs(flask_app.instance_path)
+    except OSError:
+        pass
+
+    db.init_app(flask_app)
+    mail.init_app(flask_app)
+
+    # 2. PRAGMA cho SQLite + đo độ trễ/số câu SQL theo endpoint (/metrics).
+    #    Cấu trúc bảng do migration quản lý: chạy `python migrate.py`
+    from app.database import configure_engine
+    from app.metrics import init_metrics
+
+    with flask_app.app_context():
+        configure_engine(db.engine, flask_app.config)
+        init_metrics(flask_app, db.engine)
+
+    # 3. Đăng ký Blueprint
+    from app.routes.auth import auth_bp
+    from app.routes.report import report_bp
+    from app.routes.ai import ai_bp
+    from app.routes.admin import admin_bp
+    from app.routes.views import views_bp
+    from app.routes.transaction import transaction_bp
+    from app.routes.foundation import foundation_bp
+    from app.routes.budget import budget_bp
+    from app.routes.settings import settings_bp
+
+    flask_app.register_blueprint(auth_bp)
+    flask_app.register_blueprint(report_bp)
+    flask_app.register_blueprint(ai_bp)
+    flask_app.register_blueprint(admin_bp)
+    flask_app.register_blueprint(settings_bp)
+    flask_app.register_blueprint(views_bp)
+    flask_app.register_blueprint(transaction_bp)
+    flask_app.register_blueprint(foundation_bp)
+    flask_app.register_blueprint(budget_bp)
+
+    # 4. Luồng nền làm nóng cache gợi ý AI cho dashboard (tắt mặc định)
+    if flask_app.config.get('INSIGHTS_PREWARM'):
+        from app.insights import start_insights_prewarm
+        start_insights_prewarm(flask_app)
+
+    return flask_app
+
+def __getattr__(name):
+    # Giữ `from app import app` cho run.py và các script gốc: app mặc định
+    # chỉ được dựng khi có người cần tới, không phải ngay lúc import package.
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
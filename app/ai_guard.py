@@ -0,0 +1,204 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# ==================================================
+# BẢO VỆ CÁC LỜI GỌI RA MODEL (GEMINI)
+# - Mọi lời gọi chạy trong một executor giới hạn số luồng (trần đồng thời mỗi tiến trình),
+#   worker WSGI chỉ chờ tối đa `timeout` giây rồi được giải phóng.
+# - Cầu dao (circuit breaker): tỉ lệ lỗi trong cửa sổ gần nhất vượt ngưỡng thì "ngắt",
+#   các lời gọi sau thất bại ngay (trả thông báo dự phòng) cho tới hết thời gian nghỉ.
+# - Thống kê trạng thái + histogram độ trễ theo từng loại lời gọi.
+# ==================================================
+
+MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 8))
+CALL_TIMEOUT = float(os.environ.get('AI_CALL_TIMEOUT', 15))           # giây, cho predict / predict_batch
+STREAM_CHUNK_TIMEOUT = float(os.environ.get('AI_STREAM_CHUNK_TIMEOUT', 20))  # giây chờ mỗi đoạn chat
+QUEUE_WAIT = float(os.environ.get('AI_QUEUE_WAIT', 2))                 # giây chờ khi đã đủ trần đồng thời
+BREAKER_WINDOW = int(os.environ.get('AI_BREAKER_WINDOW', 20))
+BREAKER_MIN_CALLS = int(os.environ.get('AI_BREAKER_MIN_CALLS', 10))
+BREAKER_ERROR_RATE = float(os.environ.get('AI_BREAKER_ERROR_RATE', 0.5))
+BREAKER_COOLDOWN = float(os.environ.get('AI_BREAKER_COOLDOWN', 30))
+
+# Logger con của app.logger (Flask đặt tên theo package 'app'): ghi được cả từ luồng
+# không có app context, ví dụ generator chat đang stream
+logger = logging.getLogger(__name__)
+
+# Mốc histogram độ trễ (giây)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class AIUnavailableError(RuntimeError):
+    """Cầu dao đang ngắt, hoặc đã đủ trần đồng thời quá lâu"""
+
+class AITimeoutError(TimeoutError):
+    """Model không trả lời trong thời hạn"""
+
+class LatencyHistogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)  # phần tử cuối: > mốc lớn nhất
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.bounds):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total += seconds
+
+    def snapshot(self):
+        cumulative, running = {}, 0
+        for bound, n in zip(list(self.bounds) + ['+Inf'], self.buckets):
+            running += n
+            cumulative[str(bound)] = running
+        return {'buckets': cumulative, 'count': self.count, 'sum': round(self.total, 3)}
+
+class ModelCallGuard:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='ai-call')
+        self._slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=BREAKER_WINDOW)  # True = thành công
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_started = None  # thời điểm bắt đầu lời gọi thử khi HALF_OPEN
+        self.rejected = 0
+        self.timeouts = 0
+        self.histograms = {}
+
+    # ---------- Cầu dao ----------
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < BREAKER_COOLDOWN:
+                    self.rejected += 1
+                    raise AIUnavailableError('Cầu dao AI đang ngắt')
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # Chỉ cho MỘT lời gọi thử; thành công thì đóng cầu dao lại.
+                # Lời gọi thử bị bỏ dở (luồng chat không được đọc) thì sau COOLDOWN cho thử lại.
+                now = time.monotonic()
+                if self._trial_started is not None and now - self._trial_started < BREAKER_COOLDOWN:
+                    self.rejected += 1
+                    raise AIUnavailableError('Cầu dao AI đang thử kết nối lại')
+                self._trial_started = now
+
+    def _record(self, name, ok, elapsed):
+        with self._lock:
+            self.histograms.setdefault(name, LatencyHistogram()).observe(elapsed)
+            if self.state == self.HALF_OPEN:
+                self._trial_started = None
+                if ok:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self.state, self._opened_at = self.OPEN, time.monotonic()
+                return
+
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if (len(self._outcomes) >= BREAKER_MIN_CALLS
+                    and failures / len(self._outcomes) >= BREAKER_ERROR_RATE):
+                self.state, self._opened_at = self.OPEN, time.monotonic()
+                logger.warning("AI circuit breaker OPEN: %d/%d lời gọi lỗi gần nhất", failures, len(self._outcomes))
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=QUEUE_WAIT):
+            with self._lock:
+                self.rejected += 1
+                if self.state == self.HALF_OPEN:
+                    self._trial_started = None
+            raise AIUnavailableError('Đã đủ số lời gọi AI đồng thời')
+
+    # ---------- Gọi model ----------
+
+    def call(self, name, fn, *args, timeout=CALL_TIMEOUT, **kwargs):
+        """Gọi fn(*args, **kwargs) trong executor, chờ tối đa `timeout` giây"""
+        self._before_call()
+        self._acquire_slot()
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            self._record(name, False, time.monotonic() - started)
+            raise AITimeoutError(f'{name}: quá {timeout}s không phản hồi')
+        except Exception:
+            self._record(name, False, time.monotonic() - started)
+            raise
+        self._record(name, True, time.monotonic() - started)
+        return result
+
+    def stream(self, name, fn, *args, chunk_timeout=STREAM_CHUNK_TIMEOUT, **kwargs):
+        """
+        Bọc một lời gọi trả về luồng (generate_content_stream): mỗi đoạn phải tới trong
+        `chunk_timeout` giây. Giữ một suất đồng thời từ lúc bắt đầu đọc tới khi luồng kết thúc.
+        Cầu dao được kiểm tra NGAY khi gọi để route trả thông báo dự phòng luôn.
+        """
+        self._before_call()
+        return self._iterate(name, fn, args, kwargs, chunk_timeout)
+
+    def _iterate(self, name, fn, args, kwargs, chunk_timeout):
+        self._acquire_slot()
+        started = time.monotonic()
+        done = object()
+        ok = False
+        pending = None
+        try:
+            pending = self._executor.submit(fn, *args, **kwargs)
+            iterator = iter(pending.result(timeout=chunk_timeout))
+            while True:
+                pending = self._executor.submit(next, iterator, done)
+                chunk = pending.result(timeout=chunk_timeout)
+                if chunk is done:
+                    break
+                yield chunk
+            ok = True
+        except GeneratorExit:
+            # Client ngắt kết nối giữa chừng: không tính là lỗi của model
+            ok = True
+            raise
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise AITimeoutError(f'{name}: quá {chunk_timeout}s không nhận được dữ liệu')
+        finally:
+            # Luồng gọi model còn treo thì chỉ trả suất khi nó thực sự kết thúc
+            if pending is not None and not pending.done():
+                pending.add_done_callback(lambda _: self._slots.release())
+            else:
+                self._slots.release()
+            self._record(name, ok, time.monotonic() - started)
+
+    def stats(self):
+        with self._lock:
+            window = len(self._outcomes)
+            return {
+                'state': self.state,
+                'window_calls': window,
+                'window_error_rate': round(self._outcomes.count(False) / window, 4) if window else 0,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'max_concurrency': MAX_CONCURRENCY,
+                'latency': {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+ai_guard = ModelCallGuard()
@@ -0,0 +1,170 @@
+import atexit
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app import db
+from app.database import upsert_add
+from app.models import AILog, AIDailyStat
+from config import Config
+
+# ==================================================
+# NHẬT KÝ DỰ ĐOÁN AI (GHI THEO LÔ, KHÔNG CHẶN REQUEST)
+# Route chỉ đẩy sự kiện vào hàng đợi trong RAM (put_nowait) rồi trả lời ngay.
+# Một luồng nền gom tối đa AI_LOG_BATCH_SIZE sự kiện hoặc AI_LOG_FLUSH_INTERVAL giây,
+# rồi trong MỘT transaction: chèn các dòng ai_lichsu bằng executemany và cộng dồn
+# bảng ai_thongke_ngay (UPSERT) theo (ngày, danh mục đoán, nhóm độ tin cậy).
+# Hàng đợi đầy thì bỏ sự kiện (có đếm) chứ không làm chậm người dùng.
+# ==================================================
+
+_logs = AILog.__table__
+_stats = AIDailyStat.__table__
+_stat_key = ('Ngay', 'MaDanhMuc', 'NhomTinCay')
+_stat_counters = ('SoDuDoan', 'TongDoTre', 'SoDanhGia', 'SoDung', 'TongDoTinCay')
+
+def confidence_bucket(confidence):
+    """Nhóm độ tin cậy (thang 0-100) theo từng 10%: 0..9"""
+    try:
+        return min(max(int(float(confidence) // 10), 0), 9)
+    except (TypeError, ValueError):
+        return 0
+
+class AILogWriter:
+    def __init__(self, batch_size, flush_interval, queue_size):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._app = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    # ---------- Phía request ----------
+
+    def record_prediction(self, category_id, confidence, latency_ms):
+        """Một lượt dự đoán (cục bộ / cache / AI) với độ trễ phía server"""
+        self._put(('prediction', date.today(), category_id or 0, confidence_bucket(confidence), latency_ms))
+
+    def record_outcome(self, user_id, transaction_id, predicted_cat, actual_cat, confidence):
+        """Người dùng lưu giao dịch sau khi AI gợi ý: so danh mục AI đoán với danh mục được chọn"""
+        try:
+            predicted_cat, actual_cat = int(predicted_cat), int(actual_cat)
+            confidence = float(confidence) if confidence is not None else None
+        except (TypeError, ValueError):
+            return # Giao dịch không kèm gợi ý AI (hoặc dữ liệu gợi ý không hợp lệ)
+        self._put(('outcome', date.today(), predicted_cat, confidence_bucket(confidence), {
+            'MaNguoiDung': user_id,
+            'MaGiaoDich': transaction_id,
+            'DanhMucDuDoan': predicted_cat,
+            'DanhMucChinhXac': actual_cat,
+            'DoTinCay': confidence,
+            'PhanHoi': 'dung' if predicted_cat == actual_cat else 'sai',
+            'NgayTao': datetime.now(),
+        }))
+
+    def _put(self, event):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._run, name='ai-log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    # ---------- Luồng nền ----------
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def flush(self):
+        """Ghi ngay mọi sự kiện còn trong hàng đợi (khi tắt tiến trình, hoặc từ script)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        if self._app is None:
+            return
+        started = time.perf_counter()
+        with self._flush_lock, self._app.app_context():
+            try:
+                self._apply(batch)
+                db.session.commit()
+                self.written += len(batch)
+                self.flushes += 1
+            except Exception as e:
+                db.session.rollback()
+                self.dropped += len(batch)
+                print(f"Lỗi ghi nhật ký AI ({len(batch)} sự kiện): {e}")
+            finally:
+                db.session.remove()
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    def _apply(self, batch):
+        rows = []
+        counters = defaultdict(lambda: dict.fromkeys(_stat_counters, 0))
+        for kind, day, category_id, bucket, payload in batch:
+            cell = counters[(day, category_id, bucket)]
+            if kind == 'prediction':
+                cell['SoDuDoan'] += 1
+                cell['TongDoTre'] += payload
+            else:
+                rows.append(payload)
+                cell['SoDanhGia'] += 1
+                cell['SoDung'] += payload['PhanHoi'] == 'dung'
+                cell['TongDoTinCay'] += payload['DoTinCay'] or 0
+
+        if rows:
+            db.session.execute(insert(_logs), rows)
+        _upsert_stats([dict(zip(_stat_key, key), **cell) for key, cell in counters.items()])
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'last_flush_ms': round(self.last_flush_ms, 1),
+        }
+
+def _upsert_stats(rows):
+    """Cộng dồn vào ai_thongke_ngay"""
+    upsert_add(db.session, _stats, _stat_key, _stat_counters, rows)
+
+ai_log_writer = AILogWriter(Config.AI_LOG_BATCH_SIZE, Config.AI_LOG_FLUSH_INTERVAL, Config.AI_LOG_QUEUE_SIZE)
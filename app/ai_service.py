@@ -1,10 +1,9 @@
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-# Import theo chuẩn SDK mới nhất
-from google import genai
-from google.genai import types
+from app.ai_guard import ai_guard
 
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -12,19 +11,60 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 # Load API Key từ file .env
 load_dotenv()
 
+# Giới hạn cho dự đoán theo lô: số mô tả / số ký tự mô tả tối đa trong MỘT prompt,
+# và số prompt (chunk) được gọi song song
+BATCH_MAX_ITEMS = int(os.environ.get('AI_BATCH_MAX_ITEMS', 50))
+BATCH_MAX_CHARS = int(os.environ.get('AI_BATCH_MAX_CHARS', 6000))
+BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', 4))
+
+def make_client(backend=None):
+    """
+    Chọn backend cho model:
+    - 'gemini' (mặc định): genai.Client thật; GEMINI_BASE_URL cho phép trỏ sang máy chủ giả lập
+    - 'fake': FakeGeminiClient trong tiến trình (không cần mạng / API key)
+    """
+    backend = (backend or os.environ.get('AI_BACKEND', 'gemini')).lower()
+    if backend == 'fake':
+        from app.fake_gemini import FakeGeminiClient
+        return FakeGeminiClient()
+
+    # SDK google-genai nạp khá lâu: chỉ import khi tạo client lần đầu, không phải lúc khởi động worker
+    from google import genai
+    from google.genai import types
+
+    api_key = os.environ.get('GEMINI_API_KEY')
+    base_url = os.environ.get('GEMINI_BASE_URL')
+    if base_url:
+        return genai.Client(api_key=api_key or 'fake-key', http_options=types.HttpOptions(base_url=base_url))
+    return genai.Client(api_key=api_key)
+
+def json_config():
+    """Ép model trả về JSON (types.GenerateContentConfig, import khi cần)"""
+    from google.genai import types
+    return types.GenerateContentConfig(response_mime_type="application/json")
+
 class ExpenseAI:
-    def __init__(self):
-        # Khởi tạo Client mới thay vì configure global
-        api_key = os.environ.get('GEMINI_API_KEY')
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, client=None):
+        # Client (và SDK) được tạo khi dùng lần đầu (hoặc truyền sẵn, VD: FakeGeminiClient khi đo tải)
+        self._client = client
         
         # Tên model chuẩn cho SDK mới (không cần tiền tố 'models/')
         self.model_name = 'gemini-2.5-flash'
 
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = make_client()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+
     def predict(self, text, user_categories):
         """
         Dự đoán danh mục chi tiêu dựa trên danh sách danh mục CỦA RIÊNG NGƯỜI DÙNG.
-        Ép kiểu trả về là JSON bằng types.GenerateContentConfig.
+        Ép kiểu trả về là JSON bằng json_config().
         """
         if not text or not user_categories:
             return None
@@ -46,13 +86,12 @@ class ExpenseAI:
             {{"category": "Tên danh mục", "confidence": 95}}
             """
             
-            # Gọi API theo cú pháp của thư viện mới
-            response = self.client.models.generate_content(
+            # Gọi API theo cú pháp của thư viện mới (qua ai_guard: có thời hạn + cầu dao)
+            response = ai_guard.call(
+                'predict', self.client.models.generate_content,
                 model=self.model_name,
                 contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
+                config=json_config()
             )
             
             # Parse chuỗi JSON thành Dictionary Python
@@ -68,6 +107,85 @@ class ExpenseAI:
             print(f"Gemini Predict Error: {e}")
             return None
         
+    def predict_batch(self, texts, user_categories, max_items=BATCH_MAX_ITEMS,
+                      max_chars=BATCH_MAX_CHARS, concurrency=BATCH_CONCURRENCY):
+        """
+        Dự đoán danh mục cho nhiều mô tả: gom thành các prompt JSON (mỗi prompt tối đa
+        max_items mô tả / max_chars ký tự), gọi song song tối đa `concurrency` prompt.
+        Trả về list cùng thứ tự với texts; phần tử None = không dự đoán được mục đó.
+        """
+        results = [None] * len(texts)
+        if not texts or not user_categories:
+            return results
+
+        # Chia chunk theo thứ tự, giữ chỉ số gốc để ghép kết quả
+        chunks, current, size = [], [], 0
+        for index, text in enumerate(texts):
+            if not text:
+                continue
+            text = str(text)[:255]
+            if current and (len(current) >= max_items or size + len(text) > max_chars):
+                chunks.append(current)
+                current, size = [], 0
+            current.append((index, text))
+            size += len(text)
+        if current:
+            chunks.append(current)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks) or 1))) as pool:
+            for chunk_result in pool.map(lambda chunk: self._predict_chunk(chunk, user_categories), chunks):
+                for index, result in chunk_result.items():
+                    results[index] = result
+        return results
+
+    def _predict_chunk(self, chunk, user_categories):
+        """Một lần gọi generate_content cho một chunk; lỗi cả chunk => mọi mục trong chunk là None"""
+        try:
+            items = json.dumps([{'index': index, 'text': text} for index, text in chunk], ensure_ascii=False)
+            prompt = f"""
+            Bạn là một hệ thống phân loại tài chính tự động. 
+            Nhiệm vụ: Phân loại TỪNG giao dịch trong danh sách vào đúng MỘT trong các danh mục người dùng đã tạo.
+            
+            Danh mục hiện có: {', '.join(user_categories)}
+            Danh sách giao dịch (JSON): {items}
+            
+            Yêu cầu BẮT BUỘC: 
+            - Chỉ trả về một mảng JSON hợp lệ, mỗi giao dịch một phần tử, giữ nguyên "index".
+            - Nếu không có danh mục nào phù hợp, category hãy để là "Khác".
+            - confidence là độ tự tin của bạn (từ 0 đến 100).
+            
+            Định dạng trả về:
+            [{{"index": 0, "category": "Tên danh mục", "confidence": 95}}]
+            """
+
+            response = ai_guard.call(
+                'predict_batch', self.client.models.generate_content,
+                model=self.model_name,
+                contents=prompt,
+                config=json_config()
+            )
+            parsed = json.loads(response.text.strip())
+        except Exception as e:
+            print(f"Gemini Batch Predict Error: {e}")
+            return {}
+
+        # Từng phần tử hỏng (thiếu index, index lạ, sai kiểu) chỉ bị bỏ qua, không làm hỏng cả lô
+        expected = {index for index, _ in chunk}
+        results = {}
+        for item in parsed if isinstance(parsed, list) else []:
+            try:
+                index = int(item['index'])
+                if index not in expected:
+                    continue
+                category = item.get('category')
+                results[index] = {
+                    'category': category if category in user_categories else "Khác",
+                    'confidence': float(item.get('confidence', 0)),
+                }
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+        return results
+
     def chat_with_data(self, user_question, context_data):
         if not user_question:
             return "Xin lỗi, tôi chưa nghe rõ câu hỏi của bạn."
@@ -97,8 +215,10 @@ class ExpenseAI:
             - Khi tính tổng chi tiêu: TUYỆT ĐỐI không cộng chuyển khoản.
             """
             
-            # Trả về một "Luồng" (Generator) thay vì văn bản tĩnh
-            response_stream = self.client.models.generate_content_stream(
+            # Trả về một "Luồng" (Generator) thay vì văn bản tĩnh.
+            # Cầu dao đang ngắt thì lỗi ngay tại đây => trả thông báo dự phòng bên dưới.
+            response_stream = ai_guard.stream(
+                'chat', self.client.models.generate_content_stream,
                 model=self.model_name,
                 contents=prompt
             )
@@ -0,0 +1,274 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import update, insert, delete, select, bindparam, case, func, literal_column, union_all
+
+from app import db
+from app.database import upsert_add
+from app.cache import bump_data_version
+from app.budget_engine import apply_spending_deltas
+from app.models import Wallet, WalletLedger, Transaction, DailyRollup
+
+# ==================================================
+# GHI SỔ BIẾN ĐỘNG CỦA GIAO DỊCH
+# Mỗi request ghi (thêm/sửa/xóa/nhập) gom toàn bộ biến động số dư và bảng
+# tổng hợp ngày vào một TransactionEffects, rồi flush() xuống DB bằng các câu
+# UPDATE/UPSERT cộng dồn ("SoDu = SoDu + :delta") trong CÙNG transaction với
+# việc ghi giao dịch. Không đọc số liệu cũ lên Python nên nhiều worker ghi
+# đồng thời không bị mất cập nhật.
+# ==================================================
+
+class InvalidWalletError(ValueError):
+    """Ví không tồn tại hoặc không thuộc về người dùng hiện tại"""
+
+_wallets = Wallet.__table__
+_rollups = DailyRollup.__table__
+_rollup_key = ('MaNguoiDung', 'Ngay', 'LoaiGiaoDich', 'MaDanhMuc', 'MaNguonTien')
+
+# UPDATE có điều kiện: chỉ cộng vào ví đúng chủ sở hữu
+_apply_delta = update(_wallets).where(
+    _wallets.c.MaNguonTien == bindparam('w_id'),
+    _wallets.c.MaNguoiDung == bindparam('u_id')
+).values(SoDu=_wallets.c.SoDu + bindparam('delta', type_=_wallets.c.SoDu.type))
+
+class TransactionEffects:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.wallet_deltas = defaultdict(Decimal)
+        # (ngày, loại, danh mục, ví) -> [tổng tiền, số lượng]
+        self.rollup_deltas = defaultdict(lambda: [Decimal('0'), 0])
+        # Cảnh báo ngân sách phát sinh khi flush (trả về cho client nếu người dùng bật thông báo)
+        self.alerts = []
+
+    def record(self, sign, trans_type, amount, wallet_id, dest_wallet_id=None, category_id=None, trans_date=None):
+        """Ghi nhận ảnh hưởng của MỘT giao dịch lên số dư (sign = +1 khi thêm, -1 khi hoàn lại)"""
+        amount = Decimal(amount) * sign
+        # Id ví từ form có thể là chuỗi ("3"), chuẩn hóa để gộp đúng theo ví
+        wallet_id = int(wallet_id)
+        dest_wallet_id = int(dest_wallet_id) if dest_wallet_id else None
+
+        if trans_type == 'thu':
+            self.wallet_deltas[wallet_id] += amount
+        elif trans_type == 'chi':
+            self.wallet_deltas[wallet_id] -= amount
+        elif trans_type == 'chuyen':
+            self.wallet_deltas[wallet_id] -= amount
+            if dest_wallet_id:
+                self.wallet_deltas[dest_wallet_id] += amount
+
+        if trans_date is not None:
+            if isinstance(trans_date, datetime):
+                trans_date = trans_date.date()
+            bucket = self.rollup_deltas[(trans_date, trans_type, int(category_id or 0), wallet_id)]
+            bucket[0] += amount
+            bucket[1] += sign
+
+    def apply(self, t):
+        self.record(1, t.type, t.amount, t.wallet_id, t.dest_wallet_id, t.category_id, t.date)
+
+    def revert(self, t):
+        # Phải gọi TRƯỚC khi sửa các trường của t (để hoàn đúng số liệu cũ)
+        self.record(-1, t.type, t.amount, t.wallet_id, t.dest_wallet_id, t.category_id, t.date)
+
+    def flush(self):
+        """
+        Đẩy toàn bộ biến động xuống DB: một UPDATE executemany cho ví, một UPSERT cho bảng tổng hợp,
+        rồi cộng phần chi theo (ngày, danh mục) vào tiến độ các ngân sách liên quan.
+        """
+        if self.wallet_deltas or self.rollup_deltas:
+            bump_data_version(self.user_id)
+
+        params = [
+            {'w_id': wallet_id, 'u_id': self.user_id, 'delta': delta}
+            for wallet_id, delta in self.wallet_deltas.items() if delta
+        ]
+        self.wallet_deltas.clear()
+        if params:
+            result = db.session.execute(_apply_delta, params)
+            if result.rowcount != len(params):
+                raise InvalidWalletError('Ví không hợp lệ hoặc không thuộc về bạn')
+
+        rollups = [
+            dict(zip(_rollup_key, (self.user_id, d, trans_type, cat_id, wallet_id)), TongTien=total, SoLuong=count)
+            for (d, trans_type, cat_id, wallet_id), (total, count) in self.rollup_deltas.items()
+            if total or count
+        ]
+        spend_deltas = defaultdict(Decimal)
+        for (d, trans_type, cat_id, wallet_id), (total, count) in self.rollup_deltas.items():
+            if trans_type == 'chi' and cat_id:
+                spend_deltas[(d, cat_id)] += total
+        self.rollup_deltas.clear()
+        if rollups:
+            _upsert_rollups(rollups)
+            if any(r['SoLuong'] < 0 for r in rollups):
+                # Dọn các ô đã về 0 sau khi sửa/xóa để bảng không phình vô ích
+                db.session.execute(delete(_rollups).where(
+                    _rollups.c.MaNguoiDung == self.user_id, _rollups.c.SoLuong <= 0
+                ))
+
+        if spend_deltas:
+            self.alerts.extend(apply_spending_deltas(self.user_id, spend_deltas))
+
+def _upsert_rollups(rows):
+    """Cộng dồn vào bảng tổng hợp ngày"""
+    upsert_add(db.session, _rollups, _rollup_key, ('TongTien', 'SoLuong'), rows)
+
+def _grouped_transactions():
+    """SELECT gom giaodich theo đúng khóa của bảng tổng hợp ngày"""
+    t = Transaction.__table__
+    return select(
+        t.c.MaNguoiDung, t.c.NgayGiaoDich, t.c.LoaiGiaoDich,
+        func.coalesce(t.c.MaDanhMuc, 0), t.c.MaNguonTien,
+        func.sum(t.c.SoTien), func.count()
+    ).group_by(
+        t.c.MaNguoiDung, t.c.NgayGiaoDich, t.c.LoaiGiaoDich,
+        func.coalesce(t.c.MaDanhMuc, 0), t.c.MaNguonTien
+    )
+
+def rebuild_rollups(user_id=None):
+    """
+    Dựng lại bảng tổng hợp ngày từ giaodich bằng một câu INSERT ... SELECT ... GROUP BY.
+    Dùng khi nghi ngờ lệch số liệu (lần triển khai đầu tiên đã có migration 0011).
+    """
+    t = Transaction.__table__
+    grouped = _grouped_transactions()
+    clear = delete(_rollups)
+    if user_id is not None:
+        grouped = grouped.where(t.c.MaNguoiDung == user_id)
+        clear = clear.where(_rollups.c.MaNguoiDung == user_id)
+
+    db.session.execute(clear)
+    result = db.session.execute(insert(_rollups).from_select(list(_rollup_key) + ['TongTien', 'SoLuong'], grouped))
+    db.session.commit()
+    return result.rowcount
+
+def forget_category(category_id):
+    """
+    Danh mục bị xóa hẳn (admin): giao dịch của nó trở thành "chưa phân loại" (như ON DELETE SET NULL,
+    kể cả khi SQLite không bật khóa ngoại) và các ô tổng hợp của nó được gộp vào ô MaDanhMuc = 0.
+    Chỉ dựng lại hai nhóm ô đó của những người dùng bị ảnh hưởng. Gọi trước commit của lần xóa;
+    người gọi tự tăng phiên bản dữ liệu (admin tăng phiên bản chung).
+    Trả về danh sách MaNguoiDung bị ảnh hưởng.
+    """
+    t = Transaction.__table__
+    user_ids = list(db.session.execute(
+        select(_rollups.c.MaNguoiDung).where(_rollups.c.MaDanhMuc == category_id).distinct()
+    ).scalars())
+    db.session.execute(update(t).where(t.c.MaDanhMuc == category_id).values(MaDanhMuc=None))
+    db.session.execute(update(t).where(t.c.MaDanhMuc_AI == category_id).values(MaDanhMuc_AI=None))
+    if not user_ids:
+        return []
+
+    db.session.execute(delete(_rollups).where(
+        _rollups.c.MaNguoiDung.in_(user_ids), _rollups.c.MaDanhMuc.in_([category_id, 0])
+    ))
+    db.session.execute(insert(_rollups).from_select(
+        list(_rollup_key) + ['TongTien', 'SoLuong'],
+        _grouped_transactions().where(t.c.MaNguoiDung.in_(user_ids), t.c.MaDanhMuc.is_(None))
+    ))
+    return user_ids
+
+# ==================================================
+# NHẬT KÝ SỐ DƯ & ĐỐI SOÁT
+# ==================================================
+
+def open_wallet(wallet):
+    """Ghi số dư khởi tạo của ví mới vào nhật ký (ví phải đã được flush để có id)"""
+    if wallet.balance:
+        db.session.add(WalletLedger(wallet_id=wallet.id, delta=Decimal(wallet.balance), reason='khoitao'))
+
+def adjust_wallet_balance(wallet, new_balance):
+    """
+    Người dùng sửa tay số dư: ghi phần chênh lệch vào nhật ký rồi cộng chênh lệch
+    bằng UPDATE nguyên tử (không ghi đè), để giao dịch chạy song song không bị mất.
+    """
+    delta = Decimal(new_balance) - Decimal(wallet.balance or 0)
+    if not delta:
+        return
+    db.session.add(WalletLedger(wallet_id=wallet.id, delta=delta, reason='dieuchinh'))
+    db.session.execute(_apply_delta, {'w_id': wallet.id, 'u_id': wallet.user_id, 'delta': delta})
+
+# Chênh lệch nhỏ hơn nửa xu coi như khớp (SQLite lưu Numeric dưới dạng số thực)
+DRIFT_TOLERANCE = literal_column('0.005')
+
+def _expected_balances():
+    """
+    Số dư kỳ vọng của từng ví, tính hoàn toàn bằng SQL gom nhóm (một lượt quét giaodich):
+    tổng nhật ký + (thu - chi - chuyển đi) + chuyển đến.
+    """
+    t = Transaction.__table__
+    tx_effects = union_all(
+        select(
+            t.c.MaNguonTien.label('wallet_id'),
+            func.sum(case((t.c.LoaiGiaoDich == 'thu', t.c.SoTien), else_=-t.c.SoTien)).label('delta')
+        ).group_by(t.c.MaNguonTien),
+        select(
+            t.c.MaNguonTien_Dich.label('wallet_id'),
+            func.sum(t.c.SoTien).label('delta')
+        ).where(t.c.LoaiGiaoDich == 'chuyen', t.c.MaNguonTien_Dich.isnot(None)).group_by(t.c.MaNguonTien_Dich),
+        select(
+            WalletLedger.__table__.c.MaNguonTien.label('wallet_id'),
+            func.sum(WalletLedger.__table__.c.SoTienThayDoi).label('delta')
+        ).group_by(WalletLedger.__table__.c.MaNguonTien)
+    ).subquery()
+
+    totals = select(
+        tx_effects.c.wallet_id, func.sum(tx_effects.c.delta).label('expected')
+    ).group_by(tx_effects.c.wallet_id).subquery()
+
+    ledger_count = select(
+        WalletLedger.__table__.c.MaNguonTien.label('wallet_id'),
+        func.count().label('entries')
+    ).group_by(WalletLedger.__table__.c.MaNguonTien).subquery()
+
+    w = _wallets
+    expected = func.coalesce(totals.c.expected, 0)
+    return select(
+        w.c.MaNguonTien.label('wallet_id'),
+        w.c.MaNguoiDung.label('user_id'),
+        w.c.SoDu.label('balance'),
+        expected.label('expected'),
+        func.coalesce(ledger_count.c.entries, 0).label('ledger_entries')
+    ).outerjoin(totals, totals.c.wallet_id == w.c.MaNguonTien)\
+     .outerjoin(ledger_count, ledger_count.c.wallet_id == w.c.MaNguonTien)\
+     .where(func.abs(expected - func.coalesce(w.c.SoDu, 0)) > DRIFT_TOLERANCE)
+
+def reconcile_balances(repair=False, baseline=False):
+    """
+    Đối soát số dư mọi ví với nhật ký + giaodich. Trả về danh sách các ví bị lệch.
+    - repair:   ghi đè SoDu bằng số dư kỳ vọng cho các ví lệch.
+    - baseline: với ví cũ CHƯA có dòng nhật ký nào (tạo trước khi có nhật ký),
+                ghi một dòng 'doisoat' để chấp nhận số dư hiện tại làm mốc.
+    Chỉ đọc các cột cần thiết theo luồng, không nạp đối tượng ORM.
+    """
+    drifts = []
+    result = db.session.execute(_expected_balances().execution_options(yield_per=1000))
+    for row in result:
+        drifts.append({
+            'wallet_id': row.wallet_id,
+            'user_id': row.user_id,
+            'balance': Decimal(row.balance or 0),
+            'expected': Decimal(row.expected),
+            'drift': Decimal(row.balance or 0) - Decimal(row.expected),
+            'ledger_entries': row.ledger_entries,
+        })
+
+    adopted = [d for d in drifts if baseline and d['ledger_entries'] == 0]
+    adopted_ids = {d['wallet_id'] for d in adopted}
+    if adopted:
+        db.session.execute(insert(WalletLedger), [
+            {'wallet_id': d['wallet_id'], 'delta': d['drift'], 'reason': 'doisoat'} for d in adopted
+        ])
+
+    to_repair = [d for d in drifts if repair and d['wallet_id'] not in adopted_ids]
+    if to_repair:
+        db.session.execute(
+            update(_wallets).where(_wallets.c.MaNguonTien == bindparam('w_id'))
+            .values(SoDu=bindparam('expected', type_=_wallets.c.SoDu.type)),
+            [{'w_id': d['wallet_id'], 'expected': d['expected']} for d in to_repair]
+        )
+
+    if adopted or to_repair:
+        db.session.commit()
+    return drifts
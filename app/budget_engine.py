@@ -0,0 +1,211 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import update, insert, delete, select, bindparam, func, and_
+
+from app import db
+from app.models import Budget, BudgetProgress, BudgetAlert, DailyRollup, UserSetting, budget_category
+
+# ==================================================
+# BỘ MÁY THEO DÕI NGÂN SÁCH
+# Được gọi ngay trong các đường ghi giao dịch (qua TransactionEffects.flush):
+# chỉ những ngân sách có danh mục + khung ngày chứa giao dịch vừa đổi mới bị
+# cộng thêm vào số đã chi lưu sẵn (ngansach_tiendo). Khi vượt mốc 50/80/100%
+# sẽ sinh cảnh báo (ngansach_canhbao) để trả về ngay cho người dùng.
+# ==================================================
+
+THRESHOLDS = (50, 80, 100)
+
+_progress = BudgetProgress.__table__
+_alerts = BudgetAlert.__table__
+
+_add_spent = update(_progress).where(
+    _progress.c.MaNganSach == bindparam('b_id')
+).values(DaChi=_progress.c.DaChi + bindparam('delta', type_=_progress.c.DaChi.type))
+
+def threshold_level(spent, limit):
+    """Mốc cao nhất đã chạm (0 nếu chưa tới 50%)"""
+    if not limit or limit <= 0:
+        return 0
+    percent = Decimal(spent or 0) * 100 / Decimal(limit)
+    return max((t for t in THRESHOLDS if percent >= t), default=0)
+
+def get_budget_spending(user_id=None, budget_ids=None):
+    """
+    Tổng chi của các ngân sách (của một người dùng, hoặc tất cả nếu user_id=None) trong một truy vấn gom nhóm:
+    ngansach -> ngansach_danhmuc -> bảng tổng hợp ngày, mỗi ngân sách lọc theo khung ngày riêng.
+    Trả về {MaNganSach: số tiền đã chi}.
+    """
+    query = db.session.query(Budget.id, func.sum(DailyRollup.total))\
+        .join(budget_category, budget_category.c.MaNganSach == Budget.id)\
+        .join(DailyRollup, and_(
+            DailyRollup.user_id == Budget.user_id,
+            DailyRollup.category_id == budget_category.c.MaDanhMuc,
+            DailyRollup.type == 'chi',
+            DailyRollup.date >= Budget.start_date,
+            DailyRollup.date <= Budget.end_date
+        ))\
+        .filter(Budget.is_deleted == False)
+    if user_id is not None:
+        query = query.filter(Budget.user_id == user_id)
+    if budget_ids is not None:
+        query = query.filter(Budget.id.in_(budget_ids))
+    return {budget_id: spent for budget_id, spent in query.group_by(Budget.id).all()}
+
+def apply_spending_deltas(user_id, spend_deltas):
+    """
+    spend_deltas: {(ngày, MaDanhMuc): số tiền chi thay đổi} của một lần ghi.
+    Cộng dồn vào tiến độ các ngân sách bị ảnh hưởng, trả về các cảnh báo cần báo cho người dùng.
+    """
+    spend_deltas = {key: amount for key, amount in spend_deltas.items() if key[1] and amount}
+    if not spend_deltas:
+        return []
+
+    dates = [d for d, _ in spend_deltas]
+    rows = db.session.query(
+        Budget.id, Budget.name, Budget.limit_amount, Budget.start_date, Budget.end_date, budget_category.c.MaDanhMuc
+    ).join(budget_category, budget_category.c.MaNganSach == Budget.id)\
+     .filter(
+        Budget.user_id == user_id, Budget.is_deleted == False,
+        budget_category.c.MaDanhMuc.in_({cat_id for _, cat_id in spend_deltas}),
+        Budget.start_date <= max(dates), Budget.end_date >= min(dates)
+    ).all()
+
+    budget_deltas = defaultdict(Decimal)
+    budgets = {}
+    for budget_id, name, limit, start, end, cat_id in rows:
+        budgets[budget_id] = (name, limit)
+        for (d, delta_cat), amount in spend_deltas.items():
+            if delta_cat == cat_id and start <= d <= end:
+                budget_deltas[budget_id] += amount
+    budget_deltas = {budget_id: delta for budget_id, delta in budget_deltas.items() if delta}
+    if not budget_deltas:
+        return []
+
+    current = _load_progress(user_id, budget_deltas, budgets)
+    db.session.execute(_add_spent, [{'b_id': b_id, 'delta': delta} for b_id, delta in budget_deltas.items()])
+
+    changes = []
+    for budget_id, delta in budget_deltas.items():
+        old_spent, old_level = current[budget_id]
+        name, limit = budgets[budget_id]
+        changes.append((budget_id, name, limit, old_spent + delta, old_level))
+    return _record_levels(user_id, changes)
+
+def sync_budget(budget):
+    """
+    Tính lại tiến độ một ngân sách từ bảng tổng hợp (khi tạo/sửa hạn mức, khung ngày, danh mục).
+    Ngân sách phải đã được flush để có id và danh mục trong ngansach_danhmuc.
+    """
+    spent = Decimal(get_budget_spending(budget.user_id, [budget.id]).get(budget.id) or 0)
+    row = db.session.execute(
+        select(_progress.c.MucDaCanhBao).where(_progress.c.MaNganSach == budget.id)
+    ).first()
+    if row is None:
+        db.session.execute(insert(_progress).values(MaNganSach=budget.id, DaChi=spent, MucDaCanhBao=0))
+        old_level = 0
+    else:
+        db.session.execute(update(_progress).where(_progress.c.MaNganSach == budget.id).values(DaChi=spent))
+        old_level = row[0]
+    return _record_levels(budget.user_id, [(budget.id, budget.name, budget.limit_amount, spent, old_level)])
+
+def rebuild_budget_progress(user_id=None, budget_ids=None):
+    """Dựng lại bảng tiến độ từ bảng tổng hợp ngày (sau rebuild_rollups); không sinh cảnh báo."""
+    budgets = db.session.query(Budget.id, Budget.limit_amount).filter(Budget.is_deleted == False)
+    if user_id is not None:
+        budgets = budgets.filter(Budget.user_id == user_id)
+    if budget_ids is not None:
+        budgets = budgets.filter(Budget.id.in_(budget_ids))
+    limits = dict(budgets.all())
+    spending = get_budget_spending(user_id, list(limits) if budget_ids is not None else None)
+
+    db.session.execute(delete(_progress).where(_progress.c.MaNganSach.in_(list(limits))))
+    rows = []
+    for budget_id, limit in limits.items():
+        spent = Decimal(spending.get(budget_id) or 0)
+        rows.append({'MaNganSach': budget_id, 'DaChi': spent, 'MucDaCanhBao': threshold_level(spent, limit)})
+    if rows:
+        db.session.execute(insert(_progress), rows)
+    db.session.commit()
+    return len(rows)
+
+def get_budget_progress(budget_ids):
+    """Đọc số đã chi lưu sẵn: {MaNganSach: số tiền} (tra khóa chính, không quét giao dịch)"""
+    if not budget_ids:
+        return {}
+    return dict(db.session.execute(
+        select(_progress.c.MaNganSach, _progress.c.DaChi).where(_progress.c.MaNganSach.in_(budget_ids))
+    ).all())
+
+def _load_progress(user_id, budget_deltas, budgets):
+    """
+    {MaNganSach: (số đã chi TRƯỚC lần ghi này, mốc đã cảnh báo)}.
+    Ngân sách tạo trước khi có bảng tiến độ được tính một lần từ bảng tổng hợp
+    (bảng tổng hợp đã gồm biến động vừa ghi nên phải trừ ra).
+    """
+    current = {
+        budget_id: (Decimal(spent or 0), level)
+        for budget_id, spent, level in db.session.execute(
+            select(_progress.c.MaNganSach, _progress.c.DaChi, _progress.c.MucDaCanhBao)
+            .where(_progress.c.MaNganSach.in_(list(budget_deltas)))
+        ).all()
+    }
+    missing = [budget_id for budget_id in budget_deltas if budget_id not in current]
+    if missing:
+        spent_now = get_budget_spending(user_id, missing)
+        rows = []
+        for budget_id in missing:
+            spent = Decimal(spent_now.get(budget_id) or 0) - budget_deltas[budget_id]
+            level = threshold_level(spent, budgets[budget_id][1])
+            rows.append({'MaNganSach': budget_id, 'DaChi': spent, 'MucDaCanhBao': level})
+            current[budget_id] = (spent, level)
+        db.session.execute(insert(_progress), rows)
+    return current
+
+def _record_levels(user_id, changes):
+    """
+    changes: [(id, tên, hạn mức, số đã chi mới, mốc cũ)].
+    Cập nhật mốc đã cảnh báo; mốc nào mới vượt qua thì ghi cảnh báo.
+    Câu UPDATE có điều kiện "MucDaCanhBao < :level" đảm bảo hai request đồng thời
+    không cùng ghi một cảnh báo.
+    """
+    crossed = []
+    for budget_id, name, limit, spent, old_level in changes:
+        level = threshold_level(spent, limit)
+        if level == old_level:
+            continue
+        guard = _progress.c.MucDaCanhBao < level if level > old_level else _progress.c.MucDaCanhBao > level
+        result = db.session.execute(
+            update(_progress).where(_progress.c.MaNganSach == budget_id, guard).values(MucDaCanhBao=level)
+        )
+        if level > old_level and result.rowcount:
+            for threshold in THRESHOLDS:
+                if old_level < threshold <= level:
+                    crossed.append({
+                        'budget_id': budget_id, 'budget_name': name, 'threshold': threshold,
+                        'spent': spent, 'limit': limit
+                    })
+    if not crossed:
+        return []
+
+    # Cảnh báo luôn lưu ở trạng thái chưa đọc; chỉ đánh dấu đã đọc khi trình duyệt xác nhận
+    # đã hiển thị (POST /api/budgets/alerts/read). Người dùng bật thông báo thì được trả ngay
+    # trong response, tắt thì chờ trang Ngân sách hỏi GET /api/budgets/alerts.
+    for alert in crossed:
+        alert['id'] = db.session.execute(insert(_alerts).values(
+            MaNganSach=alert['budget_id'], MaNguoiDung=user_id, MucCanhBao=alert['threshold'],
+            DaChi=alert['spent'], DaDoc=False
+        )).inserted_primary_key[0]
+    setting = db.session.get(UserSetting, user_id)
+    notify = bool(setting is None or setting.notifications)
+    return [_serialize_alert(a) for a in crossed] if notify else []
+
+def _serialize_alert(alert):
+    return {
+        'id': alert['id'],
+        'budget_id': alert['budget_id'],
+        'budget_name': alert['budget_name'],
+        'threshold': alert['threshold'],
+        'spent': float(alert['spent']),
+        'limit': float(alert['limit']),
+    }
@@ -0,0 +1,173 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from app import db
+from app.database import upsert_add
+from app.models import UserDataVersion
+from config import Config
+
+# ==================================================
+# BỘ NHỚ ĐỆM (CACHE) DÙNG CHUNG CHO CÁC TÍNH NĂNG ĐỌC NHIỀU
+# - LRUCache: trong tiến trình, giới hạn số phần tử (mặc định)
+# - RedisCache: dùng chung giữa các worker, bật bằng CACHE_URL=redis://...
+# Dữ liệu cũ không bị xóa chủ động: mỗi khóa cache chứa "phiên bản dữ liệu"
+# của người dùng, phiên bản tăng lên khi có ghi => khóa cũ tự hết được dùng.
+# ==================================================
+
+class LRUCache:
+    """Cache trong tiến trình, an toàn đa luồng, loại bỏ phần tử ít dùng nhất khi đầy"""
+
+    def __init__(self, name, maxsize=1024, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        """Chỉ ghi khi khóa chưa có (hoặc đã hết hạn). Trả về True nếu đã ghi"""
+        ttl = ttl or self.ttl
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > time.monotonic()):
+                return False
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': 'memory',
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0,
+        }
+
+class RedisCache:
+    """Cache dùng chung giữa các worker/máy chủ (cần cài thêm thư viện redis)"""
+
+    def __init__(self, name, url, ttl=None):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_URL trỏ tới Redis nhưng chưa cài thư viện 'redis' (pip install redis)") from e
+
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = redis.Redis.from_url(url)
+        self._prefix = f"finai:{name}:"
+
+    def _key(self, key):
+        return self._prefix + repr(key)
+
+    def get(self, key):
+        raw = self._client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._key(key), pickle.dumps(value), ex=ttl or self.ttl)
+
+    def add(self, key, value, ttl=None):
+        """SET NX: chỉ một worker ghi được khóa chưa có. Trả về True nếu đã ghi"""
+        return bool(self._client.set(self._key(key), pickle.dumps(value), ex=ttl or self.ttl, nx=True))
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def clear(self):
+        for key in self._client.scan_iter(self._prefix + '*'):
+            self._client.delete(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': 'redis',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0,
+        }
+
+_caches = {}
+
+def make_cache(name, maxsize=1024, ttl=None, shared=True):
+    """
+    Tạo (hoặc lấy lại) cache theo tên. shared=True sẽ dùng backend chung (Redis)
+    nếu CACHE_URL được cấu hình, ngược lại dùng LRU trong tiến trình.
+    """
+    if name not in _caches:
+        url = Config.CACHE_URL
+        if shared and url and url.startswith('redis'):
+            _caches[name] = RedisCache(name, url, ttl=ttl)
+        else:
+            _caches[name] = LRUCache(name, maxsize=maxsize, ttl=ttl)
+    return _caches[name]
+
+def cache_stats():
+    """Số liệu hit/miss của mọi cache đang có (cho trang quản trị / metrics)"""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+# ==================================================
+# PHIÊN BẢN DỮ LIỆU THEO NGƯỜI DÙNG
+# Mọi đường ghi (giao dịch, ví, danh mục) gọi bump_data_version() trong cùng
+# transaction. Dòng MaNguoiDung = 0 là phiên bản chung (danh mục hệ thống).
+# ==================================================
+
+GLOBAL_VERSION_ID = 0
+
+_versions = UserDataVersion.__table__
+
+def bump_data_version(user_id):
+    upsert_add(db.session, _versions, ('MaNguoiDung',), ('PhienBan',), [{'MaNguoiDung': user_id, 'PhienBan': 1}])
+
+def get_data_version(user_id):
+    """Trả về (phiên bản chung, phiên bản của người dùng) bằng một truy vấn khóa chính"""
+    rows = dict(db.session.execute(
+        select(_versions.c.MaNguoiDung, _versions.c.PhienBan)
+        .where(_versions.c.MaNguoiDung.in_((GLOBAL_VERSION_ID, user_id)))
+    ).all())
+    return rows.get(GLOBAL_VERSION_ID, 0), rows.get(user_id, 0)
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from flask import g, session
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.cache import make_cache
+from app.models import User
+from config import Config
+
+# ==================================================
+# NGƯỜI DÙNG HIỆN TẠI CỦA REQUEST
+# - get_current_user(): đối tượng User (kèm settings) tải MỘT lần mỗi request, nhớ trên flask.g.
+# - get_current_profile(): vài trường hiển thị (tên, email, quyền, tiền tệ...) cho template,
+#   cache thêm USER_PROFILE_CACHE_TTL giây giữa các request (0 = tắt). Mọi chỗ sửa hồ sơ,
+#   tùy chỉnh, quyền hoặc trạng thái phải gọi invalidate_user_profile().
+# ==================================================
+
+profile_cache = make_cache('user_profile', maxsize=Config.USER_PROFILE_CACHE_SIZE, ttl=Config.USER_PROFILE_CACHE_TTL)
+
+_SETTING_FIELDS = ('currency', 'language', 'notifications', 'ai_suggestions', 'theme')
+
+def get_current_user():
+    """User đang đăng nhập (None nếu chưa đăng nhập / đã bị xóa)"""
+    if 'user_id' not in session:
+        return None
+    if '_current_user' not in g:
+        g._current_user = db.session.get(User, session['user_id'], options=[joinedload(User.settings)])
+    return g._current_user
+
+def _profile_fields(user):
+    settings = user.settings
+    return {
+        'id': user.id, 'name': user.name, 'email': user.email,
+        'role': user.role, 'status': user.status,
+        'settings': {field: getattr(settings, field) for field in _SETTING_FIELDS} if settings else None,
+    }
+
+def _as_profile(fields):
+    # Cho phép template dùng y như đối tượng User: user.name, user.settings.currency
+    settings = SimpleNamespace(**fields['settings']) if fields['settings'] else None
+    return SimpleNamespace(**dict(fields, settings=settings))
+
+def get_current_profile():
+    """Hồ sơ rút gọn của người đang đăng nhập cho template (không chạm DB nếu cache còn hạn)"""
+    if 'user_id' not in session:
+        return None
+    if '_current_profile' in g:
+        return g._current_profile
+
+    user_id = session['user_id']
+    fields = profile_cache.get(user_id) if Config.USER_PROFILE_CACHE_TTL else None
+    if fields is None:
+        user = get_current_user()
+        fields = _profile_fields(user) if user else None
+        if fields and Config.USER_PROFILE_CACHE_TTL:
+            profile_cache.set(user_id, fields)
+
+    g._current_profile = _as_profile(fields) if fields else None
+    return g._current_profile
+
+def invalidate_user_profile(user_id):
+    """Gọi SAU KHI commit thay đổi tên / tùy chỉnh / quyền / trạng thái của người dùng"""
+    profile_cache.delete(user_id)
+    if session.get('user_id') == user_id:
+        g.pop('_current_profile', None)
@@ -0,0 +1,66 @@
+from sqlalchemy import event, update, insert, bindparam
+from sqlalchemy.dialects import sqlite, postgresql
+
+# ==================================================
+# CẤU HÌNH KẾT NỐI DATABASE
+# SQLite: mỗi kết nối mới được đặt PRAGMA theo cấu hình của app đang dựng
+# (WAL, synchronous, busy_timeout, mmap_size, cache_size), nên create_app(config_class)
+# ghi đè được từng giá trị. Pool cho DB máy chủ nằm ở SQLALCHEMY_ENGINE_OPTIONS.
+# ==================================================
+
+def _sqlite_pragmas(config):
+    return (
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+    )
+
+def configure_engine(engine, config):
+    """config: app.config (hoặc dict bất kỳ có các khóa SQLITE_*)"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = _sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+# ==================================================
+# CỘNG DỒN (UPSERT) VÀO CÁC BẢNG ĐẾM
+# Bảng tổng hợp ngày, phiên bản dữ liệu, thống kê AI theo ngày đều là
+# "khóa -> bộ đếm": dòng chưa có thì INSERT, có rồi thì cộng thêm.
+# ==================================================
+
+def upsert_add(session, table, key_columns, counter_columns, rows):
+    """
+    rows: list dict (khóa + bộ đếm). SQLite/PostgreSQL: một câu INSERT ... ON CONFLICT DO UPDATE
+    cộng dồn bộ đếm; DB khác: thử UPDATE từng dòng, dòng nào chưa có thì INSERT.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        module = sqlite if dialect == 'sqlite' else postgresql
+        stmt = module.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={col: table.c[col] + stmt.excluded[col] for col in counter_columns}
+        )
+        session.execute(stmt, rows)
+        return
+
+    key_match = [table.c[col] == bindparam('k_' + col) for col in key_columns]
+    add_stmt = update(table).where(*key_match).values(
+        **{col: table.c[col] + bindparam('d_' + col) for col in counter_columns}
+    )
+    for row in rows:
+        params = {'k_' + col: row[col] for col in key_columns}
+        params.update({'d_' + col: row[col] for col in counter_columns})
+        if session.execute(add_stmt, params).rowcount == 0:
+            session.execute(insert(table).values(**row))
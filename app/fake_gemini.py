@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==================================================
+# GEMINI GIẢ LẬP (CHẠY OFFLINE ĐỂ ĐO TẢI / BENCHMARK)
+# - FakeGeminiClient: thay cho genai.Client trong tiến trình (AI_BACKEND=fake)
+# - Máy chủ HTTP cùng giao thức REST của Gemini (generateContent,
+#   streamGenerateContent?alt=sse): python -m app.fake_gemini --port 8765
+#   rồi đặt GEMINI_BASE_URL=http://127.0.0.1:8765 để client thật gọi vào.
+# Độ trễ, kích thước đoạn stream, tỉ lệ lỗi và tỉ lệ JSON hỏng cấu hình qua biến môi trường.
+# ==================================================
+
+class FakeGeminiError(RuntimeError):
+    """Lỗi giả lập (tương đương 503 UNAVAILABLE của Gemini)"""
+
+def parse_latency(spec):
+    """
+    Phân phối độ trễ (giây):
+      'fixed:0.3' | 'uniform:0.1:0.8' | 'normal:0.5:0.1' | 'lognormal:-0.7:0.5' (tham số của log)
+    """
+    kind, *params = (spec or 'fixed:0').split(':')
+    params = [float(p) for p in params]
+    samplers = {
+        'fixed': lambda rng: params[0],
+        'uniform': lambda rng: rng.uniform(params[0], params[1]),
+        'normal': lambda rng: rng.gauss(params[0], params[1]),
+        'lognormal': lambda rng: rng.lognormvariate(params[0], params[1]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Phân phối độ trễ không hỗ trợ: {spec}")
+    sampler = samplers[kind]
+    return lambda rng: max(0.0, sampler(rng))
+
+class FakeGeminiSettings:
+    def __init__(self, latency=None, chunk_latency=None, chunk_chars=None,
+                 error_rate=None, malformed_rate=None, seed=None):
+        env = os.environ.get
+        self.latency = parse_latency(latency or env('FAKE_GEMINI_LATENCY', 'lognormal:-0.7:0.5'))
+        self.chunk_latency = parse_latency(chunk_latency or env('FAKE_GEMINI_CHUNK_LATENCY', 'uniform:0.02:0.08'))
+        self.chunk_chars = int(chunk_chars or env('FAKE_GEMINI_CHUNK_CHARS', 24))
+        self.error_rate = float(error_rate if error_rate is not None else env('FAKE_GEMINI_ERROR_RATE', 0))
+        self.malformed_rate = float(malformed_rate if malformed_rate is not None else env('FAKE_GEMINI_MALFORMED_RATE', 0))
+        seed = seed if seed is not None else env('FAKE_GEMINI_SEED')
+        self.rng = random.Random(int(seed) if seed not in (None, '') else None)
+        self._lock = threading.Lock()
+
+    def sample(self, sampler):
+        with self._lock:
+            return sampler(self.rng)
+
+    def roll(self, rate):
+        with self._lock:
+            return self.rng.random() < rate
+
+_CATEGORIES = re.compile(r'Danh mục hiện có:\s*(.*)')
+_BATCH_ITEMS = re.compile(r'Danh sách giao dịch \(JSON\):\s*(\[.*\])')
+_SINGLE_ITEM = re.compile(r'Giao dịch cần phân loại:\s*"(.*)"')
+
+CHAT_ANSWER = (
+    "Tháng này bạn chi tiêu khá ổn định, phần lớn dành cho ăn uống và đi lại 😊\n"
+    "Nếu muốn dư thêm một chút, hãy thử đặt ngân sách cho mục chi nhiều nhất và theo dõi mỗi tuần nhé!"
+)
+
+INSIGHTS_ANSWER = "Đặt hạn mức chi ăn uống theo tuần\nChuyển 10% thu nhập vào tiết kiệm\nRà soát các khoản đăng ký hằng tháng"
+
+class FakeGeminiModel:
+    """Sinh câu trả lời giả đúng định dạng mà ExpenseAI mong đợi"""
+
+    def __init__(self, settings=None):
+        self.settings = settings or FakeGeminiSettings()
+
+    def _pick(self, text, categories):
+        # Cố định theo nội dung để cùng mô tả luôn ra cùng danh mục (cache/bộ phân loại đo được)
+        digest = int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16)
+        return categories[digest % len(categories)] if categories else "Khác"
+
+    def _json_answer(self, prompt):
+        match = _CATEGORIES.search(prompt)
+        categories = [c.strip() for c in match.group(1).split(',')] if match else []
+        batch = _BATCH_ITEMS.search(prompt)
+        if batch:
+            items = json.loads(batch.group(1))
+            return json.dumps([
+                {'index': item['index'], 'category': self._pick(item['text'], categories),
+                 'confidence': 60 + int(hashlib.md5(item['text'].encode('utf-8')).hexdigest(), 16) % 40}
+                for item in items
+            ], ensure_ascii=False)
+        single = _SINGLE_ITEM.search(prompt)
+        text = single.group(1) if single else prompt
+        return json.dumps({'category': self._pick(text, categories), 'confidence': 85}, ensure_ascii=False)
+
+    def respond(self, prompt, json_mode):
+        """Toàn bộ câu trả lời (sau độ trễ giả lập), hoặc ném FakeGeminiError"""
+        settings = self.settings
+        time.sleep(settings.sample(settings.latency))
+        if settings.roll(settings.error_rate):
+            raise FakeGeminiError("503 UNAVAILABLE (giả lập)")
+        if not json_mode:
+            return INSIGHTS_ANSWER if '3 lời khuyên' in prompt else CHAT_ANSWER
+        answer = self._json_answer(prompt)
+        if settings.roll(settings.malformed_rate):
+            # JSON bị cắt cụt giữa chừng như khi model trả lỗi định dạng
+            return answer[:max(1, len(answer) // 2)]
+        return answer
+
+    def stream(self, prompt, json_mode=False):
+        """Sinh từng đoạn chunk_chars ký tự, mỗi đoạn cách nhau chunk_latency"""
+        settings = self.settings
+        text = self.respond(prompt, json_mode)
+        for start in range(0, len(text), settings.chunk_chars):
+            if start:
+                time.sleep(settings.sample(settings.chunk_latency))
+                if settings.roll(settings.error_rate):
+                    raise FakeGeminiError("Luồng bị ngắt giữa chừng (giả lập)")
+            yield text[start:start + settings.chunk_chars]
+
+# ---------- Client trong tiến trình (cùng giao diện genai.Client.models) ----------
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+def _prompt_text(contents):
+    return contents if isinstance(contents, str) else json.dumps(contents, ensure_ascii=False, default=str)
+
+def _is_json(config):
+    return getattr(config, 'response_mime_type', None) == 'application/json'
+
+class _FakeModels:
+    def __init__(self, model):
+        self._model = model
+
+    def generate_content(self, model, contents, config=None):
+        return FakeResponse(self._model.respond(_prompt_text(contents), _is_json(config)))
+
+    def generate_content_stream(self, model, contents, config=None):
+        for piece in self._model.stream(_prompt_text(contents), _is_json(config)):
+            yield FakeResponse(piece)
+
+class FakeGeminiClient:
+    def __init__(self, settings=None):
+        self.models = _FakeModels(FakeGeminiModel(settings))
+
+# ---------- Máy chủ HTTP giả lập REST API của Gemini ----------
+
+def _candidate(text):
+    return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP', 'index': 0}]}
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    model = None  # gán khi khởi động máy chủ
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        prompt = '\n'.join(
+            part.get('text', '') for content in request.get('contents', []) for part in content.get('parts', [])
+        )
+        json_mode = (request.get('generationConfig') or {}).get('responseMimeType') == 'application/json'
+
+        try:
+            if ':streamGenerateContent' in self.path:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for piece in self.model.stream(prompt, json_mode):
+                        self.wfile.write(f"data: {json.dumps(_candidate(piece), ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+                        self.wfile.flush()
+                except FakeGeminiError:
+                    pass  # đóng kết nối giữa chừng
+                return
+            if ':generateContent' in self.path:
+                self._send_json(200, _candidate(self.model.respond(prompt, json_mode)))
+                return
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+        except FakeGeminiError as e:
+            self._send_json(503, {'error': {'code': 503, 'message': str(e), 'status': 'UNAVAILABLE'}})
+
+def serve(host='127.0.0.1', port=8765, settings=None):
+    FakeGeminiHandler.model = FakeGeminiModel(settings)
+    server = ThreadingHTTPServer((host, port), FakeGeminiHandler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Máy chủ Gemini giả lập cho benchmark offline")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', help="VD: lognormal:-0.7:0.5, fixed:0.3, uniform:0.1:0.8")
+    parser.add_argument('--chunk-latency', help="Độ trễ giữa các đoạn stream, cùng cú pháp --latency")
+    parser.add_argument('--chunk-chars', type=int, help="Số ký tự mỗi đoạn stream")
+    parser.add_argument('--error-rate', type=float, help="Tỉ lệ lời gọi lỗi 503 (0-1)")
+    parser.add_argument('--malformed-rate', type=float, help="Tỉ lệ câu trả lời JSON bị hỏng (0-1)")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    settings = FakeGeminiSettings(args.latency, args.chunk_latency, args.chunk_chars,
+                                  args.error_rate, args.malformed_rate, args.seed)
+    server = serve(args.host, args.port, settings)
+    print(f"Fake Gemini đang chạy tại http://{args.host}:{args.port} (đặt GEMINI_BASE_URL tới địa chỉ này)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import func
+
+from app import db
+from app.ai_service import ai_engine
+from app.cache import make_cache, RedisCache
+from app.models import DailyRollup, UserSetting
+from config import Config
+
+# ==================================================
+# GỢI Ý AI CHO DASHBOARD
+# Tổng thu/chi tháng này lấy bằng MỘT truy vấn gom nhóm trên bảng tổng hợp ngày.
+# Kết quả AI được cache theo (người dùng, ngày, hash tổng thu/chi): số liệu
+# không đổi thì không gọi lại model, kể cả khi người dùng mở lại dashboard nhiều lần.
+# ==================================================
+
+INSIGHTS_QUESTION = (
+    "Dựa vào số liệu trên, hãy đưa ra 3 lời khuyên tài chính. "
+    "YÊU CẦU NGHIÊM NGẶT ĐỂ ĐỊNH DẠNG: "
+    "1. TUYỆT ĐỐI KHÔNG chào hỏi, KHÔNG xưng hô (vd: Cấm dùng 'Chào bạn', 'FinAI đây'). "
+    "2. TUYỆT ĐỐI KHÔNG có câu dẫn dắt (vd: Cấm dùng 'Đây là lời khuyên...'). "
+    "3. Trả về ĐÚNG 3 dòng, mỗi dòng là một lời khuyên trực tiếp, hành động ngay. "
+    "4. Độ dài tối đa: Dưới 15 chữ cho MỖI dòng. "
+    "5. Không dùng markdown, không dùng icon."
+)
+
+insights_cache = make_cache('insights', maxsize=Config.INSIGHTS_CACHE_SIZE, ttl=24 * 3600)
+
+def month_totals(user_id, today=None):
+    """(tổng thu, tổng chi) từ đầu tháng tới nay: một truy vấn SUM ... GROUP BY loại"""
+    today = today or date.today()
+    rows = dict(db.session.query(DailyRollup.type, func.sum(DailyRollup.total)).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.date >= today.replace(day=1),
+        DailyRollup.type.in_(('thu', 'chi'))
+    ).group_by(DailyRollup.type).all())
+    return rows.get('thu') or 0, rows.get('chi') or 0
+
+def _cache_key(user_id, total_income, total_expense, today):
+    digest = hashlib.sha1(f"{int(total_income)}:{int(total_expense)}".encode()).hexdigest()[:12]
+    return (user_id, today.isoformat(), digest)
+
+def get_insights(user_id):
+    """
+    Trả về list 3 lời khuyên (lấy từ cache nếu tổng thu/chi hôm nay không đổi).
+    Lỗi từ AI được ném ra dưới dạng RuntimeError(thông báo) để route trả về.
+    """
+    today = date.today()
+    total_income, total_expense = month_totals(user_id, today)
+    key = _cache_key(user_id, total_income, total_expense, today)
+
+    insights = insights_cache.get(key)
+    if insights is not None:
+        return insights
+
+    context_text = f"Thống kê tháng này - Thu nhập: {int(total_income):,} VND. Chi tiêu: {int(total_expense):,} VND."
+
+    # Gọi AI (Tận dụng lại hàm chat_with_data)
+    response_stream = ai_engine.chat_with_data(INSIGHTS_QUESTION, context_text)
+    if isinstance(response_stream, str): # Xử lý lỗi từ engine
+        raise RuntimeError(response_stream)
+
+    # Gom toàn bộ luồng Stream lại thành 1 chuỗi duy nhất ở Backend
+    full_answer = ""
+    for chunk in response_stream:
+        if chunk.text:
+            full_answer += chunk.text
+
+    # Làm sạch dữ liệu và tách thành mảng (Array) 3 câu
+    # Lọc bỏ các dòng trống và ký tự gạch đầu dòng rườm rà
+    insights = [line.strip().lstrip('-*•').strip() for line in full_answer.split('\n') if line.strip()][:3]
+    # AI trả về rỗng thì không cache: lần mở dashboard sau sẽ hỏi lại thay vì trống cả ngày
+    if insights:
+        insights_cache.set(key, insights)
+    return insights
+
+# ==================================================
+# LÀM NÓNG CACHE TRƯỚC (TÙY CHỌN, INSIGHTS_PREWARM=1)
+# Một luồng nền định kỳ tính sẵn gợi ý cho người dùng có giao dịch trong
+# INSIGHTS_ACTIVE_DAYS ngày gần đây, để lần mở dashboard đầu tiên trong ngày không phải chờ AI.
+# Chỉ chạy khi cache dùng chung (CACHE_URL=redis://...): mỗi worker có luồng riêng nhưng
+# mỗi chu kỳ chỉ worker giành được khóa PREWARM_LEADER_KEY mới gọi AI.
+# ==================================================
+
+PREWARM_LEADER_KEY = 'prewarm-leader'
+
+def active_user_ids(days):
+    since = date.today() - timedelta(days=days)
+    rows = db.session.query(DailyRollup.user_id).filter(DailyRollup.date >= since).distinct().all()
+    return [user_id for user_id, in rows]
+
+def prewarm_insights(days=None):
+    """Tính sẵn gợi ý cho các người dùng đang hoạt động (bỏ qua người tắt gợi ý AI)"""
+    days = days or Config.INSIGHTS_ACTIVE_DAYS
+    user_ids = active_user_ids(days)
+    disabled = {
+        user_id for user_id, in db.session.query(UserSetting.user_id)
+        .filter(UserSetting.user_id.in_(user_ids), UserSetting.ai_suggestions == 0).all()
+    } if user_ids else set()
+
+    warmed = 0
+    for user_id in user_ids:
+        if user_id in disabled:
+            continue
+        try:
+            get_insights(user_id)
+            warmed += 1
+        except Exception as e:
+            print(f"Lỗi làm nóng gợi ý AI (user {user_id}): {e}")
+    db.session.remove()
+    return warmed
+
+def start_insights_prewarm(app, interval=None):
+    """Bật luồng làm nóng; trả về None (kèm cảnh báo) nếu cache gợi ý không dùng chung"""
+    interval = interval or app.config['INSIGHTS_PREWARM_INTERVAL']
+    if not isinstance(insights_cache, RedisCache):
+        # Cache riêng từng tiến trình: N worker sẽ gọi AI N lần cho cùng kết quả
+        app.logger.warning("INSIGHTS_PREWARM bị bỏ qua: cần CACHE_URL=redis://... để các worker dùng chung cache")
+        return None
+
+    def worker():
+        while True:
+            # Khóa hết hạn sau một chu kỳ: mỗi chu kỳ chỉ một worker làm nóng
+            if insights_cache.add(PREWARM_LEADER_KEY, os.getpid(), ttl=interval):
+                with app.app_context():
+                    try:
+                        prewarm_insights()
+                    except Exception as e:
+                        print(f"Lỗi luồng làm nóng gợi ý AI: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=worker, name='insights-prewarm', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,265 @@
+import json
+import math
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.cache import make_cache
+from app.models import AIUserModel, Transaction
+from app.prediction_cache import normalize_description
+from config import Config
+
+# ==================================================
+# BỘ PHÂN LOẠI CỤC BỘ THEO NGƯỜI DÙNG (TẦNG ĐẦU, TRƯỚC GEMINI)
+# Multinomial Naive Bayes trên n-gram ký tự của mô tả đã chuẩn hóa, học từ
+# chính các giao dịch đã phân loại của người dùng. Mô hình giữ trong RAM (LRU),
+# lưu nén vào bảng ai_mohinh_nguoidung, và chỉ học thêm các giao dịch có
+# MaGiaoDich lớn hơn mốc đã học (không huấn luyện lại từ đầu).
+# Mọi lần đọc/ghi bảng mô hình dùng kết nối riêng (không commit session của request);
+# ghi có điều kiện theo PhienBan để các worker không đè mất thay đổi của nhau.
+# ==================================================
+
+NGRAM_SIZES = (2, 3, 4)
+
+# Mỗi mô hình tối đa bao lâu mới hỏi DB xem có giao dịch mới / bản mới hơn (giây)
+SYNC_INTERVAL = 30
+
+# Số lần thử lại khi sửa nhãn đụng độ với worker khác trước khi xóa trắng để học lại
+RELABEL_ATTEMPTS = 3
+
+_models = AIUserModel.__table__
+
+def extract_features(text):
+    text = f" {normalize_description(text)} "
+    features = Counter()
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            features[text[i:i + n]] += 1
+    return features
+
+class NaiveBayesModel:
+    def __init__(self, doc_counts=None, feature_counts=None, watermark=0, revision=None):
+        self.doc_counts = Counter(doc_counts or {})            # danh mục -> số mẫu
+        self.feature_counts = {                                  # danh mục -> {n-gram: số lần}
+            cat_id: Counter(counts) for cat_id, counts in (feature_counts or {}).items()
+        }
+        self.totals = Counter({cat_id: sum(c.values()) for cat_id, c in self.feature_counts.items()})
+        self.vocab = Counter()                                   # n-gram -> tổng số lần (để biết |V|)
+        for counts in self.feature_counts.values():
+            self.vocab.update(counts)
+        self.watermark = watermark
+        self.revision = revision  # PhienBan của bản đã lưu (None: chưa có trong DB)
+        self.dirty = False
+        self.next_sync = 0
+        self.lock = threading.Lock()
+
+    @property
+    def samples(self):
+        return sum(self.doc_counts.values())
+
+    def update(self, text, category_id, sign=1):
+        """Học (sign=1) hoặc bỏ học (sign=-1) một mẫu"""
+        features = extract_features(text)
+        if not features:
+            return
+        counts = self.feature_counts.setdefault(category_id, Counter())
+        for feature, n in features.items():
+            counts[feature] += n * sign
+            self.vocab[feature] += n * sign
+            if counts[feature] <= 0:
+                del counts[feature]
+            if self.vocab[feature] <= 0:
+                del self.vocab[feature]
+        self.totals[category_id] += sum(features.values()) * sign
+        self.doc_counts[category_id] += sign
+        if self.doc_counts[category_id] <= 0:
+            for store in (self.doc_counts, self.totals, self.feature_counts):
+                store.pop(category_id, None)
+        self.dirty = True
+
+    def predict(self, text, allowed=None):
+        """Trả về (MaDanhMuc, xác suất hậu nghiệm) hoặc (None, 0)"""
+        features = extract_features(text)
+        candidates = [c for c in self.doc_counts if allowed is None or c in allowed]
+        if not features or not candidates:
+            return None, 0.0
+
+        total_docs = self.samples
+        vocab_size = len(self.vocab) + 1
+        scores = {}
+        for cat_id in candidates:
+            counts = self.feature_counts.get(cat_id, {})
+            denominator = math.log(self.totals[cat_id] + vocab_size)
+            score = math.log((self.doc_counts[cat_id] + 1) / (total_docs + len(self.doc_counts)))
+            for feature, n in features.items():
+                score += n * (math.log(counts.get(feature, 0) + 1) - denominator)
+            scores[cat_id] = score
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        probability = 1 / sum(math.exp(s - top) for s in scores.values())
+        return best, probability
+
+    def to_bytes(self):
+        payload = {
+            'docs': {str(k): v for k, v in self.doc_counts.items()},
+            'features': {str(k): dict(v) for k, v in self.feature_counts.items()},
+        }
+        return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, raw, watermark, revision=None):
+        payload = json.loads(zlib.decompress(raw).decode('utf-8'))
+        return cls(
+            doc_counts={int(k): v for k, v in payload['docs'].items()},
+            feature_counts={int(k): v for k, v in payload['features'].items()},
+            watermark=watermark, revision=revision
+        )
+
+class LocalClassifier:
+    def __init__(self, threshold, min_samples, maxsize):
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.models = make_cache('local_classifier', maxsize=maxsize, shared=False)
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.deferred = 0
+        self.local_seconds = 0.0
+
+    def predict(self, user_id, description, allowed_ids):
+        """
+        Trả về (MaDanhMuc, độ tự tin 0-100) khi mô hình đủ chắc chắn,
+        ngược lại None để gọi tiếp Gemini.
+        """
+        model = self._model(user_id)
+        started = time.perf_counter()
+        with model.lock:
+            enough = model.samples >= self.min_samples
+            category_id, probability = model.predict(description, allowed_ids) if enough else (None, 0.0)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.local_seconds += elapsed
+            if category_id is not None and probability >= self.threshold:
+                self.answered += 1
+            else:
+                self.deferred += 1
+        if category_id is None or probability < self.threshold:
+            return None
+        return category_id, round(probability * 100)
+
+    def mark_stale(self, user_id):
+        """Có giao dịch mới: lần dự đoán tới sẽ học thêm ngay, không đợi SYNC_INTERVAL"""
+        model = self.models.get(user_id)
+        if model is not None:
+            model.next_sync = 0
+
+    def relabel(self, user_id, trans_id, old=None, new=None):
+        """
+        Giao dịch ĐÃ học bị sửa/xóa (gọi SAU commit): bỏ học nhãn cũ (old), học nhãn mới (new)
+        ngay trên bản đã lưu và tăng PhienBan để mọi worker nạp lại ở lần đồng bộ tới.
+        old/new là (mô tả, MaDanhMuc). Giao dịch chưa học (id > mốc) sẽ được học khi đồng bộ.
+        """
+        changes = [(label, sign) for label, sign in ((old, -1), (new, 1)) if label and label[0] and label[1]]
+        if not changes:
+            return
+        for _ in range(RELABEL_ATTEMPTS):
+            with db.engine.begin() as conn:
+                row = conn.execute(select(_models).where(_models.c.MaNguoiDung == user_id)).first()
+                if row is None or trans_id > row.MocGiaoDich:
+                    return
+                model = NaiveBayesModel.from_bytes(row.DuLieu, row.MocGiaoDich, row.PhienBan)
+                for (description, category_id), sign in changes:
+                    model.update(description, category_id, sign)
+                if self._store(conn, user_id, model):
+                    self.models.set(user_id, model)
+                    return
+
+        # Đụng độ liên tục: xóa trắng mô hình đã lưu (vẫn tăng PhienBan), các worker học lại từ đầu
+        with db.engine.begin() as conn:
+            conn.execute(update(_models).where(_models.c.MaNguoiDung == user_id).values(
+                DuLieu=NaiveBayesModel().to_bytes(), MocGiaoDich=0, SoMau=0,
+                PhienBan=_models.c.PhienBan + 1, NgayCapNhat=datetime.now()
+            ))
+        self.models.delete(user_id)
+
+    def _model(self, user_id):
+        model = self.models.get(user_id)
+        if model is None or model.next_sync <= time.monotonic():
+            model = self._sync(user_id, model)
+        return model
+
+    def _sync(self, user_id, model):
+        """
+        Nạp lại nếu bản đã lưu có PhienBan khác bản trong RAM, học thêm các giao dịch
+        đã phân loại mới hơn mốc, rồi lưu mô hình nếu có thay đổi.
+        """
+        with db.engine.begin() as conn:
+            stored = conn.execute(
+                select(_models.c.PhienBan).where(_models.c.MaNguoiDung == user_id)
+            ).scalar_one_or_none()
+            if model is None or model.revision != stored:
+                row = conn.execute(select(_models).where(_models.c.MaNguoiDung == user_id)).first()
+                model = NaiveBayesModel.from_bytes(row.DuLieu, row.MocGiaoDich, row.PhienBan) if row \
+                    else NaiveBayesModel()
+                self.models.set(user_id, model)
+
+            with model.lock:
+                rows = conn.execute(select(Transaction.id, Transaction.description, Transaction.category_id).where(
+                    Transaction.user_id == user_id,
+                    Transaction.id > model.watermark,
+                    Transaction.category_id.isnot(None),
+                    Transaction.description.isnot(None)
+                ).order_by(Transaction.id).execution_options(yield_per=1000))
+
+                for trans_id, description, category_id in rows:
+                    model.update(description, category_id)
+                    model.watermark = trans_id
+                model.next_sync = time.monotonic() + SYNC_INTERVAL
+
+                if model.dirty and not self._store(conn, user_id, model):
+                    # Worker khác vừa ghi bản mới hơn: bỏ bản trong RAM, lần sau nạp lại
+                    self.models.delete(user_id)
+        return model
+
+    def _store(self, conn, user_id, model):
+        """Ghi mô hình nếu bản trong DB vẫn là model.revision (ghi xong thì hết dirty). Trả về False khi đụng độ"""
+        values = dict(DuLieu=model.to_bytes(), MocGiaoDich=model.watermark, SoMau=model.samples,
+                      NgayCapNhat=datetime.now())
+        if model.revision is None:
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(_models).values(MaNguoiDung=user_id, PhienBan=1, **values))
+            except IntegrityError:
+                return False
+            model.revision, model.dirty = 1, False
+            return True
+
+        result = conn.execute(update(_models).where(
+            _models.c.MaNguoiDung == user_id, _models.c.PhienBan == model.revision
+        ).values(PhienBan=model.revision + 1, **values))
+        if not result.rowcount:
+            return False
+        model.revision += 1
+        model.dirty = False
+        return True
+
+    def stats(self):
+        total = self.answered + self.deferred
+        return {
+            'answered_locally': self.answered,
+            'deferred_to_model': self.deferred,
+            'local_ratio': round(self.answered / total, 4) if total else 0,
+            'avg_local_latency_ms': round(self.local_seconds * 1000 / total, 3) if total else 0,
+            'threshold': self.threshold,
+        }
+
+local_classifier = LocalClassifier(
+    Config.LOCAL_CLASSIFIER_THRESHOLD, Config.LOCAL_CLASSIFIER_MIN_SAMPLES, Config.LOCAL_CLASSIFIER_CACHE_SIZE
+)
@@ -0,0 +1,243 @@
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+from app.ai_guard import LatencyHistogram
+
+# ==================================================
+# ĐO HIỆU NĂNG THEO ENDPOINT
+# - Mỗi request: độ trễ (histogram), số câu SQL và tổng thời gian SQL, đếm qua
+#   sự kiện before/after_cursor_execute của engine, cộng dồn trên flask.g.
+# - Câu SQL chậm hơn SLOW_QUERY_MS: chuẩn hóa (bỏ giá trị cụ thể, gộp IN (...))
+#   rồi ghi log + đếm theo câu đã chuẩn hóa.
+# Chi phí mỗi câu SQL chỉ là hai lần perf_counter(); mỗi request giữ khóa một lần.
+# Mỗi app có registry riêng (app.extensions['metrics']), dựng từ app.config trong init_metrics().
+# Xuất ra /metrics (định dạng text của Prometheus) qua render_prometheus().
+# ==================================================
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SLOW_QUERY_MAX_STATEMENTS = 100  # số câu SQL chậm khác nhau được giữ lại
+SLOW_QUERY_LABEL_CHARS = 300
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s|:\w+)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_statement(statement):
+    """Bỏ giá trị cụ thể để các câu cùng dạng gộp chung một dòng"""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _IN_LIST.sub('IN (...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram(REQUEST_BUCKETS)
+        self.queries = LatencyHistogram(QUERY_COUNT_BUCKETS)  # số câu SQL mỗi request
+        self.statuses = defaultdict(int)
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+class MetricsRegistry:
+    def __init__(self, slow_query_ms):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self._lock = threading.Lock()
+        self.endpoints = defaultdict(EndpointStats)
+        self.slow_queries = {}  # câu đã chuẩn hóa -> [số lần, tổng giây, lâu nhất]
+        self.background_statements = 0
+        self.background_sql_seconds = 0.0
+
+    # ---------- Gắn vào app / engine ----------
+
+    def init_app(self, app, engine):
+        app.before_request(self._start_request)
+        app.after_request(self._remember_status)
+        app.teardown_request(self._finish_request)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._logger = app.logger
+
+    def _start_request(self):
+        g._metrics_started = time.perf_counter()
+        g._sql_statements = 0
+        g._sql_seconds = 0.0
+
+    def _remember_status(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, exc):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'not_found'
+        status = g.pop('_metrics_status', 500 if exc else 200)
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            stats.latency.observe(elapsed)
+            stats.queries.observe(g._sql_statements)
+            stats.statuses[status] += 1
+            stats.sql_statements += g._sql_statements
+            stats.sql_seconds += g._sql_seconds
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Giữ mốc thời gian trên ExecutionContext: câu lỗi (không có after_*) không để lại rác
+        context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+
+        if has_request_context() and '_metrics_started' in g:
+            g._sql_statements += 1
+            g._sql_seconds += elapsed
+        else:
+            # Luồng nền (ghi nhật ký AI, làm nóng gợi ý...) và script
+            with self._lock:
+                self.background_statements += 1
+                self.background_sql_seconds += elapsed
+
+        if elapsed >= self.slow_query_seconds:
+            self._record_slow_query(statement, elapsed)
+
+    def _record_slow_query(self, statement, elapsed):
+        normalized = normalize_statement(statement)
+        with self._lock:
+            entry = self.slow_queries.get(normalized)
+            if entry is None:
+                if len(self.slow_queries) >= SLOW_QUERY_MAX_STATEMENTS:
+                    normalized, entry = '(other)', self.slow_queries.setdefault('(other)', [0, 0.0, 0.0])
+                else:
+                    entry = self.slow_queries[normalized] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+        endpoint = request.endpoint if has_request_context() else '-'
+        self._logger.warning("Slow query %.1f ms [%s]: %s", elapsed * 1000, endpoint, normalized)
+
+    # ---------- Xuất số liệu ----------
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'endpoints': {
+                    name: {
+                        'latency': stats.latency.snapshot(),
+                        'queries': stats.queries.snapshot(),
+                        'statuses': dict(stats.statuses),
+                        'sql_statements': stats.sql_statements,
+                        'sql_seconds': stats.sql_seconds,
+                    } for name, stats in self.endpoints.items()
+                },
+                'slow_queries': {sql: list(entry) for sql, entry in self.slow_queries.items()},
+                'background_statements': self.background_statements,
+                'background_sql_seconds': self.background_sql_seconds,
+            }
+
+def init_metrics(app, engine):
+    """Gắn bộ đo vào app (nếu METRICS_ENABLED), lưu ở app.extensions['metrics']"""
+    if not app.config.get('METRICS_ENABLED'):
+        return None
+    registry = MetricsRegistry(app.config['SLOW_QUERY_MS'])
+    registry.init_app(app, engine)
+    app.extensions['metrics'] = registry
+    return registry
+
+# ==================================================
+# ĐỊNH DẠNG TEXT CỦA PROMETHEUS
+# ==================================================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+class PrometheusWriter:
+    """Gom các mẫu theo tên metric để mỗi họ metric có đúng một dòng # TYPE"""
+
+    def __init__(self, prefix='finai'):
+        self.prefix = prefix
+        self._families = {}
+
+    def add(self, metric, kind, value, **labels):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        family = self._families.setdefault(f"{self.prefix}_{metric}", (kind, []))
+        family[1].append((labels, value))
+
+    def add_histogram(self, metric, snapshot, **labels):
+        for bound, count in snapshot['buckets'].items():
+            self.add(f"{metric}_bucket", 'histogram', count, **labels, le=bound)
+        self.add(f"{metric}_sum", 'histogram', snapshot['sum'], **labels)
+        self.add(f"{metric}_count", 'histogram', snapshot['count'], **labels)
+
+    def add_stats(self, metric, stats, **labels):
+        """Mọi giá trị số của một dict stats() thành gauge {metric}_{khóa}"""
+        for key, value in stats.items():
+            self.add(f"{metric}_{key}", 'gauge', value, **labels)
+
+    def render(self):
+        lines = []
+        declared = set()
+        for name, (kind, samples) in self._families.items():
+            # Các họ _bucket/_sum/_count của histogram khai báo TYPE theo tên gốc
+            base = name.rsplit('_', 1)[0] if kind == 'histogram' else name
+            if base not in declared:
+                lines.append(f"# TYPE {base} {kind}")
+                declared.add(base)
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+def render_prometheus(registry=None, gauges=None, histograms=None):
+    """
+    Số liệu của registry (None nếu tắt METRICS_ENABLED) + của các thành phần khác (cache, cầu dao AI...):
+    - gauges: {tên: dict stats()} hoặc {tên: {nhãn: dict stats()}} (giá trị không phải số bị bỏ qua)
+    - histograms: {tên: {nhãn: LatencyHistogram.snapshot()}}
+    """
+    out = PrometheusWriter()
+    if registry is not None:
+        _add_registry(out, registry.snapshot())
+    for name, stats in (gauges or {}).items():
+        if stats and all(isinstance(v, dict) for v in stats.values()):
+            for label, sub in stats.items():
+                out.add_stats(name, sub, name=label)
+        else:
+            out.add_stats(name, stats)
+    for name, snapshots in (histograms or {}).items():
+        for label, hist in snapshots.items():
+            out.add_histogram(name, hist, name=label)
+    return out.render()
+
+def _add_registry(out, snapshot):
+    endpoints = sorted(snapshot['endpoints'].items())
+    for endpoint, stats in endpoints:
+        out.add_histogram('http_request_duration_seconds', stats['latency'], endpoint=endpoint)
+    for endpoint, stats in endpoints:
+        out.add_histogram('db_statements_per_request', stats['queries'], endpoint=endpoint)
+    for endpoint, stats in endpoints:
+        for status, count in sorted(stats['statuses'].items()):
+            out.add('http_requests_total', 'counter', count, endpoint=endpoint, status=status)
+    for endpoint, stats in endpoints:
+        out.add('db_statements_total', 'counter', stats['sql_statements'], endpoint=endpoint)
+    for endpoint, stats in endpoints:
+        out.add('db_statement_seconds_total', 'counter', round(stats['sql_seconds'], 6), endpoint=endpoint)
+    out.add('db_background_statements_total', 'counter', snapshot['background_statements'])
+    out.add('db_background_statement_seconds_total', 'counter', round(snapshot['background_sql_seconds'], 6))
+
+    # Câu chậm tốn nhiều thời gian nhất lên trước
+    slow = sorted(snapshot['slow_queries'].items(), key=lambda item: item[1][1], reverse=True)
+    for sql, (count, _, _) in slow:
+        out.add('db_slow_queries_total', 'counter', count, statement=sql[:SLOW_QUERY_LABEL_CHARS])
+    for sql, (_, seconds, _) in slow:
+        out.add('db_slow_query_seconds_total', 'counter', round(seconds, 6), statement=sql[:SLOW_QUERY_LABEL_CHARS])
+    for sql, (_, _, longest) in slow:
+        out.add('db_slow_query_max_seconds', 'gauge', round(longest, 6), statement=sql[:SLOW_QUERY_LABEL_CHARS])
@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, insert
+
+from app import db
+
+# ==================================================
+# CHẠY MIGRATION THEO PHIÊN BẢN
+# Mỗi file versions/NNNN_ten.py có hàm upgrade(conn). Phiên bản đã chạy được
+# ghi vào bảng schema_phienban; mỗi migration chạy trong transaction riêng
+# cùng với dòng ghi phiên bản. Không có DDL nào chạy lúc import app:
+# triển khai mới / cập nhật đều chạy `python migrate.py`.
+# ==================================================
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), 'versions')
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+_metadata = MetaData()
+schema_versions = Table(
+    'schema_phienban', _metadata,
+    Column('PhienBan', Integer, primary_key=True, autoincrement=False),
+    Column('TenMigration', String(100), nullable=False),
+    Column('NgayApDung', DateTime, nullable=False),
+)
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def load(self):
+        spec = importlib.util.spec_from_file_location(f'app.migrations.versions.m{self.version:04d}', self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+def discover():
+    """Các migration trong thư mục versions, theo thứ tự phiên bản"""
+    migrations = []
+    for filename in sorted(os.listdir(VERSIONS_DIR)):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(VERSIONS_DIR, filename)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Trùng số phiên bản migration trong app/migrations/versions")
+    return migrations
+
+def applied_versions(engine=None):
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        schema_versions.create(conn, checkfirst=True)
+        return {row.PhienBan for row in conn.execute(select(schema_versions.c.PhienBan))}
+
+def pending(engine=None):
+    applied = applied_versions(engine)
+    return [m for m in discover() if m.version not in applied]
+
+def upgrade(engine=None, fresh=False):
+    """
+    Chạy mọi migration chưa áp dụng. fresh=True xóa sạch các bảng (kể cả bảng phiên bản)
+    trước khi chạy lại từ đầu, dùng cho seed_data.py. Trả về danh sách migration đã chạy.
+    """
+    engine = engine or db.engine
+    if fresh:
+        db.metadata.drop_all(engine)
+        schema_versions.drop(engine, checkfirst=True)
+
+    done = []
+    for migration in pending(engine):
+        module = migration.load()
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(insert(schema_versions).values(
+                PhienBan=migration.version, TenMigration=migration.name, NgayApDung=datetime.now()
+            ))
+        print(f"Đã áp dụng migration {migration.version:04d}_{migration.name}")
+        done.append(migration)
+    return done
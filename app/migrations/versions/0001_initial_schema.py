@@ -0,0 +1,116 @@
+"""
+Phiên bản gốc: các bảng của ứng dụng trước khi có hệ thống migration, chép cố định tại đây.
+
+KHÔNG sửa file này theo models: bảng/cột thêm về sau phải nằm trong migration mới, nếu không
+DB tạo mới và DB được nâng cấp sẽ lệch nhau. Bảng đã có sẵn (triển khai cũ từng dùng
+db.create_all() lúc import) được giữ nguyên.
+"""
+from sqlalchemy import (MetaData, Table, Column, ForeignKey, Integer, String, Numeric,
+                        Boolean, Date, DateTime, Float, Text)
+
+metadata = MetaData()
+
+Table('nguoidung', metadata,
+    Column('MaNguoiDung', Integer, primary_key=True, autoincrement=True),
+    Column('HoTen', String(100)),
+    Column('Email', String(100), unique=True, nullable=False, index=True),
+    Column('MatKhau', String(200), nullable=False),
+    Column('VaiTro', String(20)),
+    Column('TrangThai', Integer),
+    Column('NgayTao', DateTime),
+    Column('LanDangNhapCuoi', DateTime),
+)
+
+Table('thietlapnguoidung', metadata,
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True),
+    Column('DonViTienTe', String(10)),
+    Column('NgonNgu', String(10)),
+    Column('ThongBao', Integer),
+    Column('AI_GoiY', Integer),
+    Column('GiaoDien', String(20)),
+)
+
+Table('nguontien', metadata,
+    Column('MaNguonTien', Integer, primary_key=True, autoincrement=True),
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False, index=True),
+    Column('TenNguonTien', String(100), nullable=False),
+    Column('LoaiNguonTien', String(50)),
+    Column('SoDu', Numeric(15, 2)),
+    Column('NgayTao', DateTime),
+    Column('DaXoa', Boolean),
+)
+
+Table('danhmuc', metadata,
+    Column('MaDanhMuc', Integer, primary_key=True, autoincrement=True),
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=True),
+    Column('TenDanhMuc', String(100), nullable=False),
+    Column('LoaiDanhMuc', String(10), nullable=False),
+    Column('MaDanhMucCha', Integer, ForeignKey('danhmuc.MaDanhMuc', ondelete='SET NULL')),
+    Column('DaXoa', Boolean),
+)
+
+Table('giaodich', metadata,
+    Column('MaGiaoDich', Integer, primary_key=True, autoincrement=True),
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False, index=True),
+    Column('MaNguonTien', Integer, ForeignKey('nguontien.MaNguonTien'), nullable=False, index=True),
+    Column('MaNguonTien_Dich', Integer, ForeignKey('nguontien.MaNguonTien'), nullable=True),
+    Column('MaDanhMuc', Integer, ForeignKey('danhmuc.MaDanhMuc', ondelete='SET NULL'), nullable=True, index=True),
+    Column('LoaiGiaoDich', String(20), nullable=False),
+    Column('SoTien', Numeric(15, 2), nullable=False),
+    Column('MoTa', String(255)),
+    Column('NgayGiaoDich', Date, nullable=False, index=True),
+    Column('NgayTao', DateTime),
+    Column('MaDanhMuc_AI', Integer, ForeignKey('danhmuc.MaDanhMuc', ondelete='SET NULL')),
+    Column('DoTinCay_AI', Float),
+)
+
+Table('ngansach', metadata,
+    Column('MaNganSach', Integer, primary_key=True, autoincrement=True),
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False),
+    Column('TenNganSach', String(100), nullable=False),
+    Column('SoTienGioiHan', Numeric(15, 2), nullable=False),
+    Column('NgayBatDau', Date, nullable=False),
+    Column('NgayKetThuc', Date, nullable=False),
+    Column('NgayTao', DateTime),
+    Column('DaXoa', Boolean),
+)
+
+Table('ngansach_danhmuc', metadata,
+    Column('MaNganSach', Integer, ForeignKey('ngansach.MaNganSach', ondelete='CASCADE'), primary_key=True),
+    Column('MaDanhMuc', Integer, ForeignKey('danhmuc.MaDanhMuc', ondelete='CASCADE'), primary_key=True),
+)
+
+Table('ai_lichsu', metadata,
+    Column('MaAI_Log', Integer, primary_key=True, autoincrement=True),
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE')),
+    Column('MaGiaoDich', Integer, ForeignKey('giaodich.MaGiaoDich', ondelete='SET NULL')),
+    Column('DanhMucDuDoan', Integer, ForeignKey('danhmuc.MaDanhMuc', ondelete='CASCADE')),
+    Column('DanhMucChinhXac', Integer, ForeignKey('danhmuc.MaDanhMuc', ondelete='CASCADE')),
+    Column('DoTinCay', Float),
+    Column('PhanHoi', String(50)),
+    Column('NgayTao', DateTime),
+)
+
+Table('xacthuc2fa', metadata,
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True),
+    Column('SecretKey', String(100), nullable=False),
+    Column('DaKichHoat', Integer),
+    Column('MaDuPhong', String(200)),
+)
+
+Table('chatbot_lichsu', metadata,
+    Column('MaHoiThoai', Integer, primary_key=True, autoincrement=True),
+    Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE')),
+    Column('NoiDungHoi', Text),
+    Column('NoiDungTraLoi', Text),
+    Column('NgayTao', DateTime),
+)
+
+Table('password_reset_tokens', metadata,
+    Column('Email', String(100), ForeignKey('nguoidung.Email', ondelete='CASCADE'), primary_key=True),
+    Column('Token', String(100), nullable=False),
+    Column('ThoiGianHetHan', DateTime, nullable=False),
+)
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,19 @@
+"""
+Chỉ mục nhiều cột cho các truy vấn nóng:
+- giaodich (MaNguoiDung, NgayGiaoDich, LoaiGiaoDich): danh sách giao dịch lọc theo
+  khoảng ngày / loại, dựng lại bảng tổng hợp, ngữ cảnh chatbot.
+- chatbot_lichsu (MaNguoiDung, NgayTao): lịch sử chat của người dùng và trang quản trị.
+"""
+from sqlalchemy import Index, Table, MetaData
+
+def upgrade(conn):
+    metadata = MetaData()
+    transactions = Table('giaodich', metadata, autoload_with=conn)
+    chat_logs = Table('chatbot_lichsu', metadata, autoload_with=conn)
+
+    Index('ix_giaodich_nguoidung_ngay_loai',
+          transactions.c.MaNguoiDung, transactions.c.NgayGiaoDich, transactions.c.LoaiGiaoDich
+          ).create(conn, checkfirst=True)
+    Index('ix_chatbot_lichsu_nguoidung_ngaytao',
+          chat_logs.c.MaNguoiDung, chat_logs.c.NgayTao
+          ).create(conn, checkfirst=True)
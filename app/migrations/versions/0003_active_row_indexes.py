@@ -0,0 +1,24 @@
+"""
+Chỉ mục một phần (partial) chỉ chứa các dòng chưa xóa mềm (DaXoa = 0): mọi màn hình
+đều lọc "MaNguoiDung = ? AND DaXoa = 0" trên nguontien, danhmuc, ngansach nên chỉ mục
+nhỏ hơn và không phải lọc lại các dòng đã xóa.
+ngansach còn kèm (NgayBatDau, NgayKetThuc) cho truy vấn tìm ngân sách chứa một ngày.
+DB không hỗ trợ partial index (MySQL) sẽ nhận chỉ mục thường.
+"""
+from sqlalchemy import Index, Table, MetaData, text
+
+def _active_index(name, table, *columns):
+    return Index(name, *(table.c[col] for col in columns),
+                 sqlite_where=text('"DaXoa" = 0'),
+                 postgresql_where=text('"DaXoa" = false'))
+
+def upgrade(conn):
+    metadata = MetaData()
+    wallets = Table('nguontien', metadata, autoload_with=conn)
+    categories = Table('danhmuc', metadata, autoload_with=conn)
+    budgets = Table('ngansach', metadata, autoload_with=conn)
+
+    _active_index('ix_nguontien_nguoidung_conhieuluc', wallets, 'MaNguoiDung').create(conn, checkfirst=True)
+    _active_index('ix_danhmuc_nguoidung_conhieuluc', categories, 'MaNguoiDung').create(conn, checkfirst=True)
+    _active_index('ix_ngansach_nguoidung_ngay_conhieuluc', budgets,
+                  'MaNguoiDung', 'NgayBatDau', 'NgayKetThuc').create(conn, checkfirst=True)
@@ -0,0 +1,16 @@
+"""
+Nhật ký biến động số dư ví (nguontien_nhatky), chỉ ghi thêm: số dư khởi tạo,
+chỉnh tay, bù trừ khi đối soát.
+"""
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Integer, String, Numeric, DateTime
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table('nguontien', metadata, autoload_with=conn)
+    Table('nguontien_nhatky', metadata,
+        Column('MaNhatKy', Integer, primary_key=True, autoincrement=True),
+        Column('MaNguonTien', Integer, ForeignKey('nguontien.MaNguonTien', ondelete='CASCADE'), nullable=False, index=True),
+        Column('SoTienThayDoi', Numeric(15, 2), nullable=False),
+        Column('LyDo', String(20), nullable=False),
+        Column('NgayTao', DateTime),
+    ).create(conn, checkfirst=True)
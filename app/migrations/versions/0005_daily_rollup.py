@@ -0,0 +1,19 @@
+"""
+Bảng tổng hợp giao dịch theo ngày (giaodich_tonghop_ngay), khóa theo
+(người dùng, ngày, loại, danh mục - 0 nếu chưa phân loại, ví).
+Dữ liệu cho các giao dịch đã có được dựng ở migration 0011.
+"""
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Integer, String, Numeric, Date
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table('nguoidung', metadata, autoload_with=conn)
+    Table('giaodich_tonghop_ngay', metadata,
+        Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True),
+        Column('Ngay', Date, primary_key=True),
+        Column('LoaiGiaoDich', String(20), primary_key=True),
+        Column('MaDanhMuc', Integer, primary_key=True),
+        Column('MaNguonTien', Integer, primary_key=True),
+        Column('TongTien', Numeric(18, 2), nullable=False),
+        Column('SoLuong', Integer, nullable=False),
+    ).create(conn, checkfirst=True)
@@ -0,0 +1,12 @@
+"""
+Bộ đếm phiên bản dữ liệu theo người dùng (nguoidung_phienban), dùng làm một phần khóa cache.
+MaNguoiDung = 0 là phiên bản chung nên cố ý không có khóa ngoại.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table('nguoidung_phienban', metadata,
+        Column('MaNguoiDung', Integer, primary_key=True, autoincrement=False),
+        Column('PhienBan', Integer, nullable=False),
+    ).create(conn, checkfirst=True)
@@ -0,0 +1,24 @@
+"""
+Tiến độ ngân sách cộng dồn (ngansach_tiendo) và cảnh báo vượt mốc 50/80/100% (ngansach_canhbao).
+"""
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Integer, Numeric, Boolean, DateTime
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table('nguoidung', metadata, autoload_with=conn)
+    Table('ngansach', metadata, autoload_with=conn)
+    Table('ngansach_tiendo', metadata,
+        Column('MaNganSach', Integer, ForeignKey('ngansach.MaNganSach', ondelete='CASCADE'), primary_key=True),
+        Column('DaChi', Numeric(18, 2), nullable=False),
+        Column('MucDaCanhBao', Integer, nullable=False),
+        Column('NgayCapNhat', DateTime),
+    ).create(conn, checkfirst=True)
+    Table('ngansach_canhbao', metadata,
+        Column('MaCanhBao', Integer, primary_key=True, autoincrement=True),
+        Column('MaNganSach', Integer, ForeignKey('ngansach.MaNganSach', ondelete='CASCADE'), nullable=False),
+        Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False, index=True),
+        Column('MucCanhBao', Integer, nullable=False),
+        Column('DaChi', Numeric(18, 2), nullable=False),
+        Column('DaDoc', Boolean),
+        Column('NgayTao', DateTime),
+    ).create(conn, checkfirst=True)
@@ -0,0 +1,18 @@
+"""
+Kết quả dự đoán danh mục đã có (ai_dudoan_cache), khóa theo mô tả đã chuẩn hóa
++ dấu vân tay bộ danh mục của người dùng.
+"""
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Integer, String, Float, DateTime
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table('nguoidung', metadata, autoload_with=conn)
+    Table('danhmuc', metadata, autoload_with=conn)
+    Table('ai_dudoan_cache', metadata,
+        Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True),
+        Column('MoTaChuanHoa', String(255), primary_key=True),
+        Column('DauVanTay', String(16), primary_key=True),
+        Column('MaDanhMuc', Integer, ForeignKey('danhmuc.MaDanhMuc', ondelete='CASCADE')),
+        Column('DoTinCay', Float),
+        Column('NgayTao', DateTime),
+    ).create(conn, checkfirst=True)
@@ -0,0 +1,15 @@
+"""
+Mô hình phân loại cục bộ (Naive Bayes, nén zlib) của từng người dùng (ai_mohinh_nguoidung).
+"""
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Integer, LargeBinary, DateTime
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table('nguoidung', metadata, autoload_with=conn)
+    Table('ai_mohinh_nguoidung', metadata,
+        Column('MaNguoiDung', Integer, ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True),
+        Column('DuLieu', LargeBinary, nullable=False),
+        Column('MocGiaoDich', Integer, nullable=False),
+        Column('SoMau', Integer, nullable=False),
+        Column('NgayCapNhat', DateTime),
+    ).create(conn, checkfirst=True)
@@ -0,0 +1,17 @@
+"""
+Thống kê AI cộng dồn theo (ngày, danh mục AI đoán, nhóm độ tin cậy) cho trang giám sát AI (ai_thongke_ngay).
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, Float, Date
+
+def upgrade(conn):
+    metadata = MetaData()
+    Table('ai_thongke_ngay', metadata,
+        Column('Ngay', Date, primary_key=True),
+        Column('MaDanhMuc', Integer, primary_key=True, autoincrement=False),
+        Column('NhomTinCay', Integer, primary_key=True, autoincrement=False),
+        Column('SoDuDoan', Integer, nullable=False),
+        Column('TongDoTre', Float, nullable=False),
+        Column('SoDanhGia', Integer, nullable=False),
+        Column('SoDung', Integer, nullable=False),
+        Column('TongDoTinCay', Float, nullable=False),
+    ).create(conn, checkfirst=True)
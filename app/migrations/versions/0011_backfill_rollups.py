@@ -0,0 +1,63 @@
+"""
+Dữ liệu cho bảng tổng hợp ngày (0005) và tiến độ ngân sách (0007) từ các giao dịch đã có.
+Báo cáo, ngân sách, ngữ cảnh chatbot và gợi ý AI chỉ đọc các bảng này: thiếu bước này thì
+người dùng cũ thấy tổng bằng 0. Chạy lại được bất cứ lúc nào bằng `python rebuild_rollups.py`.
+
+Chỉ dùng bảng phản chiếu từ DB tại thời điểm chạy và SQL viết sẵn ở đây, không import
+model hay code nghiệp vụ của app: code đó còn thay đổi, migration thì phải giữ nguyên.
+"""
+from decimal import Decimal
+
+from sqlalchemy import MetaData, Table, select, insert, delete, func, and_
+
+# Các mốc cảnh báo lúc viết migration (budget_engine.THRESHOLDS)
+THRESHOLDS = (50, 80, 100)
+
+def _level(spent, limit):
+    if not limit or limit <= 0:
+        return 0
+    percent = Decimal(spent or 0) * 100 / Decimal(limit)
+    return max((t for t in THRESHOLDS if percent >= t), default=0)
+
+def upgrade(conn):
+    metadata = MetaData()
+    giaodich = Table('giaodich', metadata, autoload_with=conn)
+    tonghop = Table('giaodich_tonghop_ngay', metadata, autoload_with=conn)
+    ngansach = Table('ngansach', metadata, autoload_with=conn)
+    ngansach_danhmuc = Table('ngansach_danhmuc', metadata, autoload_with=conn)
+    tiendo = Table('ngansach_tiendo', metadata, autoload_with=conn)
+
+    # 1. Bảng tổng hợp: INSERT ... SELECT ... GROUP BY theo khóa (người dùng, ngày, loại, danh mục, ví)
+    category = func.coalesce(giaodich.c.MaDanhMuc, 0)
+    key = (giaodich.c.MaNguoiDung, giaodich.c.NgayGiaoDich, giaodich.c.LoaiGiaoDich, category, giaodich.c.MaNguonTien)
+    conn.execute(delete(tonghop))
+    rows = conn.execute(insert(tonghop).from_select(
+        ['MaNguoiDung', 'Ngay', 'LoaiGiaoDich', 'MaDanhMuc', 'MaNguonTien', 'TongTien', 'SoLuong'],
+        select(*key, func.sum(giaodich.c.SoTien), func.count()).group_by(*key)
+    )).rowcount
+
+    # 2. Tiến độ: tổng chi trong khung ngày của từng ngân sách chưa xóa, đọc từ bảng tổng hợp vừa dựng
+    spent = func.coalesce(func.sum(tonghop.c.TongTien), 0)
+    budgets = conn.execute(
+        select(ngansach.c.MaNganSach, ngansach.c.SoTienGioiHan, spent)
+        .select_from(ngansach)
+        .outerjoin(ngansach_danhmuc, ngansach_danhmuc.c.MaNganSach == ngansach.c.MaNganSach)
+        .outerjoin(tonghop, and_(
+            tonghop.c.MaNguoiDung == ngansach.c.MaNguoiDung,
+            tonghop.c.MaDanhMuc == ngansach_danhmuc.c.MaDanhMuc,
+            tonghop.c.LoaiGiaoDich == 'chi',
+            tonghop.c.Ngay >= ngansach.c.NgayBatDau,
+            tonghop.c.Ngay <= ngansach.c.NgayKetThuc,
+        ))
+        .where(func.coalesce(ngansach.c.DaXoa, False) == False)
+        .group_by(ngansach.c.MaNganSach, ngansach.c.SoTienGioiHan)
+    ).all()
+
+    conn.execute(delete(tiendo))
+    progress = [
+        {'MaNganSach': budget_id, 'DaChi': Decimal(total), 'MucDaCanhBao': _level(total, limit)}
+        for budget_id, limit, total in budgets
+    ]
+    if progress:
+        conn.execute(insert(tiendo), progress)
+    print(f"  Bảng tổng hợp: {rows} dòng, tiến độ: {len(progress)} ngân sách")
@@ -0,0 +1,11 @@
+"""
+Thêm PhienBan vào ai_mohinh_nguoidung: mỗi lần ghi mô hình tăng 1 (ghi có điều kiện
+PhienBan = bản đã đọc). Worker thấy PhienBan trong DB khác bản trong RAM thì nạp lại,
+nhờ vậy sửa/xóa giao dịch đã học ở một worker được mọi worker nhìn thấy.
+"""
+from sqlalchemy import inspect, text
+
+def upgrade(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('ai_mohinh_nguoidung')}
+    if 'PhienBan' not in columns:
+        conn.execute(text('ALTER TABLE ai_mohinh_nguoidung ADD COLUMN "PhienBan" INTEGER NOT NULL DEFAULT 0'))
@@ -1,7 +1,12 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import text
 from werkzeug.security import generate_password_hash, check_password_hash
 
+def _active_index(name, *columns):
+    """Chỉ mục một phần chỉ gồm dòng chưa xóa mềm (DaXoa = 0), như migration 0003"""
+    return db.Index(name, *columns, sqlite_where=text('"DaXoa" = 0'), postgresql_where=text('"DaXoa" = false'))
+
 # ==================================================
 # 1. BẢNG NGƯỜI DÙNG (CORE)
 # ==================================================
@@ -49,6 +54,7 @@ class UserSetting(db.Model):
 
 class Wallet(db.Model):
     __tablename__ = 'nguontien'
+    __table_args__ = (_active_index('ix_nguontien_nguoidung_conhieuluc', 'MaNguoiDung'),)
 
     id = db.Column('MaNguonTien', db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False, index=True)
@@ -58,6 +64,22 @@ class Wallet(db.Model):
     created_at = db.Column('NgayTao', db.DateTime, default=datetime.now)
 
     is_deleted = db.Column('DaXoa', db.Boolean, default=False)
+
+# ==================================================
+# 3.1 NHẬT KÝ BIẾN ĐỘNG SỐ DƯ (CHỈ GHI THÊM)
+# Ghi lại mọi thay đổi số dư KHÔNG sinh ra từ giao dịch (số dư khởi tạo,
+# chỉnh tay...). Số dư đúng của một ví = tổng nhật ký + tổng ảnh hưởng của giaodich.
+# Không bao giờ UPDATE/DELETE bảng này, muốn sửa thì ghi thêm một dòng bù trừ.
+# ==================================================
+
+class WalletLedger(db.Model):
+    __tablename__ = 'nguontien_nhatky'
+
+    id = db.Column('MaNhatKy', db.Integer, primary_key=True, autoincrement=True)
+    wallet_id = db.Column('MaNguonTien', db.Integer, db.ForeignKey('nguontien.MaNguonTien', ondelete='CASCADE'), nullable=False, index=True)
+    delta = db.Column('SoTienThayDoi', db.Numeric(15, 2), nullable=False)
+    reason = db.Column('LyDo', db.String(20), nullable=False) # 'khoitao', 'dieuchinh', 'doisoat'
+    created_at = db.Column('NgayTao', db.DateTime, default=datetime.now)
     
 # ==================================================
 # 4. BẢNG DANH MỤC
@@ -65,6 +87,7 @@ class Wallet(db.Model):
 
 class Category(db.Model):
     __tablename__ = 'danhmuc'
+    __table_args__ = (_active_index('ix_danhmuc_nguoidung_conhieuluc', 'MaNguoiDung'),)
 
     id = db.Column('MaDanhMuc', db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=True)
@@ -82,6 +105,8 @@ class Category(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'giaodich'
+    # Danh sách giao dịch theo khoảng ngày / loại, ngữ cảnh chatbot (migration 0002)
+    __table_args__ = (db.Index('ix_giaodich_nguoidung_ngay_loai', 'MaNguoiDung', 'NgayGiaoDich', 'LoaiGiaoDich'),)
 
     id = db.Column('MaGiaoDich', db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False, index=True)
@@ -106,6 +131,24 @@ class Transaction(db.Model):
     dest_wallet = db.relationship('Wallet', foreign_keys=[dest_wallet_id])
     category = db.relationship('Category', foreign_keys=[category_id])
 
+# ==================================================
+# 5.1 BẢNG TỔNG HỢP GIAO DỊCH THEO NGÀY
+# Được cập nhật cộng dồn trong CÙNG transaction với mỗi lần thêm/sửa/xóa giao dịch.
+# Báo cáo, ngân sách, ngữ cảnh AI đọc từ đây nên chi phí tỉ lệ với số ngày, không phải số giao dịch.
+# MaDanhMuc = 0 nghĩa là giao dịch chưa phân loại (không dùng NULL để giữ được khóa chính).
+# ==================================================
+
+class DailyRollup(db.Model):
+    __tablename__ = 'giaodich_tonghop_ngay'
+
+    user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True)
+    date = db.Column('Ngay', db.Date, primary_key=True)
+    type = db.Column('LoaiGiaoDich', db.String(20), primary_key=True)
+    category_id = db.Column('MaDanhMuc', db.Integer, primary_key=True, default=0)
+    wallet_id = db.Column('MaNguonTien', db.Integer, primary_key=True)
+    total = db.Column('TongTien', db.Numeric(18, 2), nullable=False, default=0)
+    count = db.Column('SoLuong', db.Integer, nullable=False, default=0)
+
 # ==================================================
 # 6. BẢNG NGÂN SÁCH
 # ==================================================
@@ -117,6 +160,7 @@ budget_category = db.Table('ngansach_danhmuc',
 
 class Budget(db.Model):
     __tablename__ = 'ngansach'
+    __table_args__ = (_active_index('ix_ngansach_nguoidung_ngay_conhieuluc', 'MaNguoiDung', 'NgayBatDau', 'NgayKetThuc'),)
 
     id = db.Column('MaNganSach', db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False)
@@ -130,6 +174,31 @@ class Budget(db.Model):
     # Quan hệ Many-to-Many với Danh mục
     categories = db.relationship('Category', secondary=budget_category, backref=db.backref('budgets', lazy=True))
 
+# ==================================================
+# 6.1 TIẾN ĐỘ & CẢNH BÁO NGÂN SÁCH
+# Số đã chi được cộng dồn mỗi khi ghi giao dịch, nên đọc tiến độ chỉ là tra khóa chính.
+# Mỗi lần vượt mốc 50/80/100% sinh một dòng cảnh báo.
+# ==================================================
+
+class BudgetProgress(db.Model):
+    __tablename__ = 'ngansach_tiendo'
+
+    budget_id = db.Column('MaNganSach', db.Integer, db.ForeignKey('ngansach.MaNganSach', ondelete='CASCADE'), primary_key=True)
+    spent = db.Column('DaChi', db.Numeric(18, 2), nullable=False, default=0)
+    last_threshold = db.Column('MucDaCanhBao', db.Integer, nullable=False, default=0) # 0, 50, 80, 100
+    updated_at = db.Column('NgayCapNhat', db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+class BudgetAlert(db.Model):
+    __tablename__ = 'ngansach_canhbao'
+
+    id = db.Column('MaCanhBao', db.Integer, primary_key=True, autoincrement=True)
+    budget_id = db.Column('MaNganSach', db.Integer, db.ForeignKey('ngansach.MaNganSach', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), nullable=False, index=True)
+    threshold = db.Column('MucCanhBao', db.Integer, nullable=False)
+    spent = db.Column('DaChi', db.Numeric(18, 2), nullable=False)
+    is_read = db.Column('DaDoc', db.Boolean, default=False)
+    created_at = db.Column('NgayTao', db.DateTime, default=datetime.now)
+
 # ==================================================
 # 8. CÁC BẢNG PHỤ TRỢ KHÁC
 # ==================================================
@@ -145,6 +214,43 @@ class AILog(db.Model):
     feedback = db.Column('PhanHoi', db.String(50)) # 'dung', 'sai'
     created_at = db.Column('NgayTao', db.DateTime, default=datetime.now)
 
+class AIDailyStat(db.Model):
+    # Thống kê AI cộng dồn theo (ngày, danh mục AI đoán, nhóm độ tin cậy 0-9 theo từng 10%):
+    # số lượt dự đoán + tổng độ trễ, số lượt được người dùng xác nhận + số lượt đúng.
+    # Trang giám sát AI chỉ đọc bảng này, không quét ai_lichsu.
+    __tablename__ = 'ai_thongke_ngay'
+    date = db.Column('Ngay', db.Date, primary_key=True)
+    category_id = db.Column('MaDanhMuc', db.Integer, primary_key=True, autoincrement=False) # 0 = không đoán được
+    confidence_bucket = db.Column('NhomTinCay', db.Integer, primary_key=True, autoincrement=False)
+    predictions = db.Column('SoDuDoan', db.Integer, nullable=False, default=0)
+    latency_ms = db.Column('TongDoTre', db.Float, nullable=False, default=0)
+    evaluated = db.Column('SoDanhGia', db.Integer, nullable=False, default=0)
+    correct = db.Column('SoDung', db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column('TongDoTinCay', db.Float, nullable=False, default=0)
+
+class AIPredictionCache(db.Model):
+    # Kết quả dự đoán danh mục đã có, khóa theo mô tả đã chuẩn hóa + "dấu vân tay" bộ danh mục
+    # của người dùng (đổi danh mục => dấu vân tay đổi => kết quả cũ không còn được dùng).
+    __tablename__ = 'ai_dudoan_cache'
+    user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True)
+    description_key = db.Column('MoTaChuanHoa', db.String(255), primary_key=True)
+    fingerprint = db.Column('DauVanTay', db.String(16), primary_key=True)
+    category_id = db.Column('MaDanhMuc', db.Integer, db.ForeignKey('danhmuc.MaDanhMuc', ondelete='CASCADE')) # NULL = AI không chọn được
+    confidence = db.Column('DoTinCay', db.Float)
+    created_at = db.Column('NgayTao', db.DateTime, default=datetime.now)
+
+class AIUserModel(db.Model):
+    # Mô hình phân loại cục bộ (Naive Bayes) của từng người dùng, nén zlib.
+    # MocGiaoDich: MaGiaoDich lớn nhất đã học, lần sau chỉ học thêm các giao dịch mới hơn.
+    # PhienBan: tăng mỗi lần ghi; worker thấy khác bản trong RAM thì nạp lại.
+    __tablename__ = 'ai_mohinh_nguoidung'
+    user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True)
+    data = db.Column('DuLieu', db.LargeBinary, nullable=False)
+    watermark = db.Column('MocGiaoDich', db.Integer, nullable=False, default=0)
+    samples = db.Column('SoMau', db.Integer, nullable=False, default=0)
+    revision = db.Column('PhienBan', db.Integer, nullable=False, default=0)
+    updated_at = db.Column('NgayCapNhat', db.DateTime, default=datetime.now, onupdate=datetime.now)
+
 class TwoFactorAuth(db.Model):
     __tablename__ = 'xacthuc2fa'
     user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'), primary_key=True)
@@ -152,8 +258,18 @@ class TwoFactorAuth(db.Model):
     is_active = db.Column('DaKichHoat', db.Integer, default=0)
     backup_code = db.Column('MaDuPhong', db.String(200))
 
+class UserDataVersion(db.Model):
+    # Bộ đếm phiên bản dữ liệu, tăng mỗi khi người dùng ghi giao dịch/ví/danh mục.
+    # Dùng làm một phần khóa cache; MaNguoiDung = 0 là phiên bản chung (danh mục hệ thống),
+    # vì vậy cột này cố ý KHÔNG có khóa ngoại.
+    __tablename__ = 'nguoidung_phienban'
+    user_id = db.Column('MaNguoiDung', db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column('PhienBan', db.Integer, nullable=False, default=0)
+
 class ChatbotLog(db.Model):
     __tablename__ = 'chatbot_lichsu'
+    # Danh sách hội thoại (tin mới nhất mỗi người) và lịch sử theo trang đều đi theo chỉ mục này
+    __table_args__ = (db.Index('ix_chatbot_lichsu_nguoidung_ngaytao', 'MaNguoiDung', 'NgayTao'),)
     id = db.Column('MaHoiThoai', db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column('MaNguoiDung', db.Integer, db.ForeignKey('nguoidung.MaNguoiDung', ondelete='CASCADE'))
     question = db.Column('NoiDungHoi', db.Text)
@@ -0,0 +1,108 @@
+import hashlib
+import re
+import threading
+import unicodedata
+
+from sqlalchemy import delete
+
+from app import db
+from app.cache import make_cache
+from app.models import AIPredictionCache
+from config import Config
+
+# ==================================================
+# CACHE DỰ ĐOÁN DANH MỤC (2 TẦNG)
+# Tầng 1: LRU trong tiến trình. Tầng 2: bảng ai_dudoan_cache (sống qua restart,
+# dùng chung giữa các worker). Khóa = (người dùng, mô tả chuẩn hóa, dấu vân tay
+# bộ danh mục) nên "Ăn phở", "an pho", "  ĂN   PHỞ " chỉ tốn một lần gọi Gemini.
+# ==================================================
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_description(text):
+    """Bỏ dấu tiếng Việt (kể cả đ/Đ), về chữ thường, gộp khoảng trắng"""
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(' ', text).strip().casefold()[:255]
+
+def category_fingerprint(categories):
+    """Dấu vân tay của bộ danh mục: thêm/sửa/xóa danh mục nào cũng làm nó đổi"""
+    raw = '|'.join(f"{c.id}:{c.name}" for c in sorted(categories, key=lambda c: c.id))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+class PredictionCache:
+    def __init__(self, maxsize):
+        self.memory = make_cache('prediction', maxsize=maxsize, shared=False)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        # Thời gian gọi model thật, để ước tính thời gian tiết kiệm được nhờ cache
+        self.model_calls = 0
+        self.model_seconds = 0.0
+
+    def lookup(self, user_id, description, categories):
+        """Trả về (category_id, confidence) nếu đã từng dự đoán, ngược lại None"""
+        key = (user_id, normalize_description(description), category_fingerprint(categories))
+        if not key[1]:
+            return None
+
+        hit = self.memory.get(key)
+        if hit is not None:
+            self._count('memory_hits')
+            return hit
+
+        row = db.session.get(AIPredictionCache, key)
+        if row is not None:
+            hit = (row.category_id, row.confidence)
+            self.memory.set(key, hit)
+            self._count('db_hits')
+            return hit
+
+        self._count('misses')
+        return None
+
+    def store(self, user_id, description, categories, category_id, confidence, elapsed):
+        """
+        Lưu kết quả vừa lấy từ model (category_id=None nghĩa là model không chọn được).
+        Người gọi tự commit (để dự đoán theo lô chỉ commit một lần).
+        """
+        key = (user_id, normalize_description(description), category_fingerprint(categories))
+        with self._lock:
+            self.model_calls += 1
+            self.model_seconds += elapsed
+        if not key[1]:
+            return
+
+        self.memory.set(key, (category_id, confidence))
+        db.session.merge(AIPredictionCache(
+            user_id=key[0], description_key=key[1], fingerprint=key[2],
+            category_id=category_id, confidence=confidence
+        ))
+
+    def invalidate(self, user_id):
+        """
+        Gọi khi danh mục của người dùng thay đổi. Các khóa RAM cũ tự hết hiệu lực
+        vì dấu vân tay đã đổi; ở đây chỉ dọn các dòng cũ trong DB.
+        """
+        db.session.execute(delete(AIPredictionCache).where(AIPredictionCache.user_id == user_id))
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def stats(self):
+        hits = self.memory_hits + self.db_hits
+        total = hits + self.misses
+        avg_model_ms = self.model_seconds * 1000 / self.model_calls if self.model_calls else 0
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_ratio': round(hits / total, 4) if total else 0,
+            'avg_model_latency_ms': round(avg_model_ms, 1),
+            'latency_saved_ms': round(hits * avg_model_ms),
+        }
+
+prediction_cache = PredictionCache(Config.PREDICTION_CACHE_SIZE)
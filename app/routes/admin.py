@@ -1,10 +1,23 @@
-from flask import Blueprint, render_template, session, redirect, url_for, flash, jsonify, request
+import base64
+import hmac
+import json
+from flask import Blueprint, render_template, session, redirect, url_for, flash, jsonify, request, Response, current_app
 from functools import wraps
 from datetime import datetime, timedelta
 
 from app import db
+from app.cache import bump_data_version, cache_stats, GLOBAL_VERSION_ID
+from app.prediction_cache import prediction_cache
+from app.local_classifier import local_classifier
+from app.ai_guard import ai_guard
+from app.ai_log_writer import ai_log_writer
+from app.bookkeeping import forget_category
+from app.budget_engine import rebuild_budget_progress
+from app.current_user import invalidate_user_profile
+from app.metrics import render_prometheus
+from sqlalchemy import func, and_, or_
 from sqlalchemy.orm import aliased
-from app.models import User, ChatbotLog, AILog, Transaction, Category
+from app.models import User, ChatbotLog, AILog, AIDailyStat, Transaction, Category
 
 # Khai báo Blueprint
 admin_bp = Blueprint('admin', __name__)
@@ -46,6 +59,7 @@ def update_user_role(user_id):
     if new_role in ['user', 'admin']:
         user.role = new_role
         db.session.commit()
+        invalidate_user_profile(user_id)
         return jsonify({'status': 'success'})
         
     return jsonify({'status': 'error', 'message': 'Quyền không hợp lệ'}), 400
@@ -62,6 +76,7 @@ def update_user_status(user_id):
     
     user.status = request.json.get('status')
     db.session.commit()
+    invalidate_user_profile(user_id)
     return jsonify({'status': 'success'})
 
 # ==========================================
@@ -97,6 +112,8 @@ def save_category():
         category = Category(name=name, type=cat_type, user_id=None)
         db.session.add(category)
     
+    # Danh mục hệ thống dùng chung cho mọi người dùng => tăng phiên bản chung
+    bump_data_version(GLOBAL_VERSION_ID)
     db.session.commit()
     return jsonify({"status": "success", "message": "Đã lưu danh mục"})
 
@@ -104,8 +121,15 @@ def save_category():
 @admin_required
 def delete_category(id):
     category = Category.query.get_or_404(id)
+    budget_ids = [budget.id for budget in category.budgets]
     db.session.delete(category)
+    # Bảng tổng hợp không có khóa ngoại: gộp các ô của danh mục này vào "chưa phân loại"
+    forget_category(id)
+    bump_data_version(GLOBAL_VERSION_ID)
     db.session.commit()
+    if budget_ids:
+        # Ngân sách mất danh mục này: tính lại số đã chi (rebuild tự commit)
+        rebuild_budget_progress(budget_ids=budget_ids)
     return jsonify({"status": "success", "message": "Đã xóa danh mục"})
 
 # ==========================================
@@ -125,31 +149,227 @@ def ai_monitoring():
     ).outerjoin(Transaction, AILog.transaction_id == Transaction.id)\
      .outerjoin(PredictedCategory, AILog.predicted_cat == PredictedCategory.id)\
      .outerjoin(ActualCategory, AILog.actual_cat == ActualCategory.id)\
-     .order_by(AILog.created_at.desc()).limit(100).all()
+     .order_by(AILog.id.desc()).limit(100).all() # Khóa chính tăng dần theo thời gian ghi: không cần sắp xếp cả bảng
 
-    return render_template('admin/ai_monitoring.html', logs=logs_query)
+    return render_template('admin/ai_monitoring.html', logs=logs_query,
+                           summary=ai_accuracy_summary(AI_STATS_DAYS))
+
+# Số ngày gần nhất hiển thị trên trang giám sát AI
+AI_STATS_DAYS = 30
+
+def ai_accuracy_summary(days):
+    """
+    Độ chính xác / hiệu chuẩn độ tin cậy / độ trễ theo ngày, theo danh mục và theo nhóm
+    độ tin cậy. Chỉ đọc bảng cộng dồn ai_thongke_ngay (vài trăm dòng), không quét ai_lichsu.
+    """
+    since = datetime.now().date() - timedelta(days=days - 1)
+    counters = (
+        func.sum(AIDailyStat.predictions), func.sum(AIDailyStat.latency_ms),
+        func.sum(AIDailyStat.evaluated), func.sum(AIDailyStat.correct), func.sum(AIDailyStat.confidence_sum)
+    )
+
+    def summarize(predictions, latency_ms, evaluated, correct, confidence_sum):
+        predictions, evaluated, correct = predictions or 0, evaluated or 0, correct or 0
+        return {
+            'predictions': predictions,
+            'avg_latency_ms': round((latency_ms or 0) / predictions, 1) if predictions else None,
+            'evaluated': evaluated,
+            'correct': correct,
+            'accuracy': round(correct * 100 / evaluated, 1) if evaluated else None,
+            'avg_confidence': round((confidence_sum or 0) / evaluated, 1) if evaluated else None,
+        }
+
+    in_window = AIDailyStat.date >= since
+    by_day = db.session.query(AIDailyStat.date, *counters).filter(in_window)\
+        .group_by(AIDailyStat.date).order_by(AIDailyStat.date.desc()).all()
+    by_category = db.session.query(AIDailyStat.category_id, Category.name, *counters)\
+        .outerjoin(Category, Category.id == AIDailyStat.category_id).filter(in_window)\
+        .group_by(AIDailyStat.category_id, Category.name).order_by(func.sum(AIDailyStat.evaluated).desc()).all()
+    by_bucket = db.session.query(AIDailyStat.confidence_bucket, *counters).filter(in_window)\
+        .group_by(AIDailyStat.confidence_bucket).order_by(AIDailyStat.confidence_bucket).all()
+
+    return {
+        'days': days,
+        'total': summarize(*[sum(row[i] or 0 for row in by_day) for i in range(1, 6)]),
+        'by_day': [dict(summarize(*row[1:]), date=row[0]) for row in by_day],
+        'by_category': [dict(summarize(*row[2:]), name=row[1] or 'Không đoán được') for row in by_category],
+        # Hiệu chuẩn: với mỗi nhóm độ tin cậy, tỉ lệ đúng thực tế nên xấp xỉ độ tin cậy trung bình
+        'calibration': [dict(summarize(*row[1:]), bucket=f"{row[0] * 10}-{row[0] * 10 + 10}%")
+                        for row in by_bucket if row[3]],
+    }
+
+# Số cuộc hội thoại mỗi trang / số tin nhắn mỗi lần tải lịch sử
+CONVERSATION_PAGE_SIZE = 30
+TRANSCRIPT_PAGE_SIZE = 50
+SNIPPET_CHARS = 25
+
+def _encode_cursor(*values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    """(thời điểm, id) của dòng cuối trang trước"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created, row_id = json.loads(raw)
+    return datetime.fromisoformat(created), int(row_id)
+
+def _decode_conversation_cursor(cursor):
+    """(thời điểm tin mới nhất, mã người dùng, MaHoiThoai lớn nhất lúc mở trang đầu)"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    latest_time, user_id, as_of = json.loads(raw)
+    return datetime.fromisoformat(latest_time), int(user_id), int(as_of)
+
+def conversation_page(cursor=None, limit=CONVERSATION_PAGE_SIZE):
+    """
+    Một trang danh sách hội thoại bằng hai truy vấn:
+    1. Chọn trang người dùng: MAX(NgayTao) theo từng người (đọc trên chỉ mục
+       (MaNguoiDung, NgayTao), không chạm bảng), phân trang keyset theo
+       (thời điểm tin mới nhất, mã người dùng).
+    2. Chỉ với các người đó: hàm cửa sổ lấy tin mới nhất làm đoạn trích và đếm số tin.
+    Trang đầu ghi lại MaHoiThoai lớn nhất vào cursor; các trang sau chỉ xét tin tới mốc đó,
+    nên tin nhắn mới đến giữa hai lần tải không đẩy người dùng ra khỏi thứ tự đang duyệt
+    (không trùng, không sót). Tin mới hiện ra khi tải lại danh sách từ đầu.
+    """
+    if cursor:
+        latest_time, user_id, as_of = _decode_conversation_cursor(cursor)
+    else:
+        as_of = db.session.query(func.max(ChatbotLog.id)).scalar()
+        if as_of is None:
+            return [], None
+
+    latest = func.max(ChatbotLog.created_at)
+    page_query = db.session.query(ChatbotLog.user_id, latest.label('latest_time'))\
+        .filter(ChatbotLog.id <= as_of).group_by(ChatbotLog.user_id)
+    if cursor:
+        page_query = page_query.having(or_(
+            latest < latest_time,
+            and_(latest == latest_time, ChatbotLog.user_id < user_id)
+        ))
+    page = page_query.order_by(latest.desc(), ChatbotLog.user_id.desc()).limit(limit + 1).all()
+    next_cursor = _encode_cursor(page[limit - 1].latest_time, page[limit - 1].user_id, as_of) \
+        if len(page) > limit else None
+    page = page[:limit]
+    if not page:
+        return [], None
+
+    ranked = db.session.query(
+        ChatbotLog.user_id.label('user_id'),
+        func.substr(ChatbotLog.question, 1, SNIPPET_CHARS + 1).label('snippet'),
+        func.row_number().over(
+            partition_by=ChatbotLog.user_id,
+            order_by=(ChatbotLog.created_at.desc(), ChatbotLog.id.desc())
+        ).label('rn'),
+        func.count().over(partition_by=ChatbotLog.user_id).label('message_count')
+    ).filter(ChatbotLog.user_id.in_([row.user_id for row in page]), ChatbotLog.id <= as_of).subquery()
+
+    details = {
+        row.user_id: row for row in
+        db.session.query(ranked, User.name).join(User, User.id == ranked.c.user_id).filter(ranked.c.rn == 1)
+    }
+    conversations = [{
+        'user_id': row.user_id,
+        'user_name': details[row.user_id].name,
+        'latest_time': row.latest_time,
+        'message_count': details[row.user_id].message_count,
+        'snippet': _snippet(details[row.user_id].snippet),
+    } for row in page if row.user_id in details]
+    return conversations, next_cursor
+
+def _snippet(text):
+    return (text[:SNIPPET_CHARS] + '...') if text and len(text) > SNIPPET_CHARS else (text or '')
 
 @admin_bp.route('/admin/chatbot-logs')
 @admin_required
 def chatbot_logs():
-    logs_query = db.session.query(ChatbotLog, User)\
-        .join(User, ChatbotLog.user_id == User.id)\
-        .order_by(ChatbotLog.created_at.asc()).all()
-
-    conversations = {}
-    for log, user in logs_query:
-        if user.id not in conversations:
-            conversations[user.id] = {
-                'user_id': user.id, 'user_name': user.name,
-                'logs': [], 'latest_time': log.created_at, 'snippet': ''
-            }
-        conversations[user.id]['logs'].append(log)
-        conversations[user.id]['latest_time'] = log.created_at
-        snippet = log.question if log.question else ''
-        conversations[user.id]['snippet'] = (snippet[:25] + '...') if len(snippet) > 25 else snippet
-
-    sorted_convos = sorted(conversations.values(), key=lambda x: x['latest_time'], reverse=True)
-    return render_template('admin/chatbot_logs.html', conversations=sorted_convos)
+    # Chỉ trang đầu danh sách; nội dung hội thoại tải riêng khi admin bấm vào (API bên dưới)
+    conversations, next_cursor = conversation_page()
+    return render_template('admin/chatbot_logs.html', conversations=conversations, next_cursor=next_cursor)
+
+@admin_bp.route('/api/admin/chatbot-logs', methods=['GET'])
+@admin_required
+def get_conversations():
+    try:
+        conversations, next_cursor = conversation_page(request.args.get('cursor'))
+    except (ValueError, TypeError):
+        return jsonify({'status': 'error', 'message': 'Cursor không hợp lệ'}), 400
+    for convo in conversations:
+        convo['latest_time'] = convo['latest_time'].strftime('%d/%m %H:%M') if convo['latest_time'] else ''
+    return jsonify({'status': 'success', 'data': conversations, 'next_cursor': next_cursor})
+
+@admin_bp.route('/api/admin/chatbot-logs/<int:user_id>', methods=['GET'])
+@admin_required
+def get_transcript(user_id):
+    """
+    Lịch sử chat của một người, mới nhất trước, TRANSCRIPT_PAGE_SIZE tin mỗi lần.
+    `before` là cursor keyset (NgayTao, MaHoiThoai) để tải tiếp các tin cũ hơn;
+    truy vấn đi theo chỉ mục (MaNguoiDung, NgayTao).
+    """
+    query = ChatbotLog.query.filter(ChatbotLog.user_id == user_id)
+    before = request.args.get('before')
+    if before:
+        try:
+            created, log_id = _decode_cursor(before)
+        except (ValueError, TypeError):
+            return jsonify({'status': 'error', 'message': 'Cursor không hợp lệ'}), 400
+        query = query.filter(or_(
+            ChatbotLog.created_at < created,
+            and_(ChatbotLog.created_at == created, ChatbotLog.id < log_id)
+        ))
+    logs = query.order_by(ChatbotLog.created_at.desc(), ChatbotLog.id.desc()).limit(TRANSCRIPT_PAGE_SIZE + 1).all()
+
+    has_more = len(logs) > TRANSCRIPT_PAGE_SIZE
+    logs = logs[:TRANSCRIPT_PAGE_SIZE]
+    next_cursor = _encode_cursor(logs[-1].created_at, logs[-1].id) if has_more else None
+    logs.reverse() # Tin cũ ở trên, tin mới ở dưới
+    return jsonify({
+        'status': 'success',
+        'data': [{
+            'question': log.question,
+            'answer': log.answer,
+            'time': log.created_at.strftime('%H:%M - %d/%m/%Y') if log.created_at else ''
+        } for log in logs],
+        'next_cursor': next_cursor
+    })
+
+@admin_bp.route('/api/admin/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    stats = cache_stats()
+    stats['prediction_tiers'] = prediction_cache.stats()
+    stats['local_classifier'] = local_classifier.stats()
+    return jsonify(stats)
+
+@admin_bp.route('/api/admin/ai-status', methods=['GET'])
+@admin_required
+def get_ai_status():
+    # Trạng thái cầu dao + histogram độ trễ các lời gọi Gemini + hàng đợi nhật ký AI của tiến trình này
+    status = ai_guard.stats()
+    status['log_writer'] = ai_log_writer.stats()
+    return jsonify(status)
+
+@admin_bp.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus gửi "Authorization: Bearer <METRICS_TOKEN>"; admin đã đăng nhập xem trực tiếp.
+    # Không chuyển hướng sang trang đăng nhập như admin_required: máy đọc cần mã 403 rõ ràng.
+    token = current_app.config.get('METRICS_TOKEN')
+    auth = request.headers.get('Authorization', '')
+    token_ok = bool(token) and hmac.compare_digest(auth, f'Bearer {token}')
+    if not token_ok and session.get('user_role') != 'admin':
+        return jsonify({'status': 'error', 'message': 'Không có quyền truy cập'}), 403
+
+    guard = ai_guard.stats()
+    text = render_prometheus(
+        current_app.extensions.get('metrics'),
+        gauges={
+            'cache': cache_stats(),
+            'ai_guard': dict(guard, open=int(guard['state'] == ai_guard.OPEN)),
+            'prediction_cache': prediction_cache.stats(),
+            'local_classifier': local_classifier.stats(),
+            'ai_log_writer': ai_log_writer.stats(),
+        },
+        histograms={'ai_call_duration_seconds': guard['latency']},
+    )
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 @admin_bp.route('/api/admin/cleanup-logs', methods=['DELETE'])
 @admin_required
@@ -1,15 +1,25 @@
+import time
 from flask import Blueprint, request, session, jsonify, Response, stream_with_context
 from functools import wraps
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 from app import db
-from app.models import Category, Transaction, Wallet, ChatbotLog, UserSetting
+from app.models import Category, Transaction, Wallet, ChatbotLog, UserSetting, DailyRollup
 from app.ai_service import ai_engine
+from app.prediction_cache import prediction_cache, normalize_description
+from app.local_classifier import local_classifier
+from app.ai_log_writer import ai_log_writer
+from app.insights import get_insights
+from app.cache import make_cache, get_data_version
+from config import Config
 
 # Khai báo Blueprint
 ai_bp = Blueprint('ai', __name__)
 
+AI_BUSY_MESSAGE = "Xin lỗi, hệ thống AI đang bận kết nối. Vui lòng thử lại sau vài giây nhé!"
+
 def api_login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -29,35 +39,199 @@ def predict_category():
     if not description: 
         return jsonify({'status': 'error', 'message': 'No description'})
 
-    user_id = session['user_id']
-    
+    started = time.perf_counter()
+    payload = _predict_one(session['user_id'], description)
+    # Ghi nhật ký qua hàng đợi nền: không thêm truy vấn nào vào request
+    ai_log_writer.record_prediction(payload.get('category_id'), payload.get('confidence'),
+                                    (time.perf_counter() - started) * 1000)
+    return jsonify(payload)
+
+def _predict_one(user_id, description):
     # 1. Lấy danh sách Menu Danh mục CỦA RIÊNG USER ĐÓ
-    user_cats = Category.query.filter_by(user_id=user_id).all()
+    user_cats = Category.query.filter_by(user_id=user_id, is_deleted=False).all()
     cat_names = [cat.name for cat in user_cats] # Ví dụ: ['Ăn uống', 'Xăng xe', 'Đóng họ']
+    cats_by_id = {cat.id: cat for cat in user_cats}
 
-    # 2. Truyền Menu này cho AI chọn
+    # 2. Bộ phân loại cục bộ học từ lịch sử của chính người dùng: đủ tự tin thì không cần gọi AI
+    local = local_classifier.predict(user_id, description, cats_by_id)
+    if local is not None:
+        category_id, confidence = local
+        return _prediction_payload(cats_by_id[category_id], confidence, 'local')
+
+    # 3. Mô tả này (sau chuẩn hóa) đã từng được dự đoán với đúng bộ danh mục này thì trả luôn
+    cached = prediction_cache.lookup(user_id, description, user_cats)
+    if cached is not None:
+        category_id, confidence = cached
+        return _prediction_payload(cats_by_id.get(category_id), confidence, 'cache')
+
+    # 4. Truyền Menu này cho AI chọn
+    started = time.perf_counter()
     result = ai_engine.predict(description, cat_names)
+    elapsed = time.perf_counter() - started
     
-    # 3. Xử lý kết quả trả về từ dạng JSON của AI
-    if result and result.get('category'):
-        category_name = result['category']
-        
-        # Tìm lại Object Category trong Database
-        category = Category.query.filter(
-            Category.name.ilike(category_name), 
-            Category.user_id == user_id
-        ).first()
-        
-        if category:
-            return jsonify({
-                'status': 'success', 
-                'category_id': category.id, 
-                'category_name': category.name, 
-                'category_type': category.type, 
-                'confidence': result.get('confidence', 90)
-            })
-            
-    return jsonify({'status': 'no_match'})
+    # 5. Xử lý kết quả trả về từ dạng JSON của AI
+    if result is None:
+        # Lỗi gọi AI: không lưu cache để lần sau thử lại
+        return {'status': 'no_match'}
+
+    category, confidence = _match_prediction(result, user_cats)
+    prediction_cache.store(user_id, description, user_cats, category.id if category else None, confidence, elapsed)
+    db.session.commit()
+    return _prediction_payload(category, confidence, 'ai')
+
+# Số mô tả tối đa trong một request dự đoán theo lô
+PREDICT_BATCH_LIMIT = 500
+
+@ai_bp.route('/api/predict-category/batch', methods=['POST'])
+@api_login_required
+def predict_category_batch():
+    """
+    Dự đoán danh mục cho nhiều mô tả (VD: sao kê vừa nhập, giao dịch "Chưa phân loại").
+    Mỗi mô tả vẫn đi qua bộ phân loại cục bộ và cache trước; phần còn lại được gom
+    thành ít lời gọi AI nhất có thể (ai_engine.predict_batch). Kết quả trả về theo index.
+    """
+    descriptions = (request.json or {}).get('descriptions')
+    if not isinstance(descriptions, list) or not descriptions:
+        return jsonify({'status': 'error', 'message': 'No descriptions'}), 400
+    if len(descriptions) > PREDICT_BATCH_LIMIT:
+        return jsonify({'status': 'error', 'message': f'Tối đa {PREDICT_BATCH_LIMIT} mô tả mỗi lần'}), 400
+
+    user_id = session['user_id']
+    request_started = time.perf_counter()
+    user_cats = Category.query.filter_by(user_id=user_id, is_deleted=False).all()
+    cats_by_id = {cat.id: cat for cat in user_cats}
+
+    results = [None] * len(descriptions)
+    pending = {} # mô tả chuẩn hóa -> các index cần AI (mô tả trùng chỉ hỏi AI một lần)
+    for index, description in enumerate(descriptions):
+        if not isinstance(description, str) or not description.strip():
+            results[index] = {'status': 'error', 'message': 'No description'}
+            continue
+
+        local = local_classifier.predict(user_id, description, cats_by_id)
+        if local is not None:
+            results[index] = _prediction_payload(cats_by_id[local[0]], local[1], 'local')
+            continue
+
+        cached = prediction_cache.lookup(user_id, description, user_cats)
+        if cached is not None:
+            results[index] = _prediction_payload(cats_by_id.get(cached[0]), cached[1], 'cache')
+            continue
+
+        pending.setdefault(normalize_description(description), []).append(index)
+
+    if pending:
+        groups = list(pending.values())
+        started = time.perf_counter()
+        predictions = ai_engine.predict_batch([descriptions[group[0]] for group in groups], [c.name for c in user_cats])
+        elapsed = (time.perf_counter() - started) / len(groups)
+
+        for group, result in zip(groups, predictions):
+            if result is None:
+                # Mục này lỗi (hoặc cả chunk lỗi): không lưu cache, các mục khác vẫn trả bình thường
+                payload = {'status': 'no_match'}
+            else:
+                category, confidence = _match_prediction(result, user_cats)
+                prediction_cache.store(user_id, descriptions[group[0]], user_cats,
+                                       category.id if category else None, confidence, elapsed)
+                payload = _prediction_payload(category, confidence, 'ai')
+            for index in group:
+                results[index] = payload
+        db.session.commit()
+
+    # Độ trễ mỗi mục = thời gian cả lô chia đều (đưa vào nhật ký dự đoán qua hàng đợi nền)
+    per_item_ms = (time.perf_counter() - request_started) * 1000 / len(descriptions)
+    for item in results:
+        if item['status'] != 'error':
+            ai_log_writer.record_prediction(item.get('category_id'), item.get('confidence'), per_item_ms)
+
+    return jsonify({
+        'status': 'success',
+        'results': [dict(item, index=index) for index, item in enumerate(results)]
+    })
+
+def _match_prediction(result, user_cats):
+    """Tìm lại Category theo tên AI trả về (không phân biệt hoa thường) trong danh mục đã tải"""
+    category_name = (result.get('category') or '').lower()
+    category = next((c for c in user_cats if c.name.lower() == category_name), None)
+    return category, result.get('confidence', 90)
+
+def _prediction_payload(category, confidence, source):
+    if not category:
+        return {'status': 'no_match'}
+    return {
+        'status': 'success', 
+        'category_id': category.id, 
+        'category_name': category.name, 
+        'category_type': category.type, 
+        'confidence': confidence,
+        'source': source
+    }
+
+# ==========================================
+# NGỮ CẢNH TÀI CHÍNH CHO CHATBOT (CÓ CACHE)
+# Khóa cache gồm phiên bản dữ liệu của người dùng (tăng khi ghi giao dịch/ví/danh mục)
+# và ngày hiện tại (khung 30 ngày trượt theo ngày) => cả phiên chat chỉ dựng một lần.
+# ==========================================
+CHAT_CONTEXT_MAX_WALLETS = 10
+CHAT_CONTEXT_MAX_CATEGORIES = 10
+CHAT_CONTEXT_RECENT = 5
+CHAT_CONTEXT_DESC_CHARS = 60
+
+chat_context_cache = make_cache('chat_context', maxsize=Config.CHAT_CONTEXT_CACHE_SIZE)
+
+def get_chat_context(user_id):
+    key = (user_id, get_data_version(user_id), date.today())
+    context_text = chat_context_cache.get(key)
+    if context_text is None:
+        context_text = build_chat_context(user_id)
+        chat_context_cache.set(key, context_text)
+    return context_text
+
+def build_chat_context(user_id):
+    """
+    Văn bản ngữ cảnh có kích thước giới hạn: tối đa N ví, N danh mục chi nhiều nhất
+    (phần còn lại gộp một dòng), N giao dịch gần nhất với mô tả đã cắt ngắn,
+    và cả khối không vượt quá CHAT_CONTEXT_MAX_CHARS ký tự.
+    """
+    last_30_days = date.today() - timedelta(days=30)
+
+    # 1. Số dư ví hiện tại
+    wallets = Wallet.query.filter_by(user_id=user_id, is_deleted=False)\
+        .order_by(Wallet.balance.desc()).limit(CHAT_CONTEXT_MAX_WALLETS).all()
+    lines = ["--- TỔNG QUAN TÀI CHÍNH ---", "SỐ DƯ CÁC VÍ:"]
+    lines += [f"- {w.name}: {int(w.balance):,} VND" for w in wallets]
+
+    # 2. Tổng hợp chi tiêu 30 ngày qua (đọc bảng tổng hợp ngày để tránh nổ Token)
+    expense_summary = db.session.query(
+        Category.name, func.sum(DailyRollup.total).label('total')
+    ).join(DailyRollup, DailyRollup.category_id == Category.id).filter(
+        DailyRollup.user_id == user_id, 
+        DailyRollup.date >= last_30_days,
+        DailyRollup.type == 'chi'
+    ).group_by(Category.name).order_by(func.sum(DailyRollup.total).desc()).all()
+
+    lines += ["", "THỐNG KÊ CHI TIÊU 30 NGÀY QUA:"]
+    if not expense_summary:
+        lines.append("(Chưa có dữ liệu chi tiêu)")
+    else:
+        top, rest = expense_summary[:CHAT_CONTEXT_MAX_CATEGORIES], expense_summary[CHAT_CONTEXT_MAX_CATEGORIES:]
+        lines += [f"- {cat_name}: {int(total):,}đ" for cat_name, total in top]
+        if rest:
+            lines.append(f"- {len(rest)} danh mục khác: {int(sum(total for _, total in rest)):,}đ")
+
+    # 3. Vài giao dịch gần nhất để AI hiểu bối cảnh mua sắm (nạp sẵn danh mục, không lazy-load)
+    recent_transactions = Transaction.query.options(joinedload(Transaction.category))\
+        .filter_by(user_id=user_id).order_by(Transaction.date.desc(), Transaction.id.desc())\
+        .limit(CHAT_CONTEXT_RECENT).all()
+    lines += ["", f"{CHAT_CONTEXT_RECENT} GIAO DỊCH GẦN NHẤT:"]
+    for t in recent_transactions:
+        cat_name = t.category.name if t.category else "Khác"
+        type_label = "CHI" if t.type == 'chi' else "THU" if t.type == 'thu' else "CHUYỂN KHOẢN"
+        description = (t.description or '')[:CHAT_CONTEXT_DESC_CHARS]
+        lines.append(f"- {t.date.strftime('%d/%m')}: {int(t.amount):,}đ ({type_label}) - {cat_name} ({description})")
+
+    return "\n".join(lines)[:Config.CHAT_CONTEXT_MAX_CHARS] + "\n"
 
 # ==========================================
 # API 2: CHATBOT TRỢ LÝ TÀI CHÍNH CÁ NHÂN
@@ -71,39 +245,9 @@ def chat_ai():
         return jsonify({'response': 'Vui lòng nhập câu hỏi.'}), 400
 
     user_id = session['user_id']
-    last_30_days = datetime.now() - timedelta(days=30)
-    
-    # --- XÂY DỰNG NGỮ CẢNH (CONTEXT) CHO AI ---
-    
-    # 1. Lấy số dư ví hiện tại
-    wallets = Wallet.query.filter_by(user_id=user_id).all()
-    context_text = "--- TỔNG QUAN TÀI CHÍNH ---\nSỐ DƯ CÁC VÍ:\n"
-    for w in wallets: 
-        context_text += f"- {w.name}: {int(w.balance):,} VND\n"
-        
-    # 2. TỔNG HỢP CHI TIÊU 30 NGÀY QUA (Dùng Group By để tránh nổ Token)
-    expense_summary = db.session.query(
-        Category.name, func.sum(Transaction.amount)
-    ).join(Transaction, Transaction.category_id == Category.id).filter(
-        Transaction.user_id == user_id, 
-        Transaction.date >= last_30_days,
-        Transaction.type == 'chi'
-    ).group_by(Category.name).all()
-
-    context_text += "\nTHỐNG KÊ CHI TIÊU 30 NGÀY QUA:\n"
-    if not expense_summary:
-        context_text += "(Chưa có dữ liệu chi tiêu)\n"
-    else:
-        for cat_name, total in expense_summary:
-            context_text += f"- {cat_name}: {int(total):,}đ\n"
 
-    # 3. Lấy 5 giao dịch gần nhất để AI hiểu rõ bối cảnh mua sắm
-    recent_transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.date.desc()).limit(5).all()
-    context_text += "\n5 GIAO DỊCH GẦN NHẤT:\n"
-    for t in recent_transactions:
-        cat_name = t.category.name if t.category else "Khác"
-        type_label = "CHI" if t.type == 'chi' else "THU" if t.type == 'thu' else "CHUYỂN KHOẢN"
-        context_text += f"- {t.date.strftime('%d/%m')}: {int(t.amount):,}đ ({type_label}) - {cat_name} ({t.description})\n"
+    # --- NGỮ CẢNH (CONTEXT) CHO AI: dựng một lần, dùng lại tới khi dữ liệu đổi ---
+    context_text = get_chat_context(user_id)
 
     # --- GỌI GOOGLE GEMINI VÀ TRẢ VỀ THEO LUỒNG (STREAMING) ---
     try:
@@ -133,6 +277,9 @@ def chat_ai():
             except Exception as e:
                 print(f"Lỗi Stream/Database: {e}")
                 db.session.rollback()
+                if not full_answer:
+                    # Model quá hạn / lỗi trước khi kịp trả chữ nào: báo lại như khi AI bận
+                    yield AI_BUSY_MESSAGE
 
         # Trả về Response dạng luồng (text/plain)
         return Response(generate(), mimetype='text/plain')
@@ -172,51 +319,13 @@ def dashboard_insights():
             'status': 'disabled',
             'message': 'Tính năng AI đang bị tắt.'
         })
-    # 1. Lấy dữ liệu tổng quan tháng này
-    today = datetime.today()
-    first_day = today.replace(day=1)
-    
-    # Lấy toàn bộ giao dịch từ đầu tháng
-    transactions = Transaction.query.filter(
-        Transaction.user_id == user_id,
-        Transaction.date >= first_day
-    ).all()
-    
-    total_income = sum(t.amount for t in transactions if t.type == 'thu')
-    total_expense = sum(t.amount for t in transactions if t.type == 'chi')
-    
-    # 2. Xây dựng Prompt "Ép khuôn" AI (Đã tối ưu hóa)
-    context_text = f"Thống kê tháng này - Thu nhập: {int(total_income):,} VND. Chi tiêu: {int(total_expense):,} VND."
-    
-    question = (
-        "Dựa vào số liệu trên, hãy đưa ra 3 lời khuyên tài chính. "
-        "YÊU CẦU NGHIÊM NGẶT ĐỂ ĐỊNH DẠNG: "
-        "1. TUYỆT ĐỐI KHÔNG chào hỏi, KHÔNG xưng hô (vd: Cấm dùng 'Chào bạn', 'FinAI đây'). "
-        "2. TUYỆT ĐỐI KHÔNG có câu dẫn dắt (vd: Cấm dùng 'Đây là lời khuyên...'). "
-        "3. Trả về ĐÚNG 3 dòng, mỗi dòng là một lời khuyên trực tiếp, hành động ngay. "
-        "4. Độ dài tối đa: Dưới 15 chữ cho MỖI dòng. "
-        "5. Không dùng markdown, không dùng icon."
-    )
     try:
-        # Gọi AI (Tận dụng lại hàm chat_with_data)
-        response_stream = ai_engine.chat_with_data(question, context_text)
-        
-        if isinstance(response_stream, str): # Xử lý lỗi từ engine
-            return jsonify({'status': 'error', 'message': response_stream})
-            
-        # 3. Gom toàn bộ luồng Stream lại thành 1 chuỗi duy nhất ở Backend
-        full_answer = ""
-        for chunk in response_stream:
-            if chunk.text:
-                full_answer += chunk.text
-                
-        # 4. Làm sạch dữ liệu và tách thành mảng (Array) 3 câu
-        # Lọc bỏ các dòng trống và ký tự gạch đầu dòng rườm rà
-        insights = [line.strip().lstrip('-*•').strip() for line in full_answer.split('\n') if line.strip()]
-        
-        # Trả về JSON tĩnh chuẩn mực
-        return jsonify({'status': 'success', 'data': insights[:3]})
-        
+        # Tổng thu/chi tháng bằng một truy vấn gom nhóm; gợi ý được cache theo ngày + số liệu
+        insights = get_insights(user_id)
+        return jsonify({'status': 'success', 'data': insights})
+
+    except RuntimeError as e: # Thông báo lỗi từ engine (AI bận, cầu dao ngắt...)
+        return jsonify({'status': 'error', 'message': str(e)})
     except Exception as e:
         print(f"Lỗi AI Dashboard: {e}")
         return jsonify({'status': 'error', 'message': 'Hệ thống AI đang bận.'}), 500
\ No newline at end of file
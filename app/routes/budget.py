@@ -1,9 +1,11 @@
 from decimal import Decimal
 from datetime import datetime, date
 from flask import Blueprint, request, session, jsonify
-from sqlalchemy import func, or_
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 from app import db
-from app.models import Budget, Category, Transaction
+from app.models import Budget, BudgetAlert, Category
+from app.budget_engine import get_budget_progress, get_budget_spending, sync_budget
 from app.utils import api_login_required
 
 budget_bp = Blueprint('budget', __name__)
@@ -15,26 +17,22 @@ def manage_budgets():
     
     if request.method == 'GET':
         try:
-            budgets = Budget.query.filter_by(user_id=user_id, is_deleted=False).all()
+            # Nạp sẵn danh mục của mọi ngân sách bằng 1 truy vấn (không lazy-load từng cái)
+            budgets = Budget.query.options(selectinload(Budget.categories))\
+                .filter_by(user_id=user_id, is_deleted=False).all()
+            # Số đã chi được cộng dồn sẵn khi ghi giao dịch: chỉ tra khóa chính
+            spent_by_budget = get_budget_progress([b.id for b in budgets])
+            missing = [b.id for b in budgets if b.id not in spent_by_budget]
+            if missing:
+                # Ngân sách cũ chưa có tiến độ lưu sẵn thì tính từ bảng tổng hợp
+                spent_by_budget.update(get_budget_spending(user_id, missing))
             result = []
             today = date.today()
             
             for b in budgets:
                 # Lấy số tiền giới hạn từ model của bạn
                 limit_amt = getattr(b, 'limit_amount', 0)
-                
-                cat_ids = [c.id for c in b.categories]
-                spent = 0
-                
-                # Tính tổng chi tiêu
-                if cat_ids:
-                    spent = db.session.query(func.sum(Transaction.amount)).filter(
-                        Transaction.user_id == user_id,
-                        Transaction.type == 'chi',
-                        Transaction.category_id.in_(cat_ids),
-                        Transaction.date >= b.start_date,
-                        Transaction.date <= b.end_date
-                    ).scalar() or 0
+                spent = spent_by_budget.get(b.id, 0)
                     
                 # Tính % tiến độ
                 progress = (spent / limit_amt) * 100 if limit_amt > 0 else 0
@@ -79,8 +77,10 @@ def manage_budgets():
             new_budget.categories.extend(selected_cats)
             
             db.session.add(new_budget)
+            db.session.flush()
+            alerts = sync_budget(new_budget)
             db.session.commit()
-            return jsonify({'status': 'success', 'message': 'Đã tạo ngân sách!'})
+            return jsonify({'status': 'success', 'message': 'Đã tạo ngân sách!', 'alerts': alerts})
         except Exception as e:
             db.session.rollback()
             print("=== LỖI API POST BUDGETS ===")
@@ -97,6 +97,7 @@ def modify_budget(budget_id):
         if not budget:
             return jsonify({'status': 'error', 'message': 'Không tìm thấy ngân sách này!'}), 404
             
+        alerts = []
         if request.method == 'DELETE':
             budget.is_deleted = True
             
@@ -117,12 +118,58 @@ def modify_budget(budget_id):
             # SQLAlchemy sẽ tự động xóa các danh mục cũ và gắn danh mục mới vào
             budget.categories = selected_cats
 
+            # Hạn mức / khung ngày / danh mục đổi thì tính lại tiến độ và mốc cảnh báo
+            db.session.flush()
+            alerts = sync_budget(budget)
+
         db.session.commit()
-        return jsonify({'status': 'success', 'message': 'Cập nhật thành công!'})
+        return jsonify({'status': 'success', 'message': 'Cập nhật thành công!', 'alerts': alerts})
         
     except Exception as e:
         db.session.rollback()
         import traceback
         print("=== LỖI API PUT/DELETE BUDGET ===")
         traceback.print_exc()
-        return jsonify({'status': 'error', 'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@budget_bp.route('/api/budgets/alerts', methods=['GET'])
+@api_login_required
+def get_budget_alerts():
+    """Các cảnh báo ngân sách chưa đọc. Chỉ đọc, không đánh dấu: trình duyệt hiển thị xong mới gọi /read"""
+    user_id = session['user_id']
+    try:
+        alerts = db.session.query(BudgetAlert, Budget.name, Budget.limit_amount)\
+            .join(Budget, Budget.id == BudgetAlert.budget_id)\
+            .filter(BudgetAlert.user_id == user_id, BudgetAlert.is_read == False)\
+            .order_by(BudgetAlert.created_at.desc()).all()
+
+        return jsonify([{
+            'id': a.id,
+            'budget_id': a.budget_id,
+            'budget_name': name,
+            'threshold': a.threshold,
+            'spent': float(a.spent),
+            'limit': float(limit),
+            'created_at': a.created_at.strftime('%d/%m/%Y %H:%M')
+        } for a, name, limit in alerts])
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@budget_bp.route('/api/budgets/alerts/read', methods=['POST'])
+@api_login_required
+def mark_budget_alerts_read():
+    """Đánh dấu đã đọc các cảnh báo trình duyệt đã hiển thị (body: {"ids": [...]})"""
+    user_id = session['user_id']
+    ids = (request.json or {}).get('ids') or []
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return jsonify({'status': 'error', 'message': 'Danh sách cảnh báo không hợp lệ'}), 400
+    try:
+        updated = 0
+        if ids:
+            updated = BudgetAlert.query.filter(BudgetAlert.user_id == user_id, BudgetAlert.id.in_(ids))\
+                .update({BudgetAlert.is_read: True}, synchronize_session=False)
+            db.session.commit()
+        return jsonify({'status': 'success', 'message': f'Đã đánh dấu {updated} cảnh báo'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1,5 +1,8 @@
 from flask import Blueprint, request, session, jsonify
 from app import db
+from app.bookkeeping import open_wallet, adjust_wallet_balance
+from app.cache import bump_data_version
+from app.prediction_cache import prediction_cache
 from app.models import Wallet, Category
 from app.utils import api_login_required
 from sqlalchemy import or_
@@ -18,10 +21,14 @@ def manage_wallets():
     if request.method == 'POST':
         data = request.json
         try:
-            db.session.add(Wallet(
+            wallet = Wallet(
                 user_id=user_id,
                 name=data.get('name'), type=data.get('type'), balance=Decimal(str(data.get('balance', 0)))
-            ))
+            )
+            db.session.add(wallet)
+            db.session.flush()
+            open_wallet(wallet)
+            bump_data_version(user_id)
             db.session.commit()
             return jsonify({'status': 'success'})
         except Exception as e: return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -40,8 +47,10 @@ def modify_wallet(wallet_id):
             data = request.json
             wallet.name = data.get('name')
             wallet.type = data.get('type')
-            wallet.balance = Decimal(str(data.get('balance', 0)))
+            # Không ghi đè SoDu: chênh lệch được ghi nhật ký và cộng nguyên tử
+            adjust_wallet_balance(wallet, Decimal(str(data.get('balance', wallet.balance))))
         
+        bump_data_version(user_id)
         db.session.commit()
         return jsonify({'status': 'success'})
     except Exception as e: return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -64,6 +73,8 @@ def manage_categories():
                 user_id=user_id,
                 name=data.get('name'), type=data.get('type')
             ))
+            bump_data_version(user_id)
+            prediction_cache.invalidate(user_id)
             db.session.commit()
             return jsonify({'status': 'success'})
         except Exception as e: return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -86,6 +97,8 @@ def modify_category(cat_id):
             cat.name = data.get('name', cat.name)
             cat.type = data.get('type', cat.type)
         
+        bump_data_version(user_id)
+        prediction_cache.invalidate(user_id)
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Thao tác thành công!'})
     except Exception as e: return jsonify({'status': 'error', 'message': str(e)}), 500
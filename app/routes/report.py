@@ -1,17 +1,23 @@
-from flask import Blueprint, render_template, request, session, jsonify, send_file, redirect, url_for
+from flask import Blueprint, render_template, request, session, jsonify, send_file, redirect, url_for, Response, stream_with_context
 from functools import wraps
 from datetime import datetime, timedelta, date
 import calendar
-import pandas as pd
-from io import BytesIO
-from sqlalchemy import func
+import csv
+import tempfile
+from io import StringIO
+from sqlalchemy import func, select, cast
 
 from app import db
-from app.models import Transaction, Category, Wallet
+from app.cache import make_cache, get_data_version
+from app.models import Transaction, Category, Wallet, DailyRollup
+from config import Config
 
 # Khai báo Blueprint
 report_bp = Blueprint('report', __name__)
 
+# Cache kết quả báo cáo đã tính, khóa theo (người dùng, phiên bản dữ liệu, bộ lọc)
+report_cache = make_cache('report', maxsize=Config.REPORT_CACHE_SIZE)
+
 # --- Hàm hỗ trợ ---
 def login_required(f):
     @wraps(f)
@@ -42,6 +48,49 @@ def get_date_range(time_range):
         end_date = date(today.year, today.month, last_day)
     return start_date, end_date
 
+GRANULARITIES = ('day', 'week', 'month', 'quarter')
+MAX_BUCKETS = 2000
+
+def _parse_report_date(value, label):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{label} không hợp lệ (định dạng YYYY-MM-DD)")
+
+def resolve_date_range(args):
+    """
+    Khoảng thời gian của báo cáo: ưu tiên start/end tùy chọn (YYYY-MM-DD),
+    nếu không có thì dùng các mốc có sẵn (this_month, last_month, year).
+    Trả về (time_range, start_date, end_date), ném ValueError nếu tham số sai.
+    """
+    if args.get('start') or args.get('end'):
+        if not (args.get('start') and args.get('end')):
+            raise ValueError("Cần chọn cả ngày bắt đầu và ngày kết thúc")
+        start_date = _parse_report_date(args['start'], "Ngày bắt đầu")
+        end_date = _parse_report_date(args['end'], "Ngày kết thúc")
+        if start_date > end_date:
+            raise ValueError("Ngày bắt đầu phải trước ngày kết thúc")
+        return 'custom', start_date, end_date
+
+    time_range = args.get('time_range', 'this_month')
+    start_date, end_date = get_date_range(time_range)
+    return time_range, start_date, end_date
+
+def resolve_granularity(requested, start_date, end_date):
+    """Độ chi tiết của biểu đồ đường: theo yêu cầu, hoặc tự chọn theo độ dài khoảng thời gian"""
+    if requested:
+        if requested not in GRANULARITIES:
+            raise ValueError("granularity phải là day, week, month hoặc quarter")
+        return requested
+    span = (end_date - start_date).days + 1
+    if span <= 62:
+        return 'day'
+    if span <= 120:
+        return 'week'
+    if span <= 1100:
+        return 'month'
+    return 'quarter'
+
 # --- Routes Giao diện ---
 @report_bp.route('/reports')
 @login_required
@@ -55,60 +104,128 @@ def get_report_data():
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
         
     user_id = session['user_id']
-    time_range = request.args.get('time_range', 'this_month')
     wallet_id = request.args.get('wallet_id', 'all')
     req_type = request.args.get('type', 'expense') 
     db_type = 'chi' if req_type == 'expense' else 'thu'
+    try:
+        time_range, start_date, end_date = resolve_date_range(request.args)
+        granularity = resolve_granularity(request.args.get('granularity'), start_date, end_date)
+        if _bucket_count(start_date, end_date, granularity) > MAX_BUCKETS:
+            raise ValueError("Khoảng thời gian quá dài so với độ chi tiết đã chọn")
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
 
-    start_date, end_date = get_date_range(time_range)
-    query = db.session.query(Transaction).filter(
-        Transaction.user_id == user_id, 
-        Transaction.date >= start_date, 
-        Transaction.date <= end_date
+    # Khóa cache gồm phiên bản dữ liệu: mọi lần ghi giao dịch/ví/danh mục đều làm khóa cũ hết hiệu lực
+    cache_key = (user_id, get_data_version(user_id), start_date, end_date, granularity, wallet_id, db_type)
+    payload = report_cache.get(cache_key)
+    if payload is None:
+        payload = build_report_payload(user_id, start_date, end_date, granularity, wallet_id, db_type)
+        report_cache.set(cache_key, payload)
+    return jsonify(payload)
+
+def _bucket_expr(column, granularity):
+    """Biểu thức SQL đưa mỗi ngày về ngày đầu kỳ (YYYY-MM-DD) để GROUP BY ngay trong DB"""
+    if db.engine.dialect.name == 'postgresql':
+        if granularity == 'day':
+            return column
+        return cast(func.date_trunc(granularity, column), db.Date)
+
+    # SQLite
+    if granularity == 'week':
+        return func.date(column, 'weekday 0', '-6 days') # Thứ Hai đầu tuần
+    if granularity == 'month':
+        return func.date(column, 'start of month')
+    if granularity == 'quarter':
+        return func.printf('%s-%02d-01', func.strftime('%Y', column),
+                           (cast(func.strftime('%m', column), db.Integer) - 1) // 3 * 3 + 1)
+    return column
+
+def _bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return day
+
+def _next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity in ('month', 'quarter'):
+        months = day.month - 1 + (1 if granularity == 'month' else 3)
+        return date(day.year + months // 12, months % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+def _bucket_count(start_date, end_date, granularity):
+    span = (end_date - start_date).days + 1
+    return {'day': span, 'week': span // 7 + 2, 'month': span // 28 + 2, 'quarter': span // 90 + 2}[granularity]
+
+def _bucket_label(day, granularity, multi_year):
+    if granularity == 'quarter':
+        return f"Quý {(day.month - 1) // 3 + 1}/{day.year}"
+    if granularity == 'month':
+        return f"Tháng {day.month}/{day.year}" if multi_year else f"Tháng {day.month}"
+    if granularity == 'week':
+        return "Tuần " + day.strftime('%d/%m/%Y' if multi_year else '%d/%m')
+    return day.strftime('%d/%m/%Y' if multi_year else '%d/%m')
+
+def _iter_buckets(start_date, end_date, granularity):
+    """Sinh (khóa kỳ 'YYYY-MM-DD', nhãn) cho toàn bộ khoảng thời gian, kể cả kỳ không có giao dịch"""
+    multi_year = start_date.year != end_date.year
+    day = _bucket_start(start_date, granularity)
+    while day <= end_date:
+        yield day.isoformat(), _bucket_label(day, granularity, multi_year)
+        day = _next_bucket(day, granularity)
+
+def build_report_payload(user_id, start_date, end_date, granularity, wallet_id, db_type):
+    # Mọi số liệu đọc từ bảng tổng hợp ngày (số dòng ~ số ngày, không phụ thuộc số giao dịch)
+    rollup = db.session.query(DailyRollup).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.date >= start_date,
+        DailyRollup.date <= end_date
     )
-    if wallet_id != 'all' and wallet_id: 
-        query = query.filter(Transaction.wallet_id == wallet_id)
+    if wallet_id != 'all' and wallet_id:
+        rollup = rollup.filter(DailyRollup.wallet_id == wallet_id)
+
+    # Truy vấn 1: gom theo (loại, danh mục) -> đủ cho biểu đồ tròn, biểu đồ cột và top chi tiêu
+    grouped = rollup.with_entities(
+        DailyRollup.type, Category.name, func.sum(DailyRollup.total)
+    ).outerjoin(Category, DailyRollup.category_id == Category.id)\
+     .group_by(DailyRollup.type, Category.name)\
+     .order_by(func.sum(DailyRollup.total).desc()).all()
 
     # 1. Biểu đồ tròn
-    cat_query = query.filter(Transaction.type == db_type)
-    category_stats = cat_query.with_entities(Category.name, func.sum(Transaction.amount)).outerjoin(Category, Transaction.category_id == Category.id).group_by(Category.name).all()
-    pie_labels = [item[0] if item[0] else "Chưa phân loại" for item in category_stats]
-    pie_data = [float(item[1]) for item in category_stats]
+    category_stats = [(name, amount) for t_type, name, amount in grouped if t_type == db_type]
+    pie_labels = [name if name else "Chưa phân loại" for name, _ in category_stats]
+    pie_data = [float(amount) for _, amount in category_stats]
 
-    # 2. Biểu đồ cột (Tối ưu query Group By 1 lần thay vì 3 lần)
-    type_stats = query.with_entities(Transaction.type, func.sum(Transaction.amount)).group_by(Transaction.type).all()
+    # 2. Biểu đồ cột
     totals = {'thu': 0, 'chi': 0, 'chuyen': 0}
-    for t_type, amount in type_stats:
+    for t_type, _, amount in grouped:
         if t_type in totals:
-            totals[t_type] = float(amount)
+            totals[t_type] += float(amount)
             
     bar_chart_data = {
         "labels": ["Thu nhập", "Chi tiêu", "Chuyển khoản"], 
         "data": [totals['thu'], totals['chi'], totals['chuyen']]
     }
 
-    # 3. Biểu đồ đường (Xử lý gom nhóm linh hoạt)
-    line_chart_data = {"labels": [], "data": []}
-    transactions_for_line = query.filter(Transaction.type == db_type).order_by(Transaction.date).all()
-    
-    if time_range == 'year':
-        # Nếu chọn Năm: Gom nhóm theo 12 tháng
-        monthly_data = {m: 0 for m in range(1, 13)}
-        for t in transactions_for_line:
-            monthly_data[t.date.month] += float(t.amount)
-        line_chart_data["labels"] = [f"Tháng {m}" for m in range(1, 13)]
-        line_chart_data["data"] = [monthly_data[m] for m in range(1, 13)]
-    else:
-        # Nếu chọn Tháng: Gom nhóm theo ngày
-        daily_data = {}
-        for t in transactions_for_line:
-            day_str = t.date.strftime('%d/%m')
-            daily_data[day_str] = daily_data.get(day_str, 0) + float(t.amount)
-        line_chart_data["labels"] = list(daily_data.keys())
-        line_chart_data["data"] = list(daily_data.values())
-
-    # 4. Top chi tiêu
-    top_cat_query = query.filter(Transaction.type == 'chi').with_entities(Category.name, func.sum(Transaction.amount)).outerjoin(Category, Transaction.category_id == Category.id).group_by(Category.name).order_by(func.sum(Transaction.amount).desc()).all()
+    # 3. Biểu đồ đường. Truy vấn 2: DB tự gom theo kỳ, Python chỉ duyệt lịch một lượt để lấp kỳ trống
+    bucket = _bucket_expr(DailyRollup.date, granularity)
+    line_rows = {
+        str(key)[:10]: amount for key, amount in
+        rollup.filter(DailyRollup.type == db_type)
+        .with_entities(bucket, func.sum(DailyRollup.total))
+        .group_by(bucket).all()
+    }
+    line_chart_data = {"labels": [], "data": [], "granularity": granularity}
+    for key, label in _iter_buckets(start_date, end_date, granularity):
+        line_chart_data["labels"].append(label)
+        line_chart_data["data"].append(float(line_rows.get(key, 0)))
+
+    # 4. Top chi tiêu (đã sắp xếp giảm dần theo tổng tiền ở truy vấn 1)
+    top_cat_query = [(name, amount) for t_type, name, amount in grouped if t_type == 'chi']
     total_expense_period = sum([item[1] for item in top_cat_query]) if top_cat_query else 0
     top_spending_list = [
         {
@@ -120,54 +237,99 @@ def get_report_data():
         for name, amount in top_cat_query
     ]
 
-    return jsonify({
+    return {
         "pie_chart": {"labels": pie_labels, "data": pie_data},
         "bar_chart": bar_chart_data,
         "line_chart": line_chart_data,
         "top_spending": top_spending_list,
         "summary": {"total_income": totals['thu'], "total_expense": totals['chi'], "balance": totals['thu'] - totals['chi']}
-    })
+    }
+
+EXPORT_COLUMNS = ["Ngày", "Danh mục", "Nội dung", "Số tiền", "Loại", "Ví"]
+EXPORT_CHUNK_ROWS = 1000
+
+def _iter_export_rows(user_id, start_date, end_date):
+    """
+    Đọc giao dịch theo luồng (server-side cursor, mỗi lần EXPORT_CHUNK_ROWS dòng),
+    chỉ lấy đúng các cột cần xuất, không tạo đối tượng ORM.
+    """
+    stmt = select(
+        Transaction.date, Category.name, Transaction.description,
+        Transaction.amount, Transaction.type, Wallet.name
+    ).outerjoin(Category, Transaction.category_id == Category.id)\
+     .outerjoin(Wallet, Transaction.wallet_id == Wallet.id)\
+     .where(
+        Transaction.user_id == user_id,
+        Transaction.date >= start_date,
+        Transaction.date <= end_date
+    ).order_by(Transaction.date.desc())\
+     .execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS)
+
+    for t_date, cat_name, description, amount, t_type, wallet_name in db.session.execute(stmt):
+        loai = "Chi tiêu" if t_type == 'chi' else ("Thu nhập" if t_type == 'thu' else "Chuyển khoản")
+        yield [
+            t_date.strftime('%d/%m/%Y'),
+            cat_name or "Chưa phân loại",
+            description,
+            amount,
+            loai,
+            wallet_name or "Không xác định"
+        ]
 
 @report_bp.route('/api/reports/export/excel', methods=['GET'])
 def export_excel():
     if api_login_required_check(): return jsonify({'status': 'error'}), 401
     user_id = session['user_id']
-    time_range = request.args.get('time_range', 'this_month')
-    start_date, end_date = get_date_range(time_range)
+    export_format = request.args.get('format', 'xlsx')
+    try:
+        time_range, start_date, end_date = resolve_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    filename = f"Bao_cao_{time_range}_{date.today()}"
 
-    # Đã nối bảng rõ ràng, an toàn
-    query = db.session.query(Transaction).filter(
-        Transaction.user_id == user_id, 
-        Transaction.date >= start_date, 
-        Transaction.date <= end_date
-    ).outerjoin(Category, Transaction.category_id == Category.id).outerjoin(Wallet, Transaction.wallet_id == Wallet.id).order_by(Transaction.date.desc())
-    
-    transactions = query.all()
-    
-    data_list = []
-    for t in transactions:
-        loai = "Chi tiêu" if t.type == 'chi' else ("Thu nhập" if t.type == 'thu' else "Chuyển khoản")
-        data_list.append({
-            "Ngày": t.date.strftime('%d/%m/%Y'), 
-            "Danh mục": t.category.name if t.category else "Chưa phân loại", 
-            "Nội dung": t.description, 
-            "Số tiền": t.amount, 
-            "Loại": loai, 
-            "Ví": t.wallet.name if t.wallet else "Không xác định"
+    if export_format == 'csv':
+        # CSV: gửi từng khối ngay khi đọc xong, bộ nhớ chỉ giữ một khối
+        @stream_with_context
+        def generate():
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            buffer.write('\ufeff') # BOM để Excel nhận đúng tiếng Việt UTF-8
+            writer.writerow(EXPORT_COLUMNS)
+            for i, row in enumerate(_iter_export_rows(user_id, start_date, end_date), start=1):
+                writer.writerow(row)
+                if i % EXPORT_CHUNK_ROWS == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+
+        return Response(generate(), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename="{filename}.csv"'
         })
-    
-    df = pd.DataFrame(data_list) if data_list else pd.DataFrame(columns=["Ngày", "Danh mục", "Nội dung", "Số tiền", "Loại", "Ví"])
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer: df.to_excel(writer, index=False, sheet_name='Báo cáo')
+
+    # XLSX: workbook chế độ write-only ghi từng dòng xuống file tạm trên đĩa,
+    # file hoàn chỉnh được gửi đi theo từng khối => RAM không tăng theo số dòng.
+    # openpyxl chỉ nạp khi có người xuất Excel, không tốn thời gian khởi động worker.
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Báo cáo')
+    sheet.append(EXPORT_COLUMNS)
+    for row in _iter_export_rows(user_id, start_date, end_date):
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
     output.seek(0)
-    return send_file(output, download_name=f"Bao_cao_{time_range}_{date.today()}.xlsx", as_attachment=True, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return send_file(output, download_name=f"{filename}.xlsx", as_attachment=True, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
 @report_bp.route('/api/reports/export/pdf', methods=['GET'])
 def export_pdf():
     if api_login_required_check(): return redirect(url_for('auth.login'))
     user_id = session['user_id']
-    time_range = request.args.get('time_range', 'this_month')
-    start_date, end_date = get_date_range(time_range)
+    try:
+        _, start_date, end_date = resolve_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
 
     # ĐÃ VÁ LỖI JOIN BẢNG Ở ĐÂY
     transactions = db.session.query(Transaction).filter(
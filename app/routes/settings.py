@@ -1,21 +1,23 @@
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from app.models import User, UserSetting
+from app.models import UserSetting
 from app import db
 from app.utils import api_login_required, login_required
+from app.current_user import get_current_user, invalidate_user_profile
 # Khai báo Blueprint
 settings_bp = Blueprint('settings', __name__)
 
 @settings_bp.route('/settings')
 @login_required
 def settings():
-    # 1. Lấy thông tin user
-    current_user = User.query.get(session['user_id']) 
+    # 1. Lấy thông tin user (một truy vấn, dùng chung với template qua flask.g)
+    current_user = get_current_user()
     
     # 2. Tạo setting mặc định nếu chưa có
     if not current_user.settings:
         new_settings = UserSetting(user_id=current_user.id)
         db.session.add(new_settings)
         db.session.commit()
+        invalidate_user_profile(session['user_id'])
         
     # 3. BẮT BUỘC PHẢI CÓ user=current_user Ở ĐÂY
     return render_template('user/settings.html', user=current_user)
@@ -31,9 +33,10 @@ def update_profile():
         return jsonify({'status': 'error', 'message': 'Họ tên không được để trống'}), 400
         
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         user.name = new_name  # Khớp với model User của bạn
         db.session.commit()
+        invalidate_user_profile(session['user_id'])
         return jsonify({'status': 'success', 'message': 'Cập nhật họ tên thành công!'})
     except Exception as e:
         db.session.rollback()
@@ -55,7 +58,7 @@ def update_password():
         return jsonify({'status': 'error', 'message': 'Mật khẩu mới không khớp nhau'}), 400
         
     try:
-        user = User.query.get(session['user_id'])
+        user = get_current_user()
         
         # Dùng hàm check_password từ model của bạn
         if not user.check_password(current_password):
@@ -82,6 +85,7 @@ def update_preferences():
         user_setting.currency = currency
         user_setting.language = language
         db.session.commit()
+        invalidate_user_profile(session['user_id'])
         return jsonify({'status': 'success', 'message': 'Đã lưu tùy chỉnh!'})
     except Exception as e:
         db.session.rollback()
@@ -101,6 +105,7 @@ def update_ai_settings():
         # Trong DB cột này là Integer (1 = Bật, 0 = Tắt)
         user_setting.ai_suggestions = 1 if ai_enabled else 0
         db.session.commit()
+        invalidate_user_profile(session['user_id'])
         
         status_msg = 'Đã BẬT AI' if ai_enabled else 'Đã TẮT AI'
         return jsonify({'status': 'success', 'message': status_msg})
@@ -1,21 +1,138 @@
-from datetime import datetime
-from flask import Blueprint, request, session, jsonify
+import base64
+import json
+from datetime import datetime, date
+from flask import Blueprint, request, session, jsonify, current_app
+from sqlalchemy import and_, or_, insert, func
+from sqlalchemy.orm import joinedload
 
 from app import db
+from app.bookkeeping import TransactionEffects
+from app.local_classifier import local_classifier
+from app.ai_log_writer import ai_log_writer
 from app.models import Transaction, Wallet
+from app.statement_import import open_statement, parse_amount, StatementRowError
 from app.utils import api_login_required
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 transaction_bp = Blueprint('transaction', __name__)
 
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ERRORS = 20
+
+# NgayTao cho phép NULL (dữ liệu cũ / nhập tay vào DB): coi như thời điểm nhỏ nhất
+# để sắp xếp và so sánh con trỏ, nếu không các dòng đó sẽ rơi khỏi các trang sau
+CREATED_AT_MISSING = datetime(1970, 1, 1)
+_created_key = func.coalesce(Transaction.created_at, CREATED_AT_MISSING)
+
+def _encode_cursor(t):
+    """Mã hóa vị trí (date, created_at, id) của dòng cuối trang thành chuỗi an toàn cho URL"""
+    raw = json.dumps([t.date.isoformat(), (t.created_at or CREATED_AT_MISSING).isoformat(), t.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    d, created, trans_id = json.loads(raw)
+    return date.fromisoformat(d), datetime.fromisoformat(created), int(trans_id)
+
+def _parse_date_arg(name):
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def _parse_form_amount(raw):
+    """Số tiền từ form: số thuần ('1250000.5') hoặc kiểu ngân hàng ('1.250.000') như khi nhập sao kê"""
+    text = str(raw).strip() if raw is not None else ''
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        try:
+            amount = parse_amount(text)
+        except InvalidOperation:
+            amount = None
+    if amount is None or not amount.is_finite() or amount <= 0:
+        raise ValueError('Số tiền không hợp lệ (phải là số lớn hơn 0)')
+    return amount
+
+def _parse_form_date(raw):
+    try:
+        return datetime.strptime(raw or '', '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError('Ngày giao dịch không hợp lệ (định dạng YYYY-MM-DD)')
+
+def _relabel_after_commit(user_id, trans_id, old, new=None):
+    """
+    Bộ phân loại cục bộ đã học nhãn cũ thì sửa lại cho khớp. Gọi SAU commit và ngoài
+    khối try/rollback của request: giao dịch đã lưu xong, lỗi ở đây chỉ ghi log.
+    """
+    if old == new:
+        return # Mô tả và danh mục không đổi: không ghi lại mô hình, các worker không phải nạp lại
+    try:
+        local_classifier.relabel(user_id, trans_id, old=old, new=new)
+    except Exception:
+        current_app.logger.exception("Không cập nhật được bộ phân loại cục bộ (giao dịch %s)", trans_id)
+
 @transaction_bp.route('/api/transactions', methods=['GET'])
 @api_login_required
 def get_transactions():
     user_id = session['user_id']
-    trans_list = Transaction.query.filter_by(user_id=user_id)\
-        .order_by(Transaction.date.desc(), Transaction.created_at.desc()).all()
-    
-    return jsonify([{
+    args = request.args
+
+    try:
+        limit = min(max(int(args.get('limit', PAGE_SIZE_DEFAULT)), 1), PAGE_SIZE_MAX)
+        start_date = _parse_date_arg('start_date')
+        end_date = _parse_date_arg('end_date')
+        min_amount = Decimal(args['min_amount']) if args.get('min_amount') else None
+        max_amount = Decimal(args['max_amount']) if args.get('max_amount') else None
+        wallet_id = int(args['wallet_id']) if args.get('wallet_id') else None
+        category_id = int(args['category_id']) if args.get('category_id') else None
+        cursor = _decode_cursor(args['cursor']) if args.get('cursor') else None
+    except (ValueError, TypeError, ArithmeticError):
+        return jsonify({'status': 'error', 'message': 'Tham số lọc không hợp lệ'}), 400
+
+    # Nạp sẵn Ví/Danh mục trong cùng câu truy vấn (tránh N+1 khi đọc t.category, t.wallet...)
+    query = Transaction.query.filter(Transaction.user_id == user_id).options(
+        joinedload(Transaction.category),
+        joinedload(Transaction.wallet),
+        joinedload(Transaction.dest_wallet)
+    )
+
+    # --- Bộ lọc phía server ---
+    if wallet_id:
+        query = query.filter(or_(Transaction.wallet_id == wallet_id, Transaction.dest_wallet_id == wallet_id))
+    if category_id:
+        query = query.filter(Transaction.category_id == category_id)
+    if args.get('type'):
+        query = query.filter(Transaction.type == args['type'])
+    if start_date:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date:
+        query = query.filter(Transaction.date <= end_date)
+    if min_amount is not None:
+        query = query.filter(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(Transaction.amount <= max_amount)
+
+    # --- Phân trang keyset: lấy các dòng "sau" con trỏ theo thứ tự (date, created_at, id) giảm dần ---
+    if cursor:
+        c_date, c_created, c_id = cursor
+        query = query.filter(or_(
+            Transaction.date < c_date,
+            and_(Transaction.date == c_date, or_(
+                _created_key < c_created,
+                and_(_created_key == c_created, Transaction.id < c_id)
+            ))
+        ))
+
+    # Lấy dư 1 dòng để biết còn trang sau hay không
+    trans_list = query.order_by(
+        Transaction.date.desc(), _created_key.desc(), Transaction.id.desc()
+    ).limit(limit + 1).all()
+
+    has_more = len(trans_list) > limit
+    trans_list = trans_list[:limit]
+
+    response = jsonify([{
         'id': t.id,
         'type': t.type,
         'amount': t.amount,
@@ -29,6 +146,11 @@ def get_transactions():
         'dest_wallet_name': t.dest_wallet.name if t.dest_wallet else None
     } for t in trans_list])
 
+    # Giữ nguyên body là mảng JSON (tương thích giao diện cũ), con trỏ trang sau nằm ở header
+    if has_more:
+        response.headers['X-Next-Cursor'] = _encode_cursor(trans_list[-1])
+    return response
+
 @transaction_bp.route('/api/transactions', methods=['POST'])
 @api_login_required
 def add_transaction():
@@ -38,7 +160,7 @@ def add_transaction():
     try:
         trans_type = data.get('type')
         db_type = {'expense': 'chi', 'income': 'thu', 'transfer': 'chuyen'}.get(trans_type, 'chi')
-        amount = Decimal(str(data.get('amount')))
+        amount = _parse_form_amount(data.get('amount'))
         
         source_id = data.get('source_wallet_id')
         dest_id = data.get('dest_wallet_id')
@@ -56,26 +178,102 @@ def add_transaction():
             type=db_type,
             amount=amount,
             description=data.get('description'),
-            date=datetime.strptime(data.get('date'), '%Y-%m-%d') if data.get('date') else datetime.now(),
+            date=_parse_form_date(data.get('date')) if data.get('date') else datetime.now(),
             ai_category_id=data.get('ai_category_id'),
             ai_confidence=data.get('ai_confidence')
         )
         db.session.add(new_trans)
 
-        # Cập nhật số dư
-        wallet = Wallet.query.get(final_wallet_id)
-        if db_type == 'chi':
-            wallet.balance -= amount
-        elif db_type == 'thu':
-            wallet.balance += amount
-        elif db_type == 'chuyen':
-            wallet.balance -= amount
-            dest_wallet = Wallet.query.get(final_dest_id)
-            if dest_wallet: dest_wallet.balance += amount
+        # Cập nhật số dư bằng UPDATE nguyên tử, cùng transaction với lệnh INSERT
+        effects = TransactionEffects(user_id)
+        effects.apply(new_trans)
+        effects.flush()
 
         db.session.commit()
-        return jsonify({'status': 'success', 'message': 'Đã lưu giao dịch!'})
+        local_classifier.mark_stale(user_id)
+        # So gợi ý AI (nếu có) với danh mục người dùng chốt; ghi nhật ký ở luồng nền
+        if data.get('ai_category_id'):
+            ai_log_writer.record_outcome(user_id, new_trans.id, data['ai_category_id'],
+                                         data.get('category_id'), data.get('ai_confidence'))
+        return jsonify({'status': 'success', 'message': 'Đã lưu giao dịch!', 'alerts': effects.alerts})
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@transaction_bp.route('/api/transactions/import', methods=['POST'])
+@api_login_required
+def import_transactions():
+    """
+    Nhập sao kê ngân hàng (CSV/OFX) vào một ví.
+    File được đọc theo luồng từng dòng, chèn theo lô IMPORT_BATCH_SIZE dòng,
+    và số dư ví chỉ được cập nhật MỘT lần ở cuối bằng tổng biến động.
+    """
+    user_id = session['user_id']
+    upload = request.files.get('file')
+    wallet_id = request.form.get('wallet_id', type=int)
+
+    if not upload or not upload.filename:
+        return jsonify({'status': 'error', 'message': 'Chưa chọn file sao kê'}), 400
+
+    wallet = Wallet.query.filter_by(id=wallet_id, user_id=user_id, is_deleted=False).first()
+    if not wallet:
+        return jsonify({'status': 'error', 'message': 'Chưa chọn ví'}), 400
+
+    try:
+        rows = open_statement(upload, request.form.get('format'))
+        imported, skipped, errors = 0, 0, []
+        effects = TransactionEffects(user_id)
+        batch = []
+        now = datetime.now()
+
+        for line_no, row in rows:
+            if isinstance(row, StatementRowError):
+                skipped += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append(str(row))
+                continue
+
+            amount = row['amount']
+            trans_type = 'chi' if amount < 0 else 'thu'
+            batch.append({
+                'user_id': user_id,
+                'wallet_id': wallet.id,
+                'type': trans_type,
+                'amount': abs(amount),
+                'description': row['description'],
+                'date': row['date'],
+                'created_at': now,
+            })
+            effects.record(1, trans_type, abs(amount), wallet.id, trans_date=row['date'])
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                db.session.execute(insert(Transaction), batch)
+                imported += len(batch)
+                batch.clear()
+
+        if batch:
+            db.session.execute(insert(Transaction), batch)
+            imported += len(batch)
+
+        # Một câu UPDATE duy nhất cho cả file thay vì cộng dồn từng dòng
+        effects.flush()
+
+        db.session.commit()
+        return jsonify({
+            'status': 'success',
+            'message': f'Đã nhập {imported} giao dịch!',
+            'imported': imported,
+            'skipped': skipped,
+            'errors': errors
+        })
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -90,23 +288,18 @@ def update_transaction(trans_id):
         t = Transaction.query.filter_by(id=trans_id, user_id=user_id).first()
         if not t: return jsonify({'status': 'error', 'message': 'Không tìm thấy'}), 404
 
-        # Hoàn tiền cũ
-        old_wallet = Wallet.query.get(t.wallet_id)
-        old_dest = Wallet.query.get(t.dest_wallet_id) if t.dest_wallet_id else None
-
-        if t.type == 'chi': old_wallet.balance += t.amount
-        elif t.type == 'thu': old_wallet.balance -= t.amount
-        elif t.type == 'chuyen':
-            old_wallet.balance += t.amount
-            if old_dest: old_dest.balance -= t.amount
+        # Hoàn tiền cũ (ghi nhận trước khi sửa các trường của t)
+        effects = TransactionEffects(user_id)
+        effects.revert(t)
+        old_label = (t.description, t.category_id)
 
         # Cập nhật dữ liệu mới
         new_ui_type = data.get('type')
         t.type = {'expense': 'chi', 'income': 'thu', 'transfer': 'chuyen'}.get(new_ui_type, 'chi')
-        t.amount     = Decimal(data.get('amount'))
+        t.amount     = _parse_form_amount(data.get('amount'))
         
         t.description = data.get('description')
-        t.date = datetime.strptime(data.get('date'), '%Y-%m-%d')
+        t.date = _parse_form_date(data.get('date'))
         t.category_id = data.get('category_id')
         
         source_id = data.get('source_wallet_id')
@@ -114,42 +307,42 @@ def update_transaction(trans_id):
         t.wallet_id = dest_id if t.type == 'thu' else source_id
         t.dest_wallet_id = dest_id if t.type == 'chuyen' else None
 
-        # Trừ tiền mới
-        new_wallet = Wallet.query.get(t.wallet_id)
-        new_dest = Wallet.query.get(t.dest_wallet_id) if t.dest_wallet_id else None
-
-        if t.type == 'chi': new_wallet.balance -= t.amount
-        elif t.type == 'thu': new_wallet.balance += t.amount
-        elif t.type == 'chuyen':
-            new_wallet.balance -= t.amount
-            if new_dest: new_dest.balance += t.amount
+        # Trừ tiền mới: hoàn cũ + trừ mới gộp thành tối đa một UPDATE mỗi ví
+        effects.apply(t)
+        effects.flush()
 
         db.session.commit()
-        return jsonify({'status': 'success', 'message': 'Đã cập nhật!'})
+        new_label = (t.description, t.category_id)
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+    _relabel_after_commit(user_id, trans_id, old_label, new_label)
+    return jsonify({'status': 'success', 'message': 'Đã cập nhật!', 'alerts': effects.alerts})
+
 @transaction_bp.route('/api/transactions/<int:trans_id>', methods=['DELETE'])
 @api_login_required
 def delete_transaction(trans_id):
+    user_id = session['user_id']
     try:
-        t = Transaction.query.filter_by(id=trans_id, user_id=session['user_id']).first()
+        t = Transaction.query.filter_by(id=trans_id, user_id=user_id).first()
         if not t: return jsonify({'status': 'error'}), 404
         
         # Hoàn tiền
-        wallet = Wallet.query.get(t.wallet_id)
-        if t.type == 'chi': wallet.balance += t.amount
-        elif t.type == 'thu': wallet.balance -= t.amount
-        elif t.type == 'chuyen':
-            wallet.balance += t.amount
-            dest = Wallet.query.get(t.dest_wallet_id)
-            if dest: dest.balance -= t.amount
+        effects = TransactionEffects(user_id)
+        effects.revert(t)
+        effects.flush()
             
+        old_label = (t.description, t.category_id)
         db.session.delete(t)
         db.session.commit()
-        return jsonify({'status': 'success'})
     except Exception as e:
         db.session.rollback()
-        return jsonify({'status': 'error', 'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    _relabel_after_commit(user_id, trans_id, old_label)
+    return jsonify({'status': 'success'})
\ No newline at end of file
@@ -0,0 +1,152 @@
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# ==================================================
+# ĐỌC SAO KÊ NGÂN HÀNG (CSV / OFX) THEO LUỒNG
+# Mỗi hàm parse là một generator: đọc tới đâu trả ra tới đó,
+# không bao giờ giữ toàn bộ file trong bộ nhớ.
+# ==================================================
+
+class StatementRowError(ValueError):
+    """Một dòng sao kê không đọc được (sai ngày, sai số tiền...)"""
+    def __init__(self, line_no, message):
+        super().__init__(f"Dòng {line_no}: {message}")
+        self.line_no = line_no
+
+# Các tên cột được chấp nhận trong file CSV (so khớp không phân biệt hoa thường)
+CSV_COLUMNS = {
+    'date': ('date', 'ngay', 'ngày', 'ngay_giao_dich', 'ngày giao dịch', 'transaction date'),
+    'description': ('description', 'mo_ta', 'mô tả', 'noi_dung', 'nội dung', 'memo'),
+    'amount': ('amount', 'so_tien', 'số tiền'),
+    'debit': ('debit', 'ghi_no', 'ghi nợ', 'rut', 'chi'),
+    'credit': ('credit', 'ghi_co', 'ghi có', 'nap', 'thu'),
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d')
+
+def parse_amount(raw):
+    """
+    Đọc số tiền kiểu ngân hàng Việt Nam: '1.250.000', '1,250,000', '-45000', '1,250.50'.
+    Dấu phân cách cuối cùng chỉ được coi là dấu thập phân nếu phía sau có 1-2 chữ số.
+    """
+    text = (raw or '').strip().replace(' ', '').replace('\xa0', '')
+    if not text:
+        return None
+    negative = text.startswith('-') or (text.startswith('(') and text.endswith(')'))
+    text = text.strip('()+-').replace('đ', '').replace('VND', '')
+
+    last_sep = max(text.rfind('.'), text.rfind(','))
+    if last_sep != -1 and 1 <= len(text) - last_sep - 1 <= 2:
+        integer_part = re.sub(r'[.,]', '', text[:last_sep])
+        text = f"{integer_part}.{text[last_sep + 1:]}"
+    else:
+        text = re.sub(r'[.,]', '', text)
+
+    value = Decimal(text)
+    return -value if negative else value
+
+def parse_date(raw):
+    text = (raw or '').strip()[:10]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"ngày không hợp lệ '{raw}'")
+
+def _resolve_columns(header):
+    normalized = [h.strip().lower() for h in header]
+    mapping = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for idx, name in enumerate(normalized):
+            if name in aliases:
+                mapping[field] = idx
+                break
+    if 'date' not in mapping or not ('amount' in mapping or 'debit' in mapping or 'credit' in mapping):
+        raise StatementRowError(1, "file CSV cần có cột ngày và cột số tiền (hoặc ghi nợ/ghi có)")
+    return mapping
+
+def iter_csv_rows(text_stream):
+    """
+    Sinh ra từng dòng (line_no, {'date', 'amount', 'description'}) với amount có dấu:
+    âm = tiền ra, dương = tiền vào. Dòng lỗi được sinh ra dưới dạng StatementRowError.
+    """
+    sample = text_stream.readline()
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    header = next(csv.reader([sample], dialect))
+    columns = _resolve_columns(header)
+
+    for line_no, row in enumerate(csv.reader(text_stream, dialect), start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            cell = lambda field: row[columns[field]] if field in columns and columns[field] < len(row) else ''
+
+            if 'amount' in columns:
+                amount = parse_amount(cell('amount'))
+            else:
+                amount = (parse_amount(cell('credit')) or 0) - (parse_amount(cell('debit')) or 0)
+
+            if not amount:
+                raise ValueError("số tiền trống hoặc bằng 0")
+
+            yield line_no, {
+                'date': parse_date(cell('date')),
+                'amount': amount,
+                'description': cell('description').strip()[:255] or None,
+            }
+        except (ValueError, InvalidOperation) as e:
+            yield line_no, StatementRowError(line_no, str(e))
+
+# Tag OFX (SGML) có thể nằm mỗi tag một dòng hoặc dính liền trên một dòng
+_OFX_TAG = re.compile(r'<(/?)([A-Z0-9.]+)>([^<\r\n]*)')
+
+def iter_ofx_rows(text_stream):
+    """Đọc các khối <STMTTRN> của file OFX, trả về cùng định dạng với iter_csv_rows"""
+    current = None
+    start_line = 0
+
+    for line_no, line in enumerate(text_stream, start=1):
+        for closing, tag, value in _OFX_TAG.findall(line):
+            if tag == 'STMTTRN':
+                if not closing:
+                    current, start_line = {}, line_no
+                    continue
+                if current is None:
+                    continue
+                try:
+                    amount = parse_amount(current.get('TRNAMT'))
+                    if not amount:
+                        raise ValueError("số tiền trống hoặc bằng 0")
+                    description = current.get('MEMO') or current.get('NAME')
+                    yield start_line, {
+                        'date': datetime.strptime(current.get('DTPOSTED', '')[:8], '%Y%m%d').date(),
+                        'amount': amount,
+                        'description': description[:255] if description else None,
+                    }
+                except (ValueError, InvalidOperation) as e:
+                    yield start_line, StatementRowError(start_line, str(e))
+                current = None
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+def open_statement(file_storage, fmt=None):
+    """
+    Chọn parser theo định dạng (tham số 'format' hoặc đuôi file) và bọc luồng nhị phân
+    của file upload thành luồng văn bản, không đọc toàn bộ nội dung vào RAM.
+    """
+    filename = (file_storage.filename or '').lower()
+    fmt = (fmt or filename.rsplit('.', 1)[-1]).lower()
+
+    text_stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', errors='replace', newline='')
+    if fmt in ('ofx', 'qfx'):
+        return iter_ofx_rows(text_stream)
+    if fmt == 'csv':
+        return iter_csv_rows(text_stream)
+    raise ValueError("Chỉ hỗ trợ file sao kê định dạng CSV hoặc OFX")
@@ -1,3 +1,75 @@
+// Lịch sử hội thoại đã tải: userId -> { cursor: cursor tải tin cũ hơn, loaded: đã tải trang đầu chưa }
+const transcripts = {};
+
+function formatMessage(role, text, time) {
+    const wrapper = document.createElement('div');
+    wrapper.className = `chat-message message-${role}`;
+
+    const bubble = document.createElement('div');
+    bubble.className = 'message-bubble plain-text';
+    bubble.textContent = text || '';
+
+    const timeEl = document.createElement('div');
+    timeEl.className = 'message-time';
+    timeEl.textContent = time;
+
+    wrapper.append(bubble, timeEl);
+    return wrapper;
+}
+
+function getPane(userId) {
+    let pane = document.getElementById('chat-pane-' + userId);
+    if (!pane) {
+        pane = document.createElement('div');
+        pane.className = 'chat-content-pane';
+        pane.id = 'chat-pane-' + userId;
+        pane.style.display = 'none';
+
+        const olderBtn = document.createElement('button');
+        olderBtn.className = 'btn btn-secondary load-older-btn';
+        olderBtn.textContent = 'Xem tin nhắn cũ hơn';
+        olderBtn.style.display = 'none';
+        olderBtn.addEventListener('click', () => loadTranscript(userId));
+        pane.appendChild(olderBtn);
+
+        document.getElementById('chat-body-container').appendChild(pane);
+    }
+    return pane;
+}
+
+// Tải một trang lịch sử (mới nhất trước); các lần sau chèn tin cũ hơn lên đầu khung chat
+async function loadTranscript(userId) {
+    const state = transcripts[userId] || (transcripts[userId] = { cursor: null, loaded: false });
+    const pane = getPane(userId);
+    const olderBtn = pane.querySelector('.load-older-btn');
+    const container = document.getElementById('chat-body-container');
+
+    const params = state.cursor ? `?before=${encodeURIComponent(state.cursor)}` : '';
+    try {
+        const res = await fetch(`/api/admin/chatbot-logs/${userId}${params}`);
+        const result = await res.json();
+        if (!res.ok) { alert('Lỗi: ' + result.message); return; }
+
+        const fragment = document.createDocumentFragment();
+        result.data.forEach(log => {
+            fragment.appendChild(formatMessage('user', log.question, log.time));
+            fragment.appendChild(formatMessage('bot', log.answer, log.time));
+        });
+
+        // Giữ nguyên vị trí đang đọc khi chèn tin cũ lên trên
+        const previousHeight = container.scrollHeight;
+        olderBtn.after(fragment);
+        container.scrollTop = state.loaded ? container.scrollHeight - previousHeight : container.scrollHeight;
+
+        state.cursor = result.next_cursor;
+        state.loaded = true;
+        olderBtn.style.display = state.cursor ? 'block' : 'none';
+    } catch (e) {
+        console.error(e);
+        alert('Lỗi kết nối đến máy chủ.');
+    }
+}
+
 // Hàm chuyển đổi khung chat khi click vào danh sách bên trái
 function switchChat(userId, userName) {
     // 1. Đổi tiêu đề Header
@@ -14,13 +86,68 @@ function switchChat(userId, userName) {
     const allItems = document.querySelectorAll('.conversation-item');
     allItems.forEach(item => item.classList.remove('active'));
 
-    // 5. Hiển thị khung chat được chọn và set active
-    document.getElementById('chat-pane-' + userId).style.display = 'block';
+    // 5. Hiển thị khung chat được chọn và set active (lần đầu thì tải lịch sử)
+    getPane(userId).style.display = 'block';
     document.getElementById('nav-user-' + userId).classList.add('active');
 
-    // 6. Cuộn xuống cuối cùng của khung chat
-    const chatContainer = document.getElementById('chat-body-container');
-    chatContainer.scrollTop = chatContainer.scrollHeight;
+    if (!transcripts[userId]) {
+        loadTranscript(userId);
+    } else {
+        // 6. Cuộn xuống cuối cùng của khung chat
+        const chatContainer = document.getElementById('chat-body-container');
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    }
+}
+
+function renderConversationItem(convo) {
+    const li = document.createElement('li');
+    li.className = 'conversation-item';
+    li.id = 'nav-user-' + convo.user_id;
+    li.dataset.userId = convo.user_id;
+    li.dataset.userName = convo.user_name;
+
+    const user = document.createElement('div');
+    user.className = 'convo-user';
+    user.textContent = convo.user_name + ' ';
+    const meta = document.createElement('span');
+    meta.style.cssText = 'font-size: 0.75rem; color: #999; font-weight: normal;';
+    meta.textContent = `(ID: ${convo.user_id} · ${convo.message_count} tin)`;
+    user.appendChild(meta);
+
+    const snippet = document.createElement('div');
+    snippet.className = 'convo-snippet';
+    snippet.textContent = 'User: ' + convo.snippet;
+
+    const time = document.createElement('div');
+    time.className = 'convo-time';
+    time.textContent = convo.latest_time;
+
+    li.append(user, snippet, time);
+    return li;
+}
+
+// Tải trang kế tiếp của danh sách hội thoại (keyset cursor do server trả về)
+async function loadMoreConversations() {
+    const button = document.getElementById('load-more-conversations');
+    const cursor = button.dataset.cursor;
+    if (!cursor) return;
+
+    button.disabled = true;
+    try {
+        const res = await fetch(`/api/admin/chatbot-logs?cursor=${encodeURIComponent(cursor)}`);
+        const result = await res.json();
+        if (!res.ok) { alert('Lỗi: ' + result.message); return; }
+
+        const list = document.getElementById('conversation-items');
+        result.data.forEach(convo => list.appendChild(renderConversationItem(convo)));
+        button.dataset.cursor = result.next_cursor || '';
+        button.style.display = result.next_cursor ? '' : 'none';
+    } catch (e) {
+        console.error(e);
+        alert('Lỗi kết nối đến máy chủ.');
+    } finally {
+        button.disabled = false;
+    }
 }
 
 // Hàm gọi API xóa Log cũ
@@ -47,6 +174,14 @@ async function cleanupLogs() {
 
 // Auto-click vào người dùng đầu tiên (nếu có) khi load trang
 document.addEventListener("DOMContentLoaded", function() {
+    document.getElementById('conversation-items').addEventListener('click', function(event) {
+        const item = event.target.closest('.conversation-item');
+        if (item) switchChat(item.dataset.userId, item.dataset.userName);
+    });
+
+    const loadMore = document.getElementById('load-more-conversations');
+    if (loadMore) loadMore.addEventListener('click', loadMoreConversations);
+
     const firstUser = document.querySelector('.conversation-item');
     if (firstUser) {
         firstUser.click();
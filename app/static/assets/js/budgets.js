@@ -168,10 +168,12 @@ document.addEventListener("DOMContentLoaded", function() {
             });
 
             if (res.ok) {
+                const result = await res.json();
                 modal.style.display = 'none';
                 document.getElementById('budgetForm').reset();
                 loadBudgets(); // Tải lại giao diện sau khi thêm thành công
                 alert(isEdit ? "Cập nhật ngân sách thành công!" : "Tạo ngân sách thành công!");
+                showBudgetAlerts(result.alerts); // Hạn mức mới có thể đã vượt mốc 50/80/100%
             } else {
                 const errData = await res.json();
                 alert(`Lỗi: ${errData.message || "Không thể tạo ngân sách."}`);
@@ -198,6 +200,18 @@ document.addEventListener("DOMContentLoaded", function() {
         }
     }
 
+    // Cảnh báo chưa đọc (người dùng tắt thông báo tức thời, hoặc chưa kịp xác nhận)
+    async function pollBudgetAlerts() {
+        try {
+            const res = await fetch('/api/budgets/alerts');
+            if (res.ok) showBudgetAlerts(await res.json());
+        } catch (error) {
+            console.error("Lỗi khi tải cảnh báo ngân sách:", error);
+        }
+    }
+
     // Khởi chạy việc tải ngân sách khi load trang
     loadBudgets();
+    pollBudgetAlerts();
+    setInterval(pollBudgetAlerts, 60000);
 });
\ No newline at end of file
@@ -8,14 +8,36 @@ let myLineChart = null;
 // ============================================================
 // 1. HÀM TẢI DỮ LIỆU TỪ BACKEND (API)
 // ============================================================
+function buildRangeQuery() {
+    // Khoảng thời gian: mốc có sẵn hoặc từ ngày - đến ngày tùy chọn
+    const timeRange = document.getElementById('timeFilter').value;
+    const params = new URLSearchParams({ wallet_id: document.getElementById('walletFilter').value });
+
+    if (timeRange === 'custom') {
+        params.set('start', document.getElementById('startFilter').value);
+        params.set('end', document.getElementById('endFilter').value);
+    } else {
+        params.set('time_range', timeRange);
+    }
+    return params;
+}
+
 async function loadReportData() {
     const timeRange = document.getElementById('timeFilter').value;
-    const walletId = document.getElementById('walletFilter').value;
-    const type = document.getElementById('typeFilter').value;
+    document.querySelectorAll('.custom-range').forEach(el => {
+        el.style.display = timeRange === 'custom' ? '' : 'none';
+    });
+    // Chưa chọn đủ 2 ngày thì chưa gọi API
+    if (timeRange === 'custom' && (!document.getElementById('startFilter').value || !document.getElementById('endFilter').value)) return;
+
+    const params = buildRangeQuery();
+    params.set('type', document.getElementById('typeFilter').value);
+    const granularity = document.getElementById('granularityFilter').value;
+    if (granularity) params.set('granularity', granularity);
 
     try {
         // Gọi API backend
-        const url = `/api/reports/data?time_range=${timeRange}&wallet_id=${walletId}&type=${type}`;
+        const url = `/api/reports/data?${params.toString()}`;
         const response = await fetch(url);
         
         if (!response.ok) {
@@ -209,11 +231,8 @@ function renderTopSpendingTable(items) {
 
 // Hàm Xuất File (Excel/PDF)
 function exportFile(type) {
-    const timeRange = document.getElementById('timeFilter').value;
-    const walletId = document.getElementById('walletFilter').value;
-    
     // Mở tab mới để trình duyệt download/view file từ API backend
-    const url = `/api/reports/export/${type}?time_range=${timeRange}&wallet_id=${walletId}`;
+    const url = `/api/reports/export/${type}?${buildRangeQuery().toString()}`;
     
     if (type === 'pdf') {
         window.open(url, '_blank'); // PDF mở tab mới để in
@@ -255,4 +274,7 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('timeFilter').addEventListener('change', loadReportData);
     document.getElementById('walletFilter').addEventListener('change', loadReportData);
     document.getElementById('typeFilter').addEventListener('change', loadReportData);
+    ['startFilter', 'endFilter', 'granularityFilter'].forEach(id => {
+        document.getElementById(id).addEventListener('change', loadReportData);
+    });
 });
\ No newline at end of file
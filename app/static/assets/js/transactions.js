@@ -3,7 +3,9 @@
 // --- BIẾN TOÀN CỤC ---
 let allCategories = [];
 let currentTransactions = [];
+let nextCursor = null; // Con trỏ trang kế tiếp (server trả về qua header X-Next-Cursor)
 let lastDescription = ''; // Biến mới: Lưu lại câu mô tả cũ để AI không đoán lại nhiều lần
+let lastPrediction = null; // Dự đoán AI gần nhất, gửi kèm khi lưu để server so với danh mục người dùng chọn
 
 // ==============================================
 // 1. QUẢN LÝ TAB & DANH MỤC
@@ -117,11 +119,27 @@ async function loadWallets() {
 // 3. DANH SÁCH & LỌC GIAO DỊCH (ĐÃ TỐI ƯU HỢP NHẤT)
 // ==============================================
 
-async function loadTransactions() {
+function buildTransactionQuery(cursor) {
+    // Lọc theo ngày/loại được đẩy xuống server, chỉ tải từng trang một
+    const params = new URLSearchParams();
+    const dateStart = document.getElementById('filter-date-start').value;
+    const dateEnd = document.getElementById('filter-date-end').value;
+    const type = document.getElementById('filter-type').value;
+
+    if (dateStart) params.set('start_date', dateStart);
+    if (dateEnd) params.set('end_date', dateEnd);
+    if (type) params.set('type', type);
+    if (cursor) params.set('cursor', cursor);
+    return params.toString();
+}
+
+async function loadTransactions(append = false) {
     try {
-        const response = await fetch('/api/transactions');
-        currentTransactions = await response.json(); 
-        renderList(currentTransactions); // Gọi hàm render duy nhất
+        const response = await fetch(`/api/transactions?${buildTransactionQuery(append ? nextCursor : null)}`);
+        const page = await response.json();
+        nextCursor = response.headers.get('X-Next-Cursor');
+        currentTransactions = append ? currentTransactions.concat(page) : page;
+        filterTransactions(); // Áp dụng từ khóa tìm kiếm rồi render
     } catch (error) {
         console.error('Lỗi tải giao dịch:', error);
     }
@@ -172,28 +190,34 @@ function renderList(data) {
         `;
         listContainer.appendChild(li);
     });
+
+    if (nextCursor) {
+        const more = document.createElement('li');
+        more.style.cssText = 'text-align:center; padding: 15px; list-style: none;';
+        more.innerHTML = '<button class="btn btn-secondary" onclick="loadTransactions(true)">Xem thêm</button>';
+        listContainer.appendChild(more);
+    }
 }
 
 function filterTransactions() {
     const keyword = document.getElementById('search-keyword').value.toLowerCase();
-    const dateStart = document.getElementById('filter-date-start').value;
-    const dateEnd = document.getElementById('filter-date-end').value;
-    const type = document.getElementById('filter-type').value;
-
-    const filteredData = currentTransactions.filter(t => {
-        const matchKeyword = (t.description && t.description.toLowerCase().includes(keyword)) || 
-                             (t.category_name && t.category_name.toLowerCase().includes(keyword));
-        const matchType = type === "" || t.type === type;
-        let matchDate = true;
-        if (dateStart && t.date < dateStart) matchDate = false;
-        if (dateEnd && t.date > dateEnd) matchDate = false;
 
-        return matchKeyword && matchType && matchDate;
-    });
+    const filteredData = currentTransactions.filter(t => 
+        (t.description && t.description.toLowerCase().includes(keyword)) || 
+        (t.category_name && t.category_name.toLowerCase().includes(keyword))
+    );
 
     renderList(filteredData);
 }
 
+function resetFilters() {
+    ['search-keyword', 'filter-date-start', 'filter-date-end', 'filter-type'].forEach(id => {
+        const el = document.getElementById(id);
+        if (el) el.value = '';
+    });
+    loadTransactions();
+}
+
 // ==============================================
 // 4. THÊM / SỬA / XÓA (CRUD)
 // ==============================================
@@ -214,6 +238,10 @@ async function handleAddTransaction(event) {
         source_wallet_id: document.getElementById('source-wallet').value,
         dest_wallet_id: document.getElementById('dest-wallet').value
     };
+    if (!isEdit && lastPrediction && lastPrediction.description === data.description.trim()) {
+        data.ai_category_id = lastPrediction.category_id;
+        data.ai_confidence = lastPrediction.confidence;
+    }
 
     try {
         const response = await fetch(url, {
@@ -228,6 +256,7 @@ async function handleAddTransaction(event) {
             loadTransactions();
             loadWallets(); 
             sessionStorage.removeItem('finai_dashboard_insights');
+            showBudgetAlerts(result.alerts); // base.html: hiển thị + xác nhận đã đọc
         } else { alert('Lỗi: ' + result.message); }
     } catch (error) { console.error('Lỗi kết nối:', error); }
 }
@@ -289,6 +318,7 @@ function cancelEdit() {
     document.getElementById('transaction-form').reset();
     document.getElementById('edit-transaction-id').value = '';
     lastDescription = ''; // Reset biến AI
+    lastPrediction = null;
     
     const btnSave = document.getElementById('btn-save');
     if(btnSave) {
@@ -330,7 +360,9 @@ async function handleAIPrediction() {
         
         const data = await response.json();
         
+        lastPrediction = null;
         if (data.status === 'success') {
+            lastPrediction = { description: text, category_id: data.category_id, confidence: data.confidence };
             const catSelect = document.getElementById('category');
             const typeMap = { 'thu': 'income', 'chi': 'expense' };
             const predictedTab = typeMap[data.category_type]; 
@@ -381,10 +413,13 @@ document.addEventListener('DOMContentLoaded', function() {
     if (descInput) descInput.addEventListener('blur', handleAIPrediction);
 
     // Sự kiện tìm kiếm / Lọc
-    const searchInputs = ['search-keyword', 'filter-date-start', 'filter-date-end', 'filter-type'];
-    searchInputs.forEach(id => {
+    const keywordInput = document.getElementById('search-keyword');
+    if (keywordInput) keywordInput.addEventListener('keyup', filterTransactions);
+
+    const serverFilters = ['filter-date-start', 'filter-date-end', 'filter-type'];
+    serverFilters.forEach(id => {
         const el = document.getElementById(id);
-        if (el) el.addEventListener(id === 'search-keyword' ? 'keyup' : 'change', filterTransactions);
+        if (el) el.addEventListener('change', () => loadTransactions());
     });
 
     // Tải dữ liệu ban đầu
@@ -1,6 +1,8 @@
 import os
 from app import app, db
+from app.bookkeeping import open_wallet
 from app.models import User, Wallet
+from app.migrations import upgrade
 
 # Cấu hình Admin (ưu tiên lấy từ biến môi trường, fallback cho môi trường dev)
 ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@finance.com")
@@ -10,7 +12,7 @@ ADMIN_NAME = os.environ.get("ADMIN_NAME", "Quản Trị Viên Hệ Thống")
 def create_admin():
     # Cần chạy trong Application Context của Flask để truy cập được DB
     with app.app_context():
-        db.create_all()
+        upgrade(db.engine)
         # 1. Kiểm tra xem admin đã tồn tại chưa
         existing_user = User.query.filter_by(email=ADMIN_EMAIL).first()
         if existing_user:
@@ -39,6 +41,8 @@ def create_admin():
                 balance=999999999
             )
             db.session.add(wallet)
+            db.session.flush()
+            open_wallet(wallet)
 
             # Lưu tất cả
             db.session.commit()
@@ -0,0 +1,30 @@
+import argparse
+
+from app import app, db
+from app.migrations import discover, applied_versions, upgrade
+
+# ==================================================
+# CẬP NHẬT CẤU TRÚC DATABASE
+# Chạy trước khi khởi động (hoặc sau mỗi lần cập nhật mã nguồn):
+#   python migrate.py           -> áp dụng các migration còn thiếu
+#   python migrate.py --status  -> xem migration nào đã / chưa chạy
+# ==================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Áp dụng migration cho database")
+    parser.add_argument('--status', action='store_true', help="Chỉ liệt kê trạng thái, không chạy")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.status:
+            applied = applied_versions(db.engine)
+            for migration in discover():
+                mark = 'x' if migration.version in applied else ' '
+                print(f"[{mark}] {migration.version:04d}_{migration.name}")
+            return
+
+        done = upgrade(db.engine)
+        print(f"Đã áp dụng {len(done)} migration." if done else "Database đã ở phiên bản mới nhất.")
+
+if __name__ == "__main__":
+    main()
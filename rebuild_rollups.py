@@ -0,0 +1,24 @@
+import argparse
+from app import app
+from app.bookkeeping import rebuild_rollups
+from app.budget_engine import rebuild_budget_progress
+
+# Dựng lại bảng tổng hợp giao dịch theo ngày (giaodich_tonghop_ngay) từ giaodich,
+# sau đó tính lại tiến độ ngân sách (ngansach_tiendo) từ bảng tổng hợp mới
+#   python rebuild_rollups.py              -> dựng lại cho toàn bộ người dùng
+#   python rebuild_rollups.py --user 5     -> chỉ dựng lại cho người dùng có id 5
+
+def main():
+    parser = argparse.ArgumentParser(description="Dựng lại bảng tổng hợp giao dịch theo ngày")
+    parser.add_argument('--user', type=int, help="Chỉ dựng lại cho một người dùng")
+    args = parser.parse_args()
+
+    with app.app_context():
+        rows = rebuild_rollups(user_id=args.user)
+        budgets = rebuild_budget_progress(user_id=args.user)
+
+    print(f"Đã dựng lại bảng tổng hợp: {rows} dòng.")
+    print(f"Đã tính lại tiến độ cho {budgets} ngân sách.")
+
+if __name__ == "__main__":
+    main()
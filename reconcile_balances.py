@@ -0,0 +1,36 @@
+import argparse
+from app import app
+from app.bookkeeping import reconcile_balances
+
+# Đối soát số dư ví với nhật ký số dư + lịch sử giao dịch
+#   python reconcile_balances.py              -> chỉ báo cáo các ví bị lệch
+#   python reconcile_balances.py --repair     -> sửa SoDu về số dư kỳ vọng
+#   python reconcile_balances.py --baseline   -> chấp nhận số dư hiện tại của các ví cũ chưa có nhật ký
+
+def main():
+    parser = argparse.ArgumentParser(description="Đối soát số dư ví (nguontien) với giaodich và nhật ký số dư")
+    parser.add_argument('--repair', action='store_true', help="Ghi đè SoDu bằng số dư kỳ vọng cho các ví bị lệch")
+    parser.add_argument('--baseline', action='store_true', help="Ghi mốc nhật ký cho các ví tạo trước khi có nhật ký")
+    args = parser.parse_args()
+
+    with app.app_context():
+        drifts = reconcile_balances(repair=args.repair, baseline=args.baseline)
+
+    if not drifts:
+        print("Tất cả số dư ví đều khớp với sổ sách.")
+        return
+
+    print("=" * 70)
+    print(f"{'Ví':>8} {'Người dùng':>10} {'Số dư lưu':>18} {'Kỳ vọng':>18} {'Lệch':>12}")
+    for d in drifts:
+        print(f"{d['wallet_id']:>8} {d['user_id']:>10} {d['balance']:>18,.2f} {d['expected']:>18,.2f} {d['drift']:>12,.2f}"
+              + ("  (chưa có nhật ký)" if d['ledger_entries'] == 0 else ""))
+    print("=" * 70)
+    print(f"Có {len(drifts)} ví bị lệch.")
+    if args.baseline:
+        print("Đã ghi mốc nhật ký cho các ví chưa có nhật ký.")
+    if args.repair:
+        print("Đã sửa số dư các ví còn lại về số dư kỳ vọng.")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 # run.py
-from app import app
+from app import app, db
+from app.migrations import upgrade
 
 if __name__ == "__main__":
+    # Môi trường dev: áp dụng migration còn thiếu trước khi chạy (production chạy migrate.py riêng)
+    with app.app_context():
+        upgrade(db.engine)
+
     # Chạy ứng dụng
     app.run(debug=True)
\ No newline at end of file
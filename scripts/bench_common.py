@@ -0,0 +1,100 @@
+"""
+Hàm dùng chung cho các script đo hiệu năng scripts/bench_*.py.
+
+Mỗi script dựng app trên một file SQLite tạm (không đụng instance/), sinh dữ liệu giả
+theo số lượng truyền vào rồi in kết quả trước/sau. Chạy từ thư mục gốc của repo:
+    python scripts/bench_report.py --transactions 50000
+"""
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from datetime import date, timedelta
+
+# Cho phép chạy trực tiếp `python scripts/bench_x.py` (thư mục gốc repo chứa package app)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from sqlalchemy import insert, event
+
+from config import Config
+
+def make_app(**overrides):
+    """create_app() trên file SQLite tạm, đã chạy migration. overrides ghi đè cấu hình"""
+    from app import create_app, db
+    from app.migrations import upgrade
+
+    path = os.path.join(tempfile.mkdtemp(prefix='finai-bench-'), 'bench.db')
+    settings = dict(SQLALCHEMY_DATABASE_URI='sqlite:///' + path, INSIGHTS_PREWARM=False, METRICS_ENABLED=False)
+    settings.update(overrides)
+    config_class = type('BenchConfig', (Config,), settings)
+
+    flask_app = create_app(config_class)
+    with flask_app.app_context(), redirect_stdout(io.StringIO()): # bỏ log "Đã áp dụng migration ..."
+        upgrade(db.engine)
+    return flask_app
+
+def seed(flask_app, transactions, days=365, categories=12, wallets=3, seed_value=42):
+    """Một người dùng với `transactions` giao dịch rải trong `days` ngày gần nhất. Trả về user_id"""
+    from app import db
+    from app.bookkeeping import rebuild_rollups
+    from app.models import User, Wallet, Category, Transaction
+
+    rng = random.Random(seed_value)
+    with flask_app.app_context():
+        user = User(name='Bench', email=f'bench{rng.random()}@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        wallet_objs = [Wallet(user_id=user.id, name=f'Ví {i}', balance=0) for i in range(wallets)]
+        category_objs = [Category(user_id=user.id, name=f'Danh mục {i}', type='chi' if i % 4 else 'thu')
+                         for i in range(categories)]
+        db.session.add_all(wallet_objs + category_objs)
+        db.session.flush()
+
+        today = date.today()
+        rows = []
+        for _ in range(transactions):
+            category = rng.choice(category_objs)
+            rows.append({
+                'MaNguoiDung': user.id,
+                'MaNguonTien': rng.choice(wallet_objs).id,
+                'MaDanhMuc': category.id,
+                'LoaiGiaoDich': category.type,
+                'SoTien': rng.randint(10, 2000) * 1000,
+                'MoTa': f'giao dịch {rng.randint(1, 500)}',
+                'NgayGiaoDich': today - timedelta(days=rng.randrange(days)),
+            })
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(Transaction.__table__), rows[start:start + 5000])
+        db.session.commit()
+        rebuild_rollups(user.id)
+        return user.id
+
+def measure(fn, repeat=5, number=1):
+    """Thời gian tốt nhất (ms) của `number` lần gọi fn, lấy min trên `repeat` lượt"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) * 1000 / number)
+    return best
+
+@contextmanager
+def count_statements(engine):
+    """with count_statements(engine) as counter: ... -> counter['count'] câu SQL đã chạy"""
+    counter = {'count': 0}
+
+    def on_execute(*args):
+        counter['count'] += 1
+
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
@@ -0,0 +1,77 @@
+"""
+Đo chi phí nạp người dùng hiện tại cho mỗi request trang HTML:
+- cũ: context processor gọi User.query.get() mỗi lần render (template đọc user.settings =>
+  thêm một truy vấn lazy), trang /settings nạp lại người dùng lần nữa
+- mới, cache trượt: get_current_user() một truy vấn kèm settings, nhớ trên flask.g
+- mới, cache trúng: hồ sơ rút gọn lấy từ profile_cache, không chạm DB
+
+    python scripts/bench_current_user.py --requests 500
+"""
+import argparse
+
+from bench_common import make_app, seed, measure, count_statements
+
+from flask import render_template, session
+
+from app import db
+from app.current_user import profile_cache
+from app.models import User, UserSetting
+
+PAGES = ('/transactions', '/reports', '/settings')
+
+def legacy_inject_user():
+    if 'user_id' in session:
+        return dict(user=db.session.get(User, session['user_id']))
+    return dict(user=None)
+
+def legacy_settings():
+    current_user = db.session.get(User, session['user_id'])
+    return render_template('user/settings.html', user=current_user)
+
+def use_legacy_user_loading(flask_app):
+    """Thay context processor và view /settings bằng phiên bản trước khi có app.current_user"""
+    processors = flask_app.template_context_processors[None]
+    processors[:] = [legacy_inject_user if p.__name__ == 'inject_user' else p for p in processors]
+    flask_app.view_functions['settings.settings'] = legacy_settings
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo số truy vấn / thời gian nạp người dùng mỗi request")
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    flask_app = make_app()
+    user_id = seed(flask_app, transactions=0)
+    with flask_app.app_context():
+        db.session.add(UserSetting(user_id=user_id))
+        db.session.commit()
+        engine = db.engine
+
+    client = flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_role'] = 'user'
+
+    def run(page, clear_cache):
+        def request_once():
+            if clear_cache:
+                profile_cache.clear()
+            assert client.get(page).status_code == 200
+        with count_statements(engine) as sql:
+            request_once()
+        return measure(request_once, repeat=3, number=args.requests // 3 or 1), sql['count']
+
+    results = {page: {} for page in PAGES}
+    for page in PAGES:
+        results[page]['miss'] = run(page, clear_cache=True)
+        results[page]['hit'] = run(page, clear_cache=False)
+    use_legacy_user_loading(flask_app)
+    for page in PAGES:
+        results[page]['legacy'] = run(page, clear_cache=True)
+
+    print(f"{'Trang':<14} {'cũ':>18} {'mới, cache trượt':>18} {'mới, cache trúng':>18}")
+    for page in PAGES:
+        cells = [f"{results[page][k][0]:6.2f} ms /{results[page][k][1]:2d} SQL" for k in ('legacy', 'miss', 'hit')]
+        print(f"{page:<14} " + ' '.join(f"{c:>18}" for c in cells))
+
+if __name__ == '__main__':
+    main()
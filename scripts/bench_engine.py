@@ -0,0 +1,84 @@
+"""
+Đo thông lượng ghi/đọc song song trên SQLite với PRAGMA mặc định của SQLite
+(journal_mode=DELETE, synchronous=FULL, không mmap, cache 2 MB) so với cấu hình
+hiện tại trong config.py (WAL, synchronous=NORMAL, mmap, cache 64 MB).
+Mỗi cấu hình dùng DB riêng; mỗi "worker" là một tiến trình riêng (như gunicorn),
+vài worker thêm giao dịch qua API, vài worker đọc danh sách giao dịch.
+
+    python scripts/bench_engine.py --seconds 5 --writers 4 --readers 4
+"""
+import argparse
+import multiprocessing
+import time
+
+from bench_common import make_app, seed
+
+from config import Config
+
+PROFILES = {
+    'mặc định SQLite': dict(SQLITE_JOURNAL_MODE='DELETE', SQLITE_SYNCHRONOUS='FULL',
+                            SQLITE_MMAP_SIZE=0, SQLITE_CACHE_SIZE=-2000),
+    'config.py': dict(SQLITE_JOURNAL_MODE=Config.SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS=Config.SQLITE_SYNCHRONOUS,
+                      SQLITE_MMAP_SIZE=Config.SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE=Config.SQLITE_CACHE_SIZE),
+}
+
+def run_profile(overrides, seconds, writers, readers, transactions):
+    flask_app = make_app(**overrides)
+    user_id = seed(flask_app, transactions)
+    with flask_app.app_context():
+        from app.models import Wallet
+        wallet_id = Wallet.query.filter_by(user_id=user_id).first().id
+
+    def worker(kind, deadline, results):
+        # Tiến trình con (fork) không được dùng lại kết nối của tiến trình cha
+        with flask_app.app_context():
+            from app import db
+            db.engine.dispose(close=False)
+        client = flask_app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        payload = {'type': 'expense', 'amount': 1000, 'source_wallet_id': wallet_id, 'description': 'bench'}
+        done = errors = 0
+        while time.monotonic() < deadline:
+            if kind == 'write':
+                response = client.post('/api/transactions', json=payload)
+            else:
+                response = client.get('/api/transactions?limit=50')
+            if response.status_code == 200:
+                done += 1
+            else:
+                errors += 1
+        results.put((kind, done, errors))
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.monotonic() + seconds
+    processes = [context.Process(target=worker, args=('write', deadline, results)) for _ in range(writers)]
+    processes += [context.Process(target=worker, args=('read', deadline, results)) for _ in range(readers)]
+    for process in processes:
+        process.start()
+    counts = {'write': 0, 'read': 0, 'error': 0}
+    for _ in processes:
+        kind, done, errors = results.get()
+        counts[kind] += done
+        counts['error'] += errors
+    for process in processes:
+        process.join()
+    return {kind: count / seconds for kind, count in counts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="So thông lượng SQLite với PRAGMA mặc định và PRAGMA đã tinh chỉnh")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=4, help="Số tiến trình ghi")
+    parser.add_argument('--readers', type=int, default=4, help="Số tiến trình đọc")
+    parser.add_argument('--transactions', type=int, default=20000, help="Số giao dịch có sẵn trước khi đo")
+    args = parser.parse_args()
+
+    print(f"{args.writers} tiến trình ghi + {args.readers} tiến trình đọc, {args.seconds:g} giây mỗi cấu hình")
+    print(f"{'PRAGMA':<16} {'ghi/giây':>10} {'đọc/giây':>10} {'lỗi/giây':>10}")
+    for name, overrides in PROFILES.items():
+        result = run_profile(overrides, args.seconds, args.writers, args.readers, args.transactions)
+        print(f"{name:<16} {result['write']:>10.0f} {result['read']:>10.0f} {result['error']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
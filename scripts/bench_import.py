@@ -0,0 +1,54 @@
+"""
+Đo thời gian khởi động nguội (import + create_app) và bộ nhớ của một worker mới:
+- trước: google-genai và openpyxl được import ngay khi nạp ứng dụng (như trước khi có create_app)
+- sau:   chỉ import app rồi create_app(); thư viện nặng nạp khi request đầu tiên cần
+
+Mỗi lượt chạy trong một tiến trình Python mới để không dính cache import.
+
+    python scripts/bench_import.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from bench_common import ROOT_DIR
+
+CHILD = '''
+import json, resource, time
+started = time.perf_counter()
+{eager}import app
+app.create_app()
+print(json.dumps({{"ms": (time.perf_counter() - started) * 1000,
+                  "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+'''
+
+VARIANTS = {
+    'trước (nạp sẵn)': 'from google import genai\nfrom google.genai import types\nimport openpyxl\n',
+    'sau (create_app)': '',
+}
+
+def run_child(eager):
+    env = dict(os.environ, INSIGHTS_PREWARM='0')
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(eager=eager)],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian import nguội và RSS của worker")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'Cách nạp':<18} {'trung vị (ms)':>14} {'nhanh nhất (ms)':>16} {'RSS (MB)':>9}")
+    for name, eager in VARIANTS.items():
+        samples = [run_child(eager) for _ in range(args.runs)]
+        times = [s['ms'] for s in samples]
+        rss = statistics.median(s['rss_mb'] for s in samples)
+        print(f"{name:<18} {statistics.median(times):>14.0f} {min(times):>16.0f} {rss:>9.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Đo chi phí của bộ đo hiệu năng (app/metrics.py) trên vài API đọc thường dùng:
+cùng dữ liệu, một app METRICS_ENABLED=False và một app METRICS_ENABLED=True.
+Chênh lệch mỗi request là giá của before/after_request + hai perf_counter() mỗi câu SQL.
+
+    python scripts/bench_metrics.py --transactions 5000 --requests 500
+"""
+import argparse
+
+from bench_common import make_app, seed, measure
+
+PAGES = ('/api/transactions', '/api/wallets', '/api/reports/data?range=this_month')
+
+def make_client(metrics_enabled, transactions):
+    flask_app = make_app(METRICS_ENABLED=metrics_enabled)
+    user_id = seed(flask_app, transactions=transactions)
+    client = flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_role'] = 'user'
+    return client
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo độ trễ API khi bật / tắt METRICS_ENABLED")
+    parser.add_argument('--transactions', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    clients = {enabled: make_client(enabled, args.transactions) for enabled in (False, True)}
+    for client in clients.values():  # làm nóng: import lười, cache template, kết nối
+        for page in PAGES:
+            assert client.get(page).status_code == 200
+
+    print(f"{'API':<36} {'tắt (ms)':>9} {'bật (ms)':>9} {'chênh (ms)':>11}")
+    number = args.requests // 10 or 1
+    for page in PAGES:
+        # Xen kẽ hai app theo từng lượt để nhiễu của máy chia đều cho cả hai
+        best = {False: float('inf'), True: float('inf')}
+        for _ in range(10):
+            for enabled, client in clients.items():
+                best[enabled] = min(best[enabled], measure(lambda: client.get(page), repeat=1, number=number))
+        off, on = best[False], best[True]
+        print(f"{page:<36} {off:>9.3f} {on:>9.3f} {on - off:>+11.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Đo API báo cáo: cách cũ (nạp mọi giao dịch trong kỳ lên Python để gom biểu đồ đường,
+bốn truy vấn riêng) so với build_report_payload hiện tại (gom theo ngày/tuần/tháng/quý
+bằng SQL trên bảng tổng hợp). Không dùng cache báo cáo.
+
+    python scripts/bench_report.py --transactions 50000
+"""
+import argparse
+
+from bench_common import make_app, seed, measure, count_statements
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Transaction, Category, DailyRollup
+from app.routes.report import build_report_payload, get_date_range, resolve_granularity
+
+def legacy_report_payload(user_id, time_range, start_date, end_date, wallet_id, db_type):
+    """build_report_payload trước khi gom biểu đồ đường bằng SQL (chép lại để so sánh)"""
+    query = db.session.query(Transaction).filter(
+        Transaction.user_id == user_id, Transaction.date >= start_date, Transaction.date <= end_date)
+    rollup = db.session.query(DailyRollup).filter(
+        DailyRollup.user_id == user_id, DailyRollup.date >= start_date, DailyRollup.date <= end_date)
+    if wallet_id != 'all' and wallet_id:
+        query = query.filter(Transaction.wallet_id == wallet_id)
+        rollup = rollup.filter(DailyRollup.wallet_id == wallet_id)
+
+    category_stats = rollup.filter(DailyRollup.type == db_type)\
+        .with_entities(Category.name, func.sum(DailyRollup.total))\
+        .outerjoin(Category, DailyRollup.category_id == Category.id).group_by(Category.name).all()
+    type_stats = rollup.with_entities(DailyRollup.type, func.sum(DailyRollup.total)).group_by(DailyRollup.type).all()
+
+    line = {}
+    for t in query.filter(Transaction.type == db_type).order_by(Transaction.date).all():
+        key = t.date.month if time_range == 'year' else t.date.strftime('%d/%m')
+        line[key] = line.get(key, 0) + float(t.amount)
+
+    top = rollup.filter(DailyRollup.type == 'chi')\
+        .with_entities(Category.name, func.sum(DailyRollup.total))\
+        .outerjoin(Category, DailyRollup.category_id == Category.id)\
+        .group_by(Category.name).order_by(func.sum(DailyRollup.total).desc()).all()
+    return category_stats, type_stats, line, top
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian dựng payload báo cáo trước/sau")
+    parser.add_argument('--transactions', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    flask_app = make_app()
+    user_id = seed(flask_app, args.transactions)
+
+    print(f"{args.transactions} giao dịch trong 365 ngày")
+    print(f"{'Kỳ':<12} {'cũ (ms)':>10} {'mới (ms)':>10} {'câu SQL cũ':>11} {'câu SQL mới':>12}")
+    with flask_app.app_context():
+        for time_range in ('this_month', 'year'):
+            start_date, end_date = get_date_range(time_range)
+            granularity = resolve_granularity(None, start_date, end_date)
+
+            def legacy():
+                legacy_report_payload(user_id, time_range, start_date, end_date, 'all', 'chi')
+                db.session.expunge_all()
+
+            def current():
+                build_report_payload(user_id, start_date, end_date, granularity, 'all', 'chi')
+
+            with count_statements(db.engine) as old_sql:
+                legacy()
+            with count_statements(db.engine) as new_sql:
+                current()
+            old_ms = measure(legacy, repeat=args.repeat)
+            new_ms = measure(current, repeat=args.repeat)
+            print(f"{time_range:<12} {old_ms:>10.1f} {new_ms:>10.1f} {old_sql['count']:>11} {new_sql['count']:>12}")
+
+if __name__ == '__main__':
+    main()
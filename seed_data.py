@@ -1,5 +1,6 @@
 from app import app, db
 from app.models import User, Category, Wallet, Transaction, UserSetting
+from app.migrations import upgrade
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
 import random
@@ -7,8 +8,7 @@ import random
 def seed_database():
     with app.app_context():
         print("Đang xóa Database cũ và tạo lại cấu trúc mới...")
-        db.drop_all()  # Xóa sạch các bảng cũ bị lỗi/sai kiểu dữ liệu
-        db.create_all() # Tạo lại các bảng mới chuẩn Integer
+        upgrade(db.engine, fresh=True)  # Xóa sạch các bảng cũ rồi chạy lại toàn bộ migration
         print("Đã khởi tạo cấu trúc dữ liệu thành công!")
 
         try:
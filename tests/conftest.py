@@ -0,0 +1,42 @@
+import pytest
+
+from app import create_app, db
+from app.migrations import upgrade
+from app.models import User
+from config import Config
+
+@pytest.fixture
+def app(tmp_path):
+    # DB là file SQLite riêng cho mỗi test (nhiều luồng / kết nối dùng chung được, khác với :memory:)
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        INSIGHTS_PREWARM = False
+        METRICS_ENABLED = False
+
+    flask_app = create_app(TestConfig)
+    with flask_app.app_context():
+        upgrade(db.engine)
+    yield flask_app
+    with flask_app.app_context():
+        db.engine.dispose()
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        user = User(name='Test', email='test@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+@pytest.fixture
+def login(app):
+    """login(user_id) -> test client đã có phiên đăng nhập của người dùng đó"""
+    def make_client(user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['user_role'] = 'user'
+        return client
+    return make_client
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import ChatbotLog, User
+
+START = datetime(2026, 10, 1, 8, 0)
+
+def _user(name):
+    user = User(name=name, email=f'{name}@example.com')
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def _say(user_id, minutes, question='hỏi'):
+    db.session.add(ChatbotLog(user_id=user_id, question=question, answer='đáp',
+                              created_at=START + timedelta(minutes=minutes)))
+    db.session.commit()
+
+def _admin(login, user_id):
+    client = login(user_id)
+    with client.session_transaction() as sess:
+        sess['user_role'] = 'admin'
+    return client
+
+def _walk(cursor, limit=2):
+    """Tải tiếp từ cursor tới hết -> danh sách mã người dùng"""
+    from app.routes.admin import conversation_page
+    seen = []
+    while cursor:
+        page, cursor = conversation_page(cursor, limit=limit)
+        seen += [c['user_id'] for c in page]
+    return seen
+
+def test_new_messages_between_pages_do_not_repeat_or_skip_conversations(app, user_id):
+    from app.routes.admin import conversation_page
+    with app.app_context():
+        # u0 mới nhất ... u5 cũ nhất; u3, u5 có nhiều tin
+        users = [_user(f'u{i}') for i in range(6)]
+        for i, uid in enumerate(users):
+            _say(uid, 100 - i * 10)
+        _say(users[3], 5)
+        _say(users[5], 1)
+
+        page, cursor = conversation_page(limit=2)
+        seen = [c['user_id'] for c in page]
+        assert seen == users[:2]
+
+        # Giữa hai lần tải: người ở trang sau và người đã xem nhắn tin mới, thêm một người mới
+        _say(users[4], 200, 'tin mới')
+        _say(users[0], 210, 'tin mới')
+        newcomer = _user('moi')
+        _say(newcomer, 220)
+
+        seen += _walk(cursor)
+        assert seen == users                       # không trùng, không sót, đúng thứ tự lúc bắt đầu
+
+        # Tải lại từ đầu thì thấy tin mới
+        page, _ = conversation_page(limit=3)
+        assert [c['user_id'] for c in page] == [newcomer, users[0], users[4]]
+
+def test_snapshot_excludes_messages_newer_than_the_first_page(app, user_id, login):
+    with app.app_context():
+        from app.routes.admin import conversation_page
+        a, b = _user('a'), _user('b')
+        _say(a, 10)
+        _say(b, 5)
+        page, cursor = conversation_page(limit=1)
+        assert [c['user_id'] for c in page] == [a]
+
+        _say(b, 50, 'tin mới')
+        page, cursor = conversation_page(cursor, limit=1)
+        assert [(c['user_id'], c['message_count'], c['snippet']) for c in page] == [(b, 1, 'hỏi')]
+        assert cursor is None
+
+def test_endpoint_handles_an_empty_log_and_a_bad_cursor(app, user_id, login):
+    client = _admin(login, user_id)
+    body = client.get('/api/admin/chatbot-logs').get_json()
+    assert (body['data'], body['next_cursor']) == ([], None)
+    assert client.get('/api/admin/chatbot-logs?cursor=xyz').status_code == 400
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from app import ai_guard as guard_module
+from app.ai_guard import ModelCallGuard, AIUnavailableError, AITimeoutError
+
+@pytest.fixture
+def guard(monkeypatch):
+    """Cầu dao nhỏ, thời gian ngắn để test chạy nhanh"""
+    monkeypatch.setattr(guard_module, 'MAX_CONCURRENCY', 2)
+    monkeypatch.setattr(guard_module, 'QUEUE_WAIT', 0.05)
+    monkeypatch.setattr(guard_module, 'BREAKER_WINDOW', 4)
+    monkeypatch.setattr(guard_module, 'BREAKER_MIN_CALLS', 4)
+    monkeypatch.setattr(guard_module, 'BREAKER_ERROR_RATE', 0.5)
+    monkeypatch.setattr(guard_module, 'BREAKER_COOLDOWN', 0.2)
+    guard = ModelCallGuard()
+    yield guard
+    guard._executor.shutdown(wait=True)
+
+def _fail():
+    raise ValueError('model lỗi')
+
+def _open(guard):
+    for _ in range(2):
+        guard.call('predict', lambda: 'ok')
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            guard.call('predict', _fail)
+
+def test_breaker_opens_at_the_error_rate_and_fails_fast(guard, caplog):
+    with caplog.at_level(logging.WARNING, logger='app.ai_guard'):
+        _open(guard)
+    assert guard.state == guard.OPEN
+    assert 'AI circuit breaker OPEN: 2/4' in caplog.text
+
+    called = []
+    with pytest.raises(AIUnavailableError):
+        guard.call('predict', lambda: called.append(1))
+    assert called == [] and guard.stats()['rejected'] == 1
+
+def test_breaker_half_open_allows_one_trial_then_closes(guard):
+    _open(guard)
+    time.sleep(0.25)
+
+    started, release = threading.Event(), threading.Event()
+    def slow_trial():
+        started.set()
+        release.wait(2)
+        return 'ok'
+    results = []
+    trial = threading.Thread(target=lambda: results.append(guard.call('predict', slow_trial)))
+    trial.start()
+    started.wait(2)
+    assert guard.state == guard.HALF_OPEN
+    with pytest.raises(AIUnavailableError):  # chỉ một lời gọi thử cùng lúc
+        guard.call('predict', lambda: 'ok')
+
+    release.set()
+    trial.join()
+    assert results == ['ok'] and guard.state == guard.CLOSED
+    assert guard.stats()['window_calls'] == 0
+
+def test_failed_trial_reopens_the_breaker(guard):
+    _open(guard)
+    time.sleep(0.25)
+    with pytest.raises(ValueError):
+        guard.call('predict', _fail)
+    assert guard.state == guard.OPEN
+    with pytest.raises(AIUnavailableError):
+        guard.call('predict', lambda: 'ok')
+
+def test_call_deadline_raises_and_counts_a_timeout(guard):
+    release = threading.Event()
+    with pytest.raises(AITimeoutError):
+        guard.call('predict', release.wait, 2, timeout=0.05)
+    stats = guard.stats()
+    assert stats['timeouts'] == 1 and stats['window_calls'] == 1
+    assert stats['latency']['predict']['count'] == 1
+    release.set()
+
+def test_stream_chunk_deadline(guard):
+    release = threading.Event()
+    def chunks():
+        yield 'a'
+        release.wait(2)
+        yield 'b'
+    received = []
+    with pytest.raises(AITimeoutError):
+        for chunk in guard.stream('chat', chunks, chunk_timeout=0.05):
+            received.append(chunk)
+    assert received == ['a'] and guard.stats()['timeouts'] == 1
+    release.set()
+
+def test_executor_is_bounded_and_slots_return_only_when_calls_finish(guard):
+    release = threading.Event()
+    # Hai lời gọi treo quá hạn: người gọi được giải phóng nhưng suất vẫn bị giữ
+    for _ in range(2):
+        with pytest.raises(AITimeoutError):
+            guard.call('predict', release.wait, 2, timeout=0.01)
+    with pytest.raises(AIUnavailableError):
+        guard.call('predict', lambda: 'ok')
+    assert guard.stats()['rejected'] == 1
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        try:
+            assert guard.call('predict', lambda: 'ok') == 'ok'
+            break
+        except AIUnavailableError:
+            time.sleep(0.01)
+    else:
+        pytest.fail('suất đồng thời không được trả lại')
@@ -0,0 +1,105 @@
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app import db
+from app.budget_engine import _record_levels
+from app.models import Budget, BudgetAlert, BudgetProgress, Category, Wallet
+
+LIMIT = 100_000
+
+def _setup(app, login, user_id):
+    """Một ví, một danh mục chi, một ngân sách LIMIT quanh hôm nay. Trả về (client, ví, danh mục, ngân sách)"""
+    with app.app_context():
+        wallet = Wallet(user_id=user_id, name='Vi', balance=1_000_000)
+        category = Category(user_id=user_id, name='An uong', type='chi')
+        db.session.add_all([wallet, category])
+        db.session.commit()
+        wallet_id, category_id = wallet.id, category.id
+
+    client = login(user_id)
+    today = date.today()
+    response = client.post('/api/budgets', json={
+        'name': 'Thang nay', 'amount': LIMIT, 'category_ids': [category_id],
+        'start_date': str(today - timedelta(days=5)), 'end_date': str(today + timedelta(days=5)),
+    })
+    assert response.get_json()['alerts'] == []
+    with app.app_context():
+        budget_id = Budget.query.filter_by(user_id=user_id).one().id
+    return client, wallet_id, category_id, budget_id
+
+def _spend(client, wallet_id, category_id, amount):
+    response = client.post('/api/transactions', json={
+        'type': 'expense', 'amount': amount, 'category_id': category_id,
+        'source_wallet_id': wallet_id, 'date': str(date.today()), 'description': 'an trua',
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['alerts']
+
+def _thresholds(alerts):
+    return sorted(a['threshold'] for a in alerts)
+
+def test_thresholds_fire_once_and_rearm_after_spending_drops(app, user_id, login):
+    client, wallet_id, category_id, budget_id = _setup(app, login, user_id)
+
+    assert _thresholds(_spend(client, wallet_id, category_id, 85_000)) == [50, 80]
+    assert _spend(client, wallet_id, category_id, 10_000) == []          # 95%: không báo lại 50/80
+    assert _thresholds(_spend(client, wallet_id, category_id, 10_000)) == [100]
+    assert _spend(client, wallet_id, category_id, 1_000) == []
+
+    # Xóa khoản 85.000: còn 21.000 (21%) => hạ mốc về 0, vượt lại thì báo lại
+    first = min(t['id'] for t in client.get('/api/transactions').get_json())
+    assert client.delete(f'/api/transactions/{first}').status_code == 200
+    with app.app_context():
+        progress = db.session.get(BudgetProgress, budget_id)
+        assert (progress.spent, progress.last_threshold) == (Decimal(21_000), 0)
+    assert _thresholds(_spend(client, wallet_id, category_id, 60_000)) == [50, 80]
+
+    with app.app_context():
+        assert sorted(a.threshold for a in BudgetAlert.query.filter_by(budget_id=budget_id)) == [50, 50, 80, 80, 100]
+
+def test_conditional_update_lets_only_one_writer_record_a_crossing(app, user_id, login):
+    client, wallet_id, category_id, budget_id = _setup(app, login, user_id)
+    with app.app_context():
+        # Hai request cùng đọc mốc cũ = 0 rồi cùng ghi 90%: chỉ UPDATE đầu tiên khớp "MucDaCanhBao < 80"
+        change = [(budget_id, 'Thang nay', Decimal(LIMIT), Decimal(90_000), 0)]
+        assert _thresholds(_record_levels(user_id, change)) == [50, 80]
+        assert _record_levels(user_id, change) == []
+        db.session.commit()
+        assert BudgetAlert.query.filter_by(budget_id=budget_id).count() == 2
+
+def test_concurrent_spending_alerts_each_threshold_once(app, user_id, login):
+    client, wallet_id, category_id, budget_id = _setup(app, login, user_id)
+    alerts, barrier = [], threading.Barrier(4)
+
+    def worker():
+        barrier.wait()
+        alerts.extend(_spend(login(user_id), wallet_id, category_id, 30_000))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert _thresholds(alerts) == [50, 80, 100]
+    with app.app_context():
+        assert sorted(a.threshold for a in BudgetAlert.query.filter_by(budget_id=budget_id)) == [50, 80, 100]
+
+def test_alerts_stay_unread_until_marked_read(app, user_id, login):
+    client, wallet_id, category_id, budget_id = _setup(app, login, user_id)
+    returned = _spend(client, wallet_id, category_id, 85_000)
+
+    # Đã trả trong response nhưng chưa xác nhận: vẫn chưa đọc, GET không đánh dấu
+    for _ in range(2):
+        unread = client.get('/api/budgets/alerts').get_json()
+        assert sorted(a['id'] for a in unread) == sorted(a['id'] for a in returned)
+
+    other = login(user_id)
+    response = other.post('/api/budgets/alerts/read', json={'ids': [returned[0]['id']]})
+    assert response.status_code == 200
+    assert [a['id'] for a in client.get('/api/budgets/alerts').get_json()] == [returned[1]['id']]
+
+    assert client.post('/api/budgets/alerts/read', json={'ids': 'all'}).status_code == 400
+    client.post('/api/budgets/alerts/read', json={'ids': [a['id'] for a in returned]})
+    assert client.get('/api/budgets/alerts').get_json() == []
@@ -0,0 +1,31 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from app import db
+from app.database import upsert_add
+from app.models import DailyRollup
+
+_rollups = DailyRollup.__table__
+KEY = ('MaNguoiDung', 'Ngay', 'LoaiGiaoDich', 'MaDanhMuc', 'MaNguonTien')
+
+def _row(user_id, category_id, total, count):
+    return {'MaNguoiDung': user_id, 'Ngay': date(2026, 10, 1), 'LoaiGiaoDich': 'chi',
+            'MaDanhMuc': category_id, 'MaNguonTien': 1, 'TongTien': total, 'SoLuong': count}
+
+@pytest.mark.parametrize('dialect', ['sqlite', 'generic'])
+def test_upsert_add_inserts_then_accumulates(app, user_id, monkeypatch, dialect):
+    with app.app_context():
+        if dialect == 'generic':
+            # DB không có ON CONFLICT: nhánh UPDATE trước, INSERT nếu chưa có dòng
+            monkeypatch.setattr(db.engine.dialect, 'name', 'generic')
+        upsert_add(db.session, _rollups, KEY, ('TongTien', 'SoLuong'), [_row(user_id, 0, 100, 1)])
+        upsert_add(db.session, _rollups, KEY, ('TongTien', 'SoLuong'),
+                   [_row(user_id, 0, 50, 2), _row(user_id, 7, 30, 1)])
+        db.session.commit()
+
+        rows = db.session.execute(
+            select(_rollups.c.MaDanhMuc, _rollups.c.TongTien, _rollups.c.SoLuong).order_by(_rollups.c.MaDanhMuc)
+        ).all()
+        assert [(cat, int(total), count) for cat, total, count in rows] == [(0, 150, 3), (7, 30, 1)]
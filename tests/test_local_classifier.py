@@ -0,0 +1,190 @@
+from datetime import date
+
+import pytest
+
+from app import db
+from app.cache import LRUCache
+from app.local_classifier import LocalClassifier, NaiveBayesModel, local_classifier
+from app.models import AIUserModel, Category, Transaction, Wallet
+
+@pytest.fixture
+def wallet_and_categories(app, user_id):
+    with app.app_context():
+        wallet = Wallet(user_id=user_id, name='Vi', balance=0)
+        food = Category(user_id=user_id, name='An uong', type='chi')
+        fuel = Category(user_id=user_id, name='Xang xe', type='chi')
+        db.session.add_all([wallet, food, fuel])
+        db.session.commit()
+        return wallet.id, food.id, fuel.id
+
+def _add(client, wallet_id, category_id, description):
+    response = client.post('/api/transactions', json={
+        'type': 'expense', 'amount': 1000, 'category_id': category_id, 'source_wallet_id': wallet_id,
+        'date': str(date.today()), 'description': description,
+    })
+    assert response.status_code == 200
+    return max(t['id'] for t in client.get('/api/transactions').get_json())
+
+def test_edit_without_label_change_does_not_relabel(app, user_id, login, wallet_and_categories, monkeypatch):
+    wallet_id, food, fuel = wallet_and_categories
+    client = login(user_id)
+    trans_id = _add(client, wallet_id, food, 'pho bo')
+    calls = []
+    monkeypatch.setattr(local_classifier, 'relabel', lambda *args, **kwargs: calls.append(kwargs))
+
+    payload = {'type': 'expense', 'category_id': food, 'source_wallet_id': wallet_id,
+               'date': str(date.today()), 'description': 'pho bo'}
+    assert client.put(f'/api/transactions/{trans_id}', json=dict(payload, amount=2000)).status_code == 200
+    assert calls == []
+
+    assert client.put(f'/api/transactions/{trans_id}', json=dict(payload, amount=2000, category_id=fuel)).status_code == 200
+    assert calls == [{'old': ('pho bo', food), 'new': ('pho bo', fuel)}]
+
+def test_classifier_failure_does_not_undo_a_committed_write(app, user_id, login, wallet_and_categories, monkeypatch):
+    wallet_id, food, fuel = wallet_and_categories
+    client = login(user_id)
+    trans_id = _add(client, wallet_id, food, 'pho bo')
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('xung đột ghi mô hình')
+    monkeypatch.setattr(local_classifier, 'relabel', broken)
+
+    response = client.put(f'/api/transactions/{trans_id}', json={
+        'type': 'expense', 'amount': 1000, 'category_id': fuel, 'source_wallet_id': wallet_id,
+        'date': str(date.today()), 'description': 'do xang',
+    })
+    assert response.status_code == 200
+    with app.app_context():
+        assert db.session.get(Transaction, trans_id).category_id == fuel
+
+    assert client.delete(f'/api/transactions/{trans_id}').status_code == 200
+    with app.app_context():
+        assert db.session.get(Transaction, trans_id) is None
+
+# ---------- Mô hình và bộ phân loại (mỗi "worker" một LocalClassifier với LRU riêng) ----------
+
+def _worker(threshold=0.6, min_samples=4):
+    classifier = LocalClassifier(threshold, min_samples, maxsize=10)
+    classifier.models = LRUCache('test-local-classifier', maxsize=10)
+    return classifier
+
+def _seed(user_id, wallet_id, labelled):
+    """labelled: [(mô tả, MaDanhMuc)] -> danh sách MaGiaoDich"""
+    rows = [Transaction(user_id=user_id, wallet_id=wallet_id, category_id=category_id, type='chi',
+                        amount=1000, description=description, date=date.today())
+            for description, category_id in labelled]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [t.id for t in rows]
+
+def test_naive_bayes_predicts_from_character_ngrams():
+    model = NaiveBayesModel()
+    for text in ('phở bò', 'phở gà', 'bún bò huế'):
+        model.update(text, 1)
+    for text in ('đổ xăng', 'xăng xe máy', 'thay nhớt xe'):
+        model.update(text, 2)
+
+    category_id, probability = model.predict('Pho bo tai')  # bỏ dấu / hoa thường vẫn khớp
+    assert category_id == 1 and probability > 0.9
+    assert model.predict('xang')[0] == 2
+    assert model.predict('xang', allowed={1})[0] == 1        # chỉ xét danh mục được phép
+    assert model.predict('xang', allowed={3}) == (None, 0.0)  # danh mục chưa có mẫu nào
+
+def test_model_round_trips_through_bytes():
+    model = NaiveBayesModel()
+    model.update('phở bò', 1)
+    model.update('đổ xăng', 2)
+    restored = NaiveBayesModel.from_bytes(model.to_bytes(), watermark=7, revision=3)
+    assert (restored.doc_counts, restored.feature_counts, restored.watermark, restored.revision) == \
+        (model.doc_counts, model.feature_counts, 7, 3)
+
+def test_relabel_undo_restores_the_exact_counts():
+    model = NaiveBayesModel()
+    model.update('phở bò', 1)
+    before = (dict(model.doc_counts), {k: dict(v) for k, v in model.feature_counts.items()}, dict(model.vocab))
+
+    model.update('cà phê sữa', 2)
+    model.update('cà phê sữa', 2, sign=-1)
+    assert (dict(model.doc_counts), {k: dict(v) for k, v in model.feature_counts.items()}, dict(model.vocab)) == before
+    assert 2 not in model.totals
+
+def test_predict_respects_min_samples_and_threshold(app, user_id, wallet_and_categories):
+    wallet_id, food, fuel = wallet_and_categories
+    with app.app_context():
+        _seed(user_id, wallet_id, [('phở bò', food), ('đổ xăng', fuel), ('phở gà', food)])
+        classifier = _worker(min_samples=4)
+        assert classifier.predict(user_id, 'phở bò', None) is None          # mới 3 mẫu
+        assert classifier.stats()['deferred_to_model'] == 1
+
+        _seed(user_id, wallet_id, [('bún bò', food), ('xăng xe', fuel)])
+        classifier.mark_stale(user_id)
+        category_id, confidence = classifier.predict(user_id, 'phở bò', None)
+        assert category_id == food and confidence >= 60
+        # Dưới ngưỡng tự tin thì nhường cho model AI
+        probability = classifier.models.get(user_id).predict('phở bò')[1]
+        assert _worker(threshold=probability + 1e-9).predict(user_id, 'phở bò', None) is None
+        assert classifier.stats()['answered_locally'] == 1
+
+def test_relabel_updates_the_stored_model_and_other_workers_reload(app, user_id, wallet_and_categories):
+    wallet_id, food, fuel = wallet_and_categories
+    with app.app_context():
+        ids = _seed(user_id, wallet_id, [('cà phê', food)] * 4 + [('đổ xăng', fuel)] * 4)
+        first, second = _worker(), _worker()
+        assert first.predict(user_id, 'cà phê', None)[0] == food
+        assert second.predict(user_id, 'cà phê', None)[0] == food
+        revision = db.session.get(AIUserModel, user_id).revision
+
+        # Worker thứ nhất sửa các giao dịch "cà phê" sang danh mục xăng xe
+        for trans_id in ids[:4]:
+            db.session.get(Transaction, trans_id).category_id = fuel
+            db.session.commit()
+            first.relabel(user_id, trans_id, old=('cà phê', food), new=('cà phê', fuel))
+        db.session.expire_all()
+        stored = db.session.get(AIUserModel, user_id)
+        assert stored.revision == revision + 4
+        assert NaiveBayesModel.from_bytes(stored.data, stored.watermark).doc_counts == {fuel: 8}
+        assert first.predict(user_id, 'cà phê', None)[0] == fuel
+
+        # Worker thứ hai còn bản cũ tới lần đồng bộ kế tiếp, rồi thấy PhienBan khác và nạp lại
+        assert second.predict(user_id, 'cà phê', None)[0] == food
+        second.mark_stale(user_id)
+        assert second.predict(user_id, 'cà phê', None)[0] == fuel
+        assert second.models.get(user_id).revision == stored.revision
+
+def test_stale_worker_does_not_overwrite_a_newer_revision(app, user_id, wallet_and_categories):
+    wallet_id, food, fuel = wallet_and_categories
+    with app.app_context():
+        ids = _seed(user_id, wallet_id, [('cà phê', food)] * 4)
+        first, second = _worker(), _worker()
+        first.predict(user_id, 'x', None)
+        second.predict(user_id, 'x', None)
+
+        first.relabel(user_id, ids[0], old=('cà phê', food), new=('trà sữa', food))
+        relabelled = db.session.get(AIUserModel, user_id).revision
+
+        # Worker thứ hai học giao dịch mới; worker thứ nhất sửa nhãn NGAY SAU khi worker thứ hai
+        # kiểm tra PhienBan: câu ghi có điều kiện thất bại, nó bỏ bản trong RAM thay vì đè mất nhãn
+        _seed(user_id, wallet_id, [('đổ xăng', fuel)])
+        store = second._store
+        def racing_store(conn, user_id, model):
+            first.relabel(user_id, ids[1], old=('cà phê', food), new=('trà sữa', food))
+            return store(conn, user_id, model)
+        second._store = racing_store
+        second.mark_stale(user_id)
+        second.predict(user_id, 'x', None)
+        second._store = store
+        assert second.models.get(user_id) is None
+        relabelled += 1
+
+        db.session.expire_all()
+        stored = db.session.get(AIUserModel, user_id)
+        assert stored.revision == relabelled
+        features = NaiveBayesModel.from_bytes(stored.data, stored.watermark).feature_counts[food]
+        assert ' tr' in features                                  # nhãn đã sửa vẫn còn
+
+        # Lần sau nạp lại bản mới nhất rồi mới học giao dịch mới
+        second.predict(user_id, 'x', None)
+        db.session.expire_all()
+        stored = db.session.get(AIUserModel, user_id)
+        assert stored.revision == relabelled + 1
+        assert NaiveBayesModel.from_bytes(stored.data, stored.watermark).doc_counts == {food: 4, fuel: 1}
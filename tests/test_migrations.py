@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text, delete
+
+from app import db
+from app.migrations import discover, pending, upgrade
+from app.models import Budget, BudgetProgress, Category, DailyRollup, Transaction, Wallet
+
+def _schema(engine):
+    """Bảng, cột, khóa, khóa ngoại và chỉ mục (kể cả điều kiện WHERE của chỉ mục một phần)"""
+    inspector = inspect(engine)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table == 'schema_phienban':
+            continue
+        schema[table] = {
+            'columns': {c['name']: (str(c['type']), c['nullable']) for c in inspector.get_columns(table)},
+            'primary_key': inspector.get_pk_constraint(table)['constrained_columns'],
+            'foreign_keys': sorted((fk['constrained_columns'], fk['referred_table'], fk['referred_columns'],
+                                    fk['options'].get('ondelete')) for fk in inspector.get_foreign_keys(table)),
+            'unique': sorted(tuple(u['column_names']) for u in inspector.get_unique_constraints(table)),
+        }
+    with engine.connect() as conn:
+        schema['indexes'] = dict(conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )).all())
+    return schema
+
+def test_fresh_upgrade_builds_the_same_schema_as_the_models(tmp_path):
+    migrated = create_engine('sqlite:///' + str(tmp_path / 'migrated.db'))
+    declared = create_engine('sqlite:///' + str(tmp_path / 'declared.db'))
+    try:
+        done = upgrade(migrated, fresh=True)
+        db.metadata.create_all(declared)
+
+        assert [m.version for m in done] == [m.version for m in discover()]
+        assert pending(migrated) == []
+        assert _schema(migrated) == _schema(declared)
+
+        # Chạy lại không làm gì; fresh=True dựng lại từ đầu vẫn ra cùng lược đồ
+        assert upgrade(migrated) == []
+        upgrade(migrated, fresh=True)
+        assert pending(migrated) == [] and _schema(migrated) == _schema(declared)
+    finally:
+        migrated.dispose()
+        declared.dispose()
+
+@pytest.fixture
+def backfill():
+    """upgrade(conn) của migration 0011"""
+    return next(m for m in discover() if m.name == 'backfill_rollups').load().upgrade
+
+def test_backfill_matches_the_live_rollups_and_budget_progress(app, user_id, login, backfill):
+    today = date.today()
+    with app.app_context():
+        wallet = Wallet(user_id=user_id, name='Vi', balance=0)
+        food = Category(user_id=user_id, name='An uong', type='chi')
+        salary = Category(user_id=user_id, name='Luong', type='thu')
+        db.session.add_all([wallet, food, salary])
+        db.session.commit()
+        wallet_id, food_id, salary_id = wallet.id, food.id, salary.id
+
+    client = login(user_id)
+    for kind, amount, category_id, day in [
+        ('expense', 30_000, food_id, today), ('expense', 55_000, food_id, today),
+        ('expense', 20_000, food_id, today - timedelta(days=40)),   # ngoài khung ngân sách
+        ('expense', 7_000, None, today), ('income', 1_000_000, salary_id, today),
+        ('income', 40_000, food_id, today),                           # hoàn tiền: không tính vào ngân sách
+    ]:
+        response = client.post('/api/transactions', json={
+            'type': kind, 'amount': amount, 'category_id': category_id, 'source_wallet_id': wallet_id,
+            'dest_wallet_id': wallet_id, 'date': str(day), 'description': 'x',
+        })
+        assert response.status_code == 200, response.get_json()
+    for name, limit in [('Vua', 100_000), ('Nho', 50_000)]:
+        assert client.post('/api/budgets', json={
+            'name': name, 'amount': limit, 'category_ids': [food_id],
+            'start_date': str(today - timedelta(days=5)), 'end_date': str(today + timedelta(days=5)),
+        }).status_code == 200
+
+    rollups, progress = DailyRollup.__table__, BudgetProgress.__table__
+    def snapshot():
+        return (
+            sorted(tuple(r) for r in db.session.execute(select(rollups)).all()),
+            sorted((r.MaNganSach, Decimal(r.DaChi), r.MucDaCanhBao) for r in db.session.execute(select(progress)).all()),
+        )
+
+    with app.app_context():
+        live = snapshot()
+        budget_ids = [b.id for b in Budget.query.order_by(Budget.id)]
+        assert live[1] == [(budget_ids[0], Decimal(85_000), 80), (budget_ids[1], Decimal(85_000), 100)]
+        assert (user_id, today, 'chi', 0, wallet_id, Decimal(7_000), 1) in live[0]
+
+        # Triển khai cũ: có giao dịch nhưng hai bảng dẫn xuất còn trống
+        db.session.execute(delete(rollups))
+        db.session.execute(delete(progress))
+        db.session.commit()
+        with db.engine.begin() as conn:
+            backfill(conn)
+        db.session.expire_all()
+        assert snapshot() == live
+
+        # Ngân sách đã xóa mềm không có tiến độ
+        db.session.get(Budget, budget_ids[1]).is_deleted = True
+        db.session.commit()
+        with db.engine.begin() as conn:
+            backfill(conn)
+        assert [r[0] for r in snapshot()[1]] == [budget_ids[0]]
+        assert Transaction.query.count() == 6
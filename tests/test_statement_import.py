@@ -0,0 +1,116 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import Wallet, Transaction
+from app.statement_import import parse_amount, iter_csv_rows, iter_ofx_rows, StatementRowError
+
+@pytest.mark.parametrize('raw, expected', [
+    ('1.250.000', Decimal('1250000')),
+    ('1,250,000', Decimal('1250000')),
+    ('-45000', Decimal('-45000')),
+    ('1,250.50', Decimal('1250.50')),
+    ('1.250,5', Decimal('1250.5')),
+    ('(30.000)', Decimal('-30000')),
+    ('+12 000 VND', Decimal('12000')),
+    ('', None),
+    (None, None),
+])
+def test_parse_amount(raw, expected):
+    assert parse_amount(raw) == expected
+
+def _rows(parser, text):
+    return list(parser(io.StringIO(text, newline='')))
+
+@pytest.mark.parametrize('delimiter', [',', ';', '\t'])
+def test_csv_dialect_is_sniffed_from_the_header(delimiter):
+    text = delimiter.join(['Ngày', 'Mô tả', 'Số tiền']) + '\n' \
+        + delimiter.join(['01/10/2026', 'Phở', '-45000']) + '\n' \
+        + delimiter.join(['2026-10-02', 'Lương', '15000000']) + '\n'
+    assert _rows(iter_csv_rows, text) == [
+        (2, {'date': date(2026, 10, 1), 'amount': Decimal('-45000'), 'description': 'Phở'}),
+        (3, {'date': date(2026, 10, 2), 'amount': Decimal('15000000'), 'description': 'Lương'}),
+    ]
+
+def test_csv_debit_credit_columns_become_a_signed_amount():
+    text = 'date;memo;debit;credit\n2026-10-01;ATM;500.000;\n2026-10-02;Nap;;1.000.000\n'
+    assert [row['amount'] for _, row in _rows(iter_csv_rows, text)] == [Decimal('-500000'), Decimal('1000000')]
+
+def test_csv_bad_rows_are_reported_with_their_line_number():
+    text = 'date,description,amount\n2026-10-01,ok,1000\n31/31/2026,bad date,1000\n\n2026-10-03,zero,0\n2026-10-04,bad,abc\n'
+    rows = _rows(iter_csv_rows, text)
+    assert rows[0] == (2, {'date': date(2026, 10, 1), 'amount': Decimal('1000'), 'description': 'ok'})
+    errors = [row for _, row in rows[1:]]
+    assert all(isinstance(e, StatementRowError) for e in errors)
+    # Dòng trống (dòng 4) bị bỏ qua, không tính là lỗi
+    assert [e.line_no for e in errors] == [3, 5, 6]
+    assert str(errors[0]).startswith('Dòng 3: ')
+
+def test_csv_without_date_or_amount_column_is_rejected():
+    with pytest.raises(StatementRowError):
+        _rows(iter_csv_rows, 'description,note\nx,y\n')
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20261001120000
+<TRNAMT>-45000.00
+<NAME>GRAB
+<MEMO>Grab bike
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20261002<TRNAMT>1500000<NAME>Luong</STMTTRN>
+<STMTTRN>
+<DTPOSTED>xx
+<TRNAMT>10
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+def test_ofx_blocks_on_separate_or_single_lines():
+    rows = _rows(iter_ofx_rows, OFX)
+    assert rows[:2] == [
+        (3, {'date': date(2026, 10, 1), 'amount': Decimal('-45000.00'), 'description': 'Grab bike'}),
+        (10, {'date': date(2026, 10, 2), 'amount': Decimal('1500000'), 'description': 'Luong'}),
+    ]
+    line_no, error = rows[2]
+    assert line_no == 11 and isinstance(error, StatementRowError)
+
+def test_import_inserts_in_batches_and_updates_the_wallet_once(app, user_id, login, monkeypatch):
+    monkeypatch.setattr('app.routes.transaction.IMPORT_BATCH_SIZE', 1000)
+    with app.app_context():
+        wallet = Wallet(user_id=user_id, name='Vi', balance=0)
+        db.session.add(wallet)
+        db.session.commit()
+        wallet_id = wallet.id
+        engine = db.engine
+
+    lines = ['date,description,amount'] + [f'2026-10-01,dong {i},-1000' for i in range(2500)] + ['bad,row,1']
+    upload = (io.BytesIO('\n'.join(lines).encode('utf-8')), 'sao_ke.csv')
+
+    statements = []
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement.split('(')[0].strip())
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        response = login(user_id).post('/api/transactions/import',
+                                       data={'file': upload, 'wallet_id': wallet_id},
+                                       content_type='multipart/form-data')
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['imported'], body['skipped']) == (2500, 1)
+    assert body['errors'] == ["Dòng 2502: ngày không hợp lệ 'bad'"]
+    # 1000 + 1000 + 500 dòng: ba câu INSERT executemany, không phải một câu mỗi dòng
+    assert statements.count('INSERT INTO giaodich') == 3
+    assert sum(1 for s in statements if s.startswith('UPDATE nguontien')) == 1
+
+    with app.app_context():
+        assert Transaction.query.filter_by(user_id=user_id).count() == 2500
+        assert db.session.get(Wallet, wallet_id).balance == -2_500_000
@@ -0,0 +1,57 @@
+from datetime import date, datetime
+
+from sqlalchemy import insert, update
+
+from app import db
+from app.models import Wallet, Transaction
+
+def _seed(user_id, rows):
+    """rows: [(ngày, NgayTao hoặc None)] -> danh sách MaGiaoDich theo thứ tự chèn"""
+    wallet = Wallet(user_id=user_id, name='Vi', balance=0)
+    db.session.add(wallet)
+    db.session.flush()
+    ids = []
+    for day, created in rows:
+        result = db.session.execute(insert(Transaction.__table__).values(
+            MaNguoiDung=user_id, MaNguonTien=wallet.id, LoaiGiaoDich='chi', SoTien=1000,
+            MoTa='gd', NgayGiaoDich=day, NgayTao=created
+        ))
+        ids.append(result.inserted_primary_key[0])
+    # Ghi NULL tường minh (default phía Python không được áp dụng khi UPDATE)
+    db.session.execute(update(Transaction.__table__).where(
+        Transaction.__table__.c.MaGiaoDich.in_([i for i, (_, c) in zip(ids, rows) if c is None])
+    ).values(NgayTao=None))
+    db.session.commit()
+    return ids
+
+def _all_pages(client, limit):
+    seen, cursor = [], None
+    while True:
+        url = f'/api/transactions?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(t['id'] for t in response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return seen
+
+def test_keyset_paging_includes_rows_without_created_at(app, user_id, login):
+    created = datetime(2026, 10, 1, 8, 0)
+    with app.app_context():
+        ids = _seed(user_id, [
+            (date(2026, 10, 2), created),
+            (date(2026, 10, 2), None),
+            (date(2026, 10, 2), None),
+            (date(2026, 10, 1), None),
+            (date(2026, 10, 1), created),
+            (date(2026, 9, 30), None),
+        ])
+
+    # Trang cỡ 1 và 2: dòng cuối mỗi trang lần lượt rơi vào các dòng NgayTao = NULL
+    for limit in (1, 2, 4):
+        seen = _all_pages(login(user_id), limit)
+        assert sorted(seen) == sorted(ids)
+        assert len(seen) == len(set(seen))
+
+    # Thứ tự: ngày giảm dần, NgayTao NULL xếp sau cùng trong ngày, rồi MaGiaoDich giảm dần
+    assert _all_pages(login(user_id), 2) == [ids[0], ids[2], ids[1], ids[4], ids[3], ids[5]]
@@ -0,0 +1,69 @@
+import threading
+from decimal import Decimal
+
+from app import db
+from app.bookkeeping import reconcile_balances
+from app.models import Wallet, Transaction
+
+THREADS = 2
+ROUNDS = 25
+
+def _create_wallet(client, name, balance):
+    assert client.post('/api/wallets', json={'name': name, 'type': 'cash', 'balance': balance}).status_code == 200
+    return next(w['MaNguonTien'] for w in client.get('/api/wallets').get_json() if w['TenNguonTien'] == name)
+
+def _worker(client, wallet_id, other_wallet_id, worker_no, errors, barrier):
+    barrier.wait()
+    try:
+        for i in range(ROUNDS):
+            base = {'source_wallet_id': wallet_id, 'date': '2026-10-01',
+                    'description': f'luong {worker_no} lan {i}'}
+            # Thêm: chi, thu (vào cùng ví), chuyển sang ví khác
+            for payload in (
+                dict(base, type='expense', amount=100 + i),
+                dict(base, type='income', amount=50, dest_wallet_id=wallet_id),
+                dict(base, type='transfer', amount=7, dest_wallet_id=other_wallet_id),
+            ):
+                response = client.post('/api/transactions', json=payload)
+                if response.status_code != 200:
+                    errors.append(response.get_json())
+
+            mine = [t['id'] for t in client.get('/api/transactions?limit=200').get_json()
+                    if t['description'] == base['description']]
+            # Sửa giao dịch đầu tiên thành khoản chi lớn hơn, xóa giao dịch cuối cùng
+            response = client.put(f'/api/transactions/{mine[0]}', json=dict(base, type='expense', amount=300))
+            if response.status_code != 200:
+                errors.append(response.get_json())
+            response = client.delete(f'/api/transactions/{mine[-1]}')
+            if response.status_code != 200:
+                errors.append(response.get_json())
+    except Exception as e: # lỗi trong luồng phải làm test thất bại chứ không bị nuốt mất
+        errors.append(repr(e))
+
+def test_concurrent_writes_keep_wallet_balances_consistent(app, user_id, login):
+    setup = login(user_id)
+    wallet_id = _create_wallet(setup, 'Vi chung', 1_000_000)
+    other_wallet_id = _create_wallet(setup, 'Vi phu', 0)
+
+    errors = []
+    barrier = threading.Barrier(THREADS)
+    threads = [
+        threading.Thread(target=_worker, args=(login(user_id), wallet_id, other_wallet_id, n, errors, barrier))
+        for n in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    with app.app_context():
+        assert reconcile_balances() == []
+
+        # Đối chiếu thêm với số liệu tính tay từ các giao dịch còn lại
+        remaining = Transaction.query.filter_by(user_id=user_id).all()
+        assert len(remaining) == THREADS * ROUNDS * 2
+        expected = Decimal(1_000_000)
+        for t in remaining:
+            expected += t.amount if t.type == 'thu' else -t.amount
+        assert db.session.get(Wallet, wallet_id).balance == expected